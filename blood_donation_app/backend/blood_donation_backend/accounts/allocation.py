@@ -0,0 +1,140 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .matching import compatible_donor_types
+from .models import BloodRequest, BloodUnit, HospitalInventorySummary
+
+# Candidate units locked per round trip while gathering stock
+ALLOCATION_BATCH_SIZE = 50
+
+
+class AllocationError(Exception):
+    pass
+
+
+class InsufficientStock(AllocationError):
+    def __init__(self, needed, available):
+        self.needed = needed
+        self.available = available
+        super().__init__(f"Needed {needed} units but only {available} could be reserved.")
+
+
+def candidate_units(blood_request):
+    """
+    Available units at the requesting hospital that can be given to the
+    recipient, first-expiry-first-out. On the same expiry date the exact
+    blood type goes first so universal donor stock (e.g. O-) is kept back.
+    """
+    return (
+        BloodUnit.objects.filter(
+            hospital_id=blood_request.hospital_id,
+            status='available',
+            blood_type__in=compatible_donor_types(blood_request.blood_type),
+            expiration_date__gte=timezone.localdate(),
+        )
+        .annotate(type_rank=Case(
+            When(blood_type=blood_request.blood_type, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by('expiration_date', 'type_rank', 'pk')
+    )
+
+
+def reserve_units(candidates, needed):
+    """
+    Lock units from an ordered queryset until ``needed`` is covered. Rows
+    locked by another transaction are skipped rather than waited on. Must be
+    called inside a transaction. Returns ``[(unit, take), ...]``; raises
+    InsufficientStock if the candidates run out first.
+    """
+    taken = []
+    seen = []
+    remaining = needed
+    candidates = candidates.select_for_update(skip_locked=True, of=('self',))
+    while remaining > 0:
+        batch = list(candidates.exclude(pk__in=seen)[:ALLOCATION_BATCH_SIZE])
+        if not batch:
+            break
+        for unit in batch:
+            seen.append(unit.pk)
+            take = min(unit.quantity, remaining)
+            taken.append((unit, take))
+            remaining -= take
+            if remaining == 0:
+                break
+    if remaining > 0:
+        raise InsufficientStock(needed, needed - remaining)
+    return taken
+
+
+def consume_units(taken, status, **fields):
+    """
+    Move reserved units out of available stock with bulk statements: whole
+    units get one UPDATE, and a unit only partly taken is decremented with the
+    taken part inserted as its own row. The inventory summary is adjusted to
+    match. Returns the consumed rows.
+    """
+    whole = [unit for unit, take in taken if take == unit.quantity]
+    partial = [(unit, take) for unit, take in taken if take < unit.quantity]
+
+    updated = BloodUnit.objects.filter(pk__in=[unit.pk for unit in whole], status='available')\
+        .update(status=status, **fields)
+    if updated != len(whole):
+        raise AllocationError("Stock changed while it was locked; aborting allocation.")
+
+    split_rows = []
+    for unit, take in partial:
+        BloodUnit.objects.filter(pk=unit.pk).update(quantity=F('quantity') - take)
+        split_rows.append(BloodUnit(
+            blood_type=unit.blood_type,
+            quantity=take,
+            hospital_id=unit.hospital_id,
+            expiration_date=unit.expiration_date,
+            status=status,
+            **fields,
+        ))
+    split_rows = BloodUnit.objects.bulk_create(split_rows)
+
+    quantity_delta = Counter()
+    units_delta = Counter()
+    for unit, take in taken:
+        key = (unit.hospital_id, unit.blood_type)
+        quantity_delta[key] -= take
+        if take == unit.quantity:
+            units_delta[key] -= 1
+    for key, quantity in quantity_delta.items():
+        HospitalInventorySummary.apply_delta(*key, quantity, units_delta[key])
+
+    for unit in whole:
+        unit.status = status
+        for name, value in fields.items():
+            setattr(unit, name, value)
+    return whole + split_rows
+
+
+def allocate_blood_request(blood_request_id):
+    """
+    Fulfil a pending blood request from the hospital's own stock.
+
+    Everything happens in one transaction. Candidate units are locked with
+    ``select_for_update(skip_locked=True)``, so two fulfilments running at the
+    same time pick disjoint units instead of waiting on or double-allocating
+    each other. Raises InsufficientStock (and changes nothing) if the request
+    can't be covered. Returns the allocated units.
+    """
+    with transaction.atomic():
+        blood_request = BloodRequest.objects.select_for_update().get(pk=blood_request_id)
+        if blood_request.status != 'pending':
+            raise AllocationError(f"Blood request {blood_request.pk} is {blood_request.status}, not pending.")
+
+        taken = reserve_units(candidate_units(blood_request), blood_request.quantity)
+        units = consume_units(taken, 'used', allocated_to=blood_request)
+
+        blood_request.status = 'fulfilled'
+        blood_request.fulfilled_at = timezone.now()
+        blood_request.save(update_fields=['status', 'fulfilled_at'])
+    return units
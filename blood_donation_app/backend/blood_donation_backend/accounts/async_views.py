@@ -0,0 +1,189 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import PrincipalJWTAuthentication, principal_from_token
+from .forecasting import ahospital_forecasts, stock_summary
+from .inventory import summary_rows
+from .inventory_cache import acached_inventory_response
+from .serializers import (
+    BloodRequestSerializer,
+    DeliveryStaffLoginSerializer,
+    DonorLoginSerializer,
+    HospitalLoginSerializer,
+)
+from .tokens import PRINCIPAL_DONOR, PRINCIPAL_HOSPITAL, PRINCIPAL_STAFF, tokens_for
+from .views import BloodRequestListCreateView
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    # DRF's renderer, so the bytes match what the equivalent DRF view sends
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+class AsyncAPIView(View):
+    """
+    Base for the ASGI-native views on the busiest endpoints. Handlers are
+    coroutines that use the async ORM, so a request waiting on the database,
+    a password hash or the channel layer doesn't hold a worker thread.
+
+    Authenticates with the same JWT principal as the DRF views and renders
+    DRF exceptions the way DRF does. Methods listed in ``sync_view_methods``
+    are handed to ``sync_view``, an ordinary DRF view.
+    """
+
+    authentication_required = True
+    sync_view = None
+    sync_view_methods = ()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated, like the DRF views; there is no session to forge
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        if method in self.sync_view_methods:
+            return await sync_to_async(self.sync_view.as_view())(request, *args, **kwargs)
+        try:
+            request.principal = await self.authenticate(request)
+            if self.authentication_required and request.principal is None:
+                raise exceptions.NotAuthenticated()
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+
+    async def authenticate(self, request):
+        authentication = PrincipalJWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        token = authentication.get_validated_token(raw_token)
+        principal = principal_from_token(token)
+        if principal is None:
+            # Tokens without principal claims need the row looked up
+            principal = await sync_to_async(authentication.get_user)(token)
+        return principal
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = json_response(data, exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            response['WWW-Authenticate'] = PrincipalJWTAuthentication().authenticate_header(request)
+        return response
+
+    def get_json(self, request):
+        if not request.body:
+            return {}
+        try:
+            return json.loads(request.body)
+        except ValueError as exc:
+            raise exceptions.ParseError(f"JSON parse error - {exc}")
+
+
+# Login views: the password check runs on the hashing pool, off the event loop
+class AsyncLoginView(AsyncAPIView):
+    query_budget = 3
+    authentication_required = False
+    serializer_class = None
+    principal_type = None
+    success_key = 'success'
+
+    async def post(self, request):
+        serializer = self.serializer_class(data=self.get_json(request))
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        # Authenticates against this principal's table only (see PrincipalBackend)
+        principal = await aauthenticate(
+            request,
+            email=serializer.validated_data['email'],
+            password=serializer.validated_data['password'],
+            principal_type=self.principal_type,
+        )
+        if principal is None:
+            return json_response({"error": "Invalid login credentials."}, status.HTTP_400_BAD_REQUEST)
+
+        self.logged_in(principal)
+        refresh = tokens_for(principal, self.principal_type)
+        return json_response({
+            self.success_key: True,
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        })
+
+    def logged_in(self, principal):
+        pass
+
+
+class AsyncDonorLoginView(AsyncLoginView):
+    serializer_class = DonorLoginSerializer
+    principal_type = PRINCIPAL_DONOR
+
+
+class AsyncDeliveryStaffLoginView(AsyncLoginView):
+    serializer_class = DeliveryStaffLoginSerializer
+    principal_type = PRINCIPAL_STAFF
+
+
+class AsyncHospitalLoginView(AsyncLoginView):
+    serializer_class = HospitalLoginSerializer
+    principal_type = PRINCIPAL_HOSPITAL
+    success_key = 'status'
+
+    def logged_in(self, principal):
+        logger.info("Hospital logged in", extra={'hospital_id': principal.pk})
+
+
+# Creating a request fans out to donor notifications and the channel layer;
+# listing stays on the DRF view and its keyset pagination
+class AsyncBloodRequestListCreateView(AsyncAPIView):
+    query_budget = {'GET': 2, 'POST': 4}
+    read_replica = True
+    sync_view = BloodRequestListCreateView
+    sync_view_methods = ('get',)
+
+    async def post(self, request):
+        # Permission first, as in DRF: a forbidden caller learns nothing from validation errors
+        if not request.principal.is_approved_hospital:
+            raise exceptions.PermissionDenied("Only approved hospitals can create blood requests.")
+        serializer = BloodRequestSerializer(data=self.get_json(request))
+        serializer.is_valid(raise_exception=True)
+
+        def create():
+            # Same save, notifications and broadcast as the DRF view
+            self.sync_view.create_blood_request(serializer, request.principal.pk)
+            return serializer.data
+
+        return json_response(await sync_to_async(create)(), status.HTTP_201_CREATED)
+
+
+# Dashboards poll the summary, served from the per-hospital cache with ETags
+class AsyncBloodUnitSummaryView(AsyncAPIView):
+    query_budget = 3
+    read_replica = True
+
+    async def get(self, request):
+        principal = request.principal
+        if not principal.is_hospital:
+            raise exceptions.PermissionDenied("You do not have access to this resource.")
+
+        async def build():
+            rows = [row async for row in summary_rows(principal.pk)]
+            return stock_summary(rows, await ahospital_forecasts(principal.pk))
+
+        return await acached_inventory_response(request, principal.pk, None, build)
@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .models import DeliveryStaff, Donor, Hospital
+from .tokens import (
+    PRINCIPAL_DONOR,
+    PRINCIPAL_HOSPITAL,
+    PRINCIPAL_STAFF,
+    PRINCIPAL_TYPE_CLAIM,
+)
+
+PRINCIPAL_MODELS = {
+    PRINCIPAL_DONOR: Donor,
+    PRINCIPAL_HOSPITAL: Hospital,
+    PRINCIPAL_STAFF: DeliveryStaff,
+}
+
+
+class TokenPrincipal:
+    """
+    Lightweight stand-in for the authenticated user, built from token claims
+    alone. Views that need the full row call ``get_object()``.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, principal_type, pk, email=None, approval_status=None, blood_type=None):
+        self.principal_type = principal_type
+        self.pk = self.id = pk
+        self.email = email
+        self.approval_status = approval_status
+        self.blood_type = blood_type
+
+    def __str__(self):
+        return f"{self.principal_type} {self.pk}"
+
+    @property
+    def is_donor(self):
+        return self.principal_type == PRINCIPAL_DONOR
+
+    @property
+    def is_hospital(self):
+        return self.principal_type == PRINCIPAL_HOSPITAL
+
+    @property
+    def is_delivery_staff(self):
+        return self.principal_type == PRINCIPAL_STAFF
+
+    @property
+    def is_approved_hospital(self):
+        return self.is_hospital and self.approval_status == 'approved'
+
+    @property
+    def cache_key(self):
+        return f"principal:{self.principal_type}:{self.pk}"
+
+    def get_object(self, use_cache=True):
+        """
+        Load the full Donor/Hospital/DeliveryStaff row, or None if it is gone.
+        Reads may be served from a short-lived cache; pass ``use_cache=False``
+        before modifying and saving the object.
+        """
+        if use_cache:
+            obj = cache.get(self.cache_key)
+            if obj is not None:
+                return obj
+        model = PRINCIPAL_MODELS[self.principal_type]
+        obj = model.objects.filter(pk=self.pk).first()
+        if obj is not None:
+            cache.set(self.cache_key, obj, getattr(settings, 'PRINCIPAL_CACHE_TTL', 30))
+        return obj
+
+    def invalidate(self):
+        cache.delete(self.cache_key)
+
+
+def principal_from_token(token):
+    """
+    Build a TokenPrincipal from a validated token, or return None for tokens
+    issued before the principal claims were added.
+    """
+    principal_type = token.get(PRINCIPAL_TYPE_CLAIM)
+    if principal_type not in PRINCIPAL_MODELS:
+        return None
+    try:
+        # simplejwt stores the id as a string; hand views the real pk type
+        pk = PRINCIPAL_MODELS[principal_type]._meta.pk.to_python(
+            token[settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id')]
+        )
+    except (KeyError, ValidationError):
+        raise InvalidToken("Token contained no recognizable user identification")
+    return TokenPrincipal(
+        principal_type,
+        pk,
+        email=token.get('email'),
+        approval_status=token.get('approval_status'),
+        blood_type=token.get('blood_type'),
+    )
+
+
+class PrincipalJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the principal claims in the token instead
+    of loading the user on every request.
+    """
+
+    def get_user(self, validated_token):
+        principal = principal_from_token(validated_token)
+        if principal is not None:
+            return principal
+
+        # Older tokens carry no claims and always referred to a hospital
+        hospital = super().get_user(validated_token)
+        if not isinstance(hospital, Hospital):
+            raise AuthenticationFailed("User not found", code='user_not_found')
+        return TokenPrincipal(
+            PRINCIPAL_HOSPITAL,
+            hospital.pk,
+            email=hospital.email,
+            approval_status=hospital.approval_status,
+        )
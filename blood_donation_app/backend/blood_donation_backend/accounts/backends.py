@@ -1,18 +1,109 @@
+import asyncio
+import logging
+
 from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import PermissionDenied
+from django.utils.crypto import get_random_string
+from .hashers import ahash_password, averify_password, hash_password, verify_password
 from .models import Donor, DeliveryStaff, Hospital
+from .tokens import PRINCIPAL_DONOR, PRINCIPAL_HOSPITAL, PRINCIPAL_STAFF
 from django.contrib.auth.backends import ModelBackend
 
+logger = logging.getLogger(__name__)
+
+_dummy_password_hash = None
+
+
+def dummy_password_hash():
+    """
+    A real hash made with the current default hasher, checked against when the
+    email is unknown so that case costs the same as a wrong password.
+    """
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = make_password(get_random_string(32))
+    return _dummy_password_hash
+
+
+class PrincipalBackend(BaseBackend):
+    """
+    Single backend for the donor, hospital and delivery staff login endpoints.
+
+    The endpoint passes ``principal_type``, so exactly one table is queried
+    and exactly one password hash is verified. A failed login raises
+    PermissionDenied, which stops Django trying the remaining backends.
+    """
+
+    models = {
+        PRINCIPAL_DONOR: Donor,
+        PRINCIPAL_HOSPITAL: Hospital,
+        PRINCIPAL_STAFF: DeliveryStaff,
+    }
+
+    def authenticate(self, request, email=None, password=None, principal_type=None, **kwargs):
+        if principal_type is None:
+            # Not an API login (e.g. the admin site); let the other backends handle it
+            return None
+        model = self.models[principal_type]
+        if email is None or password is None:
+            raise PermissionDenied
+
+        user = model.objects.filter(email=email).first()
+        if user is None:
+            verify_password(password, dummy_password_hash())
+            raise PermissionDenied
+
+        is_correct, must_update = verify_password(password, user.password)
+        if not is_correct or not user.is_active:
+            raise PermissionDenied
+        if must_update:
+            # Work factor or hasher changed since this hash was made; upgrade it now
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+        return user
+
+    async def aauthenticate(self, request, email=None, password=None, principal_type=None, **kwargs):
+        """
+        Async authenticate for the async login views: the lookup uses the async
+        ORM and hashing runs off the event loop.
+        """
+        if principal_type is None:
+            return None
+        model = self.models[principal_type]
+        if email is None or password is None:
+            raise PermissionDenied
+
+        user = await model.objects.filter(email=email).afirst()
+        if user is None:
+            # Making the dummy hash the first time is itself a full hash
+            await averify_password(password, await asyncio.to_thread(dummy_password_hash))
+            raise PermissionDenied
+
+        is_correct, must_update = await averify_password(password, user.password)
+        if not is_correct or not user.is_active:
+            raise PermissionDenied
+        if must_update:
+            user.password = await ahash_password(password)
+            await user.asave(update_fields=['password'])
+        return user
+
+    def get_user(self, user_id):
+        # Sessions are only used by the admin, which logs in hospitals
+        return Hospital.objects.filter(pk=user_id).first()
+
+
 
 class DonorBackend(BaseBackend):
     def authenticate(self, request, email=None, password=None, **kwargs):
-        print(f"Authenticating donor with email: {email}")  # Debug line
         try:
             donor = Donor.objects.get(email=email)
             if donor.check_password(password):
-                print("Authentication successful")  # Debug line
+                logger.debug("Donor authenticated", extra={'donor_id': donor.pk})
                 return donor
+            logger.debug("Donor authentication failed", extra={'donor_id': donor.pk, 'reason': 'password'})
         except Donor.DoesNotExist:
-            print("Donor does not exist")  # Debug line
+            logger.debug("Donor authentication failed", extra={'reason': 'unknown_email'})
         return None
 
     def get_user(self, user_id):
@@ -1,16 +1,102 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import principal_from_token
+from .models import Donor, Hospital
+from .realtime import blood_type_group, hospital_group
+from .tokens import PRINCIPAL_DONOR, PRINCIPAL_HOSPITAL, principal_type_of
+
+# Close codes sent when a connection is refused
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+class BloodRequestConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes new blood requests to connected clients.
+
+    Clients authenticate with their access token, either as ``?token=`` in
+    the URL or an ``Authorization: Bearer`` header. Donors join the group for
+    their blood type; hospitals join a group for their own requests.
+    """
 
-class BloodRequestConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        self.groups_joined = []
+        token = self.get_token()
+        if token is None:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+
+        groups = await self.resolve_groups(token)
+        if not groups:
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+
+        for group in groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.groups_joined = groups
         await self.accept()
 
-    async def receive(self, text_data):
-        # Handle the notification (text_data will be the blood request info)
-        data = json.loads(text_data)
-        blood_request_info = data.get('message')
+    async def disconnect(self, code):
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Clients only listen; answer keep-alive pings and ignore anything else
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def blood_request_created(self, event):
+        await self.send_json({'type': 'blood_request', 'request': event['request']})
+
+    async def inventory_expiry_alert(self, event):
+        await self.send_json({'type': 'expiry_alert', 'alert': event['alert']})
+
+    def get_token(self):
+        raw = None
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if query.get('token'):
+            raw = query['token'][0]
+        else:
+            headers = dict(self.scope.get('headers', []))
+            authorization = headers.get(b'authorization', b'').decode()
+            if authorization.startswith('Bearer '):
+                raw = authorization[len('Bearer '):]
+        if not raw:
+            return None
+        try:
+            return AccessToken(raw)
+        except TokenError:
+            return None
+
+    async def resolve_groups(self, token):
+        # Tokens carrying the principal claims need no database lookup
+        try:
+            principal = principal_from_token(token)
+        except InvalidToken:
+            return []
+        if principal is not None and principal.is_donor and principal.blood_type:
+            return [blood_type_group(principal.blood_type)]
+        if principal is not None and principal.is_hospital and principal.approval_status:
+            return [hospital_group(principal.pk)] if principal.is_approved_hospital else []
+        return await self.resolve_groups_from_db(token)
+
+    @database_sync_to_async
+    def resolve_groups_from_db(self, token):
+        user_id = token.get('user_id')
+        principal_type = principal_type_of(token)
+
+        if principal_type == PRINCIPAL_DONOR:
+            blood_type = Donor.objects.filter(pk=user_id, is_active=True)\
+                .values_list('blood_type', flat=True).first()
+            return [blood_type_group(blood_type)] if blood_type else []
+
+        if principal_type == PRINCIPAL_HOSPITAL:
+            is_approved = Hospital.objects.filter(pk=user_id, is_active=True, approval_status='approved').exists()
+            return [hospital_group(user_id)] if is_approved else []
 
-        # Send notification to connected clients
-        await self.send(text_data=json.dumps({
-            'message': blood_request_info
-        }))
+        return []
@@ -0,0 +1,395 @@
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .geo import distances_km, haversine_km
+from .models import DeliveryJob, DeliveryStaff, Transfer
+from .transfers import complete_transfer
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+PICKUP = 'pickup'
+DROPOFF = 'dropoff'
+
+
+class DeliveryError(Exception):
+    pass
+
+
+def vehicle_capacity(vehicle_type):
+    """
+    Units a vehicle can carry, from DELIVERY_VEHICLE_CAPACITY keyed by the
+    (case-insensitive) ``vehicle_type`` staff registered with.
+    """
+    capacities = getattr(settings, 'DELIVERY_VEHICLE_CAPACITY', {})
+    default = getattr(settings, 'DELIVERY_DEFAULT_CAPACITY', 8)
+    return capacities.get((vehicle_type or '').strip().lower(), default)
+
+
+class Job:
+    """
+    A pickup/drop-off pair to be routed: ``quantity`` units from ``pickup`` to
+    ``dropoff``, both ``(lat, lng)``.
+    """
+    __slots__ = ('id', 'quantity', 'pickup', 'dropoff')
+
+    def __init__(self, id, quantity, pickup, dropoff):
+        self.id = id
+        self.quantity = quantity
+        self.pickup = pickup
+        self.dropoff = dropoff
+
+
+class Stop:
+    __slots__ = ('job_id', 'kind', 'point', 'load')
+
+    def __init__(self, job_id, kind, point, load):
+        self.job_id = job_id
+        self.kind = kind
+        self.point = point
+        # Change in units on board when the stop is served
+        self.load = load
+
+
+class Route:
+    """
+    One driver's open route: starts at the driver's position with ``onboard``
+    units already picked up, and visits ``stops`` in order.
+    """
+
+    def __init__(self, staff_id, origin, capacity, stops=None, onboard=0):
+        self.staff_id = staff_id
+        self.origin = origin
+        self.capacity = capacity
+        self.stops = list(stops or [])
+        self.onboard = onboard
+
+    @property
+    def anchor(self):
+        # Where the driver will be once the current route is done
+        return self.stops[-1].point if self.stops else self.origin
+
+    def length_km(self):
+        points = [self.origin] + [stop.point for stop in self.stops]
+        return sum(haversine_km(*a, *b) for a, b in zip(points, points[1:]))
+
+    def best_insertion(self, job):
+        """
+        Cheapest feasible place for the job's pickup and drop-off, keeping the
+        existing stops in order and the load within capacity. Returns
+        ``(added_km, i, j)`` (insert the pickup after point i and the drop-off
+        after point j of origin + stops) or None.
+        """
+        if job.quantity > self.capacity:
+            return None
+        points = [self.origin] + [stop.point for stop in self.stops]
+        count = len(points)
+
+        loads = [self.onboard]
+        for stop in self.stops:
+            loads.append(loads[-1] + stop.load)
+
+        legs = [haversine_km(*points[k], *points[k + 1]) for k in range(count - 1)]
+
+        def detours(point):
+            into = [haversine_km(*p, *point) for p in points]
+            out = [haversine_km(*point, *points[k + 1]) for k in range(count - 1)]
+            # The last slot extends the open route, so there is no leg to replace
+            return into, [into[k] + out[k] - legs[k] for k in range(count - 1)] + [into[-1]], out
+
+        pickup_into, pickup_detour, _ = detours(job.pickup)
+        _, dropoff_detour, dropoff_out = detours(job.dropoff)
+        direct = haversine_km(*job.pickup, *job.dropoff)
+
+        best = None
+        spare = self.capacity - job.quantity
+        for i in range(count):
+            if loads[i] > spare:
+                continue
+            # Pickup immediately followed by its drop-off
+            cost = pickup_into[i] + direct + (dropoff_out[i] - legs[i] if i < count - 1 else 0)
+            if best is None or cost < best[0]:
+                best = (cost, i, i)
+            peak = loads[i]
+            for j in range(i + 1, count):
+                peak = max(peak, loads[j])
+                if peak > spare:
+                    break
+                cost = pickup_detour[i] + dropoff_detour[j]
+                if cost < best[0]:
+                    best = (cost, i, j)
+        return best
+
+    def insert(self, job, i, j):
+        self.stops.insert(i, Stop(job.id, PICKUP, job.pickup, job.quantity))
+        self.stops.insert(j + 1, Stop(job.id, DROPOFF, job.dropoff, -job.quantity))
+
+
+class Dispatcher:
+    """
+    Incremental routing for a fleet: each new job is inserted into the
+    existing routes at its cheapest feasible position (cheapest insertion),
+    so earlier assignments are never re-solved. Only the
+    ``candidates_per_job`` drivers nearest the pickup are tried; they are
+    picked with one vectorised distance computation over the fleet.
+    """
+
+    def __init__(self, routes, candidates_per_job=None):
+        if candidates_per_job is None:
+            candidates_per_job = getattr(settings, 'DELIVERY_CANDIDATE_DRIVERS', 8)
+        self.routes = list(routes)
+        self.candidates_per_job = candidates_per_job
+        self._latitudes = [route.anchor[0] for route in self.routes]
+        self._longitudes = [route.anchor[1] for route in self.routes]
+        if np is not None:
+            self._latitudes = np.asarray(self._latitudes, dtype=float)
+            self._longitudes = np.asarray(self._longitudes, dtype=float)
+
+    def _nearest_routes(self, point):
+        if not self.routes:
+            return []
+        distances = distances_km(self._latitudes, self._longitudes, *point)
+        limit = self.candidates_per_job
+        if len(self.routes) <= limit:
+            return range(len(self.routes))
+        if np is not None:
+            return np.argpartition(distances, limit)[:limit].tolist()
+        return heapq.nsmallest(limit, range(len(self.routes)), key=distances.__getitem__)
+
+    def assign(self, job):
+        """
+        Insert the job into the cheapest candidate route. Returns that Route,
+        or None when no nearby driver can take it.
+        """
+        best = None
+        for index in self._nearest_routes(job.pickup):
+            insertion = self.routes[index].best_insertion(job)
+            if insertion is not None and (best is None or insertion[0] < best[0][0]):
+                best = (insertion, index)
+        if best is None:
+            return None
+        (_cost, i, j), index = best
+        route = self.routes[index]
+        route.insert(job, i, j)
+        self._latitudes[index], self._longitudes[index] = route.anchor
+        return route
+
+
+def _hospital_point(hospital):
+    if hospital.latitude is None or hospital.longitude is None:
+        return None
+    return (hospital.latitude, hospital.longitude)
+
+
+def create_transfer_jobs():
+    """
+    Open a delivery job for every proposed transfer that doesn't have one yet.
+    """
+    transfers = Transfer.objects.filter(status='proposed', delivery_job__isnull=True)
+    return DeliveryJob.objects.bulk_create([
+        DeliveryJob(
+            transfer=transfer,
+            pickup_hospital_id=transfer.from_hospital_id,
+            dropoff_hospital_id=transfer.to_hospital_id,
+            quantity=transfer.quantity,
+        )
+        for transfer in transfers
+    ])
+
+
+def load_routes():
+    """
+    Rebuild the current routes of available drivers from the stored stop
+    sequences. Driver rows are locked so concurrent dispatch runs queue up.
+    A driver with a stop at a hospital that has no coordinates can't have
+    their route costed, so they are left out until that job is done.
+    """
+    staff_rows = list(
+        DeliveryStaff.objects.select_for_update()
+        .filter(is_active=True, is_available=True, latitude__isnull=False, longitude__isnull=False)
+        .order_by('pk')
+        .values_list('pk', 'latitude', 'longitude', 'vehicle_type')
+    )
+    stops = defaultdict(list)
+    onboard = defaultdict(int)
+    unroutable = set()
+    jobs = DeliveryJob.objects.filter(
+        delivery_staff_id__in=[row[0] for row in staff_rows],
+        status__in=DeliveryJob.ACTIVE_STATUSES,
+    ).select_related('pickup_hospital', 'dropoff_hospital')
+    for job in jobs:
+        pickup = _hospital_point(job.pickup_hospital) if job.status == 'assigned' else None
+        dropoff = _hospital_point(job.dropoff_hospital)
+        if dropoff is None or (job.status == 'assigned' and pickup is None):
+            logger.warning(
+                "Delivery %s has a stop at a hospital without coordinates; not routing more jobs to driver %s",
+                job.pk, job.delivery_staff_id,
+            )
+            unroutable.add(job.delivery_staff_id)
+            continue
+        if job.status == 'assigned':
+            stops[job.delivery_staff_id].append((job.pickup_sequence, Stop(job.pk, PICKUP, pickup, job.quantity)))
+        else:
+            onboard[job.delivery_staff_id] += job.quantity
+        stops[job.delivery_staff_id].append((job.dropoff_sequence, Stop(job.pk, DROPOFF, dropoff, -job.quantity)))
+    return [
+        Route(
+            staff_id, (latitude, longitude), vehicle_capacity(vehicle_type),
+            stops=[stop for _sequence, stop in sorted(stops[staff_id], key=lambda item: item[0])],
+            onboard=onboard[staff_id],
+        )
+        for staff_id, latitude, longitude, vehicle_type in staff_rows
+        if staff_id not in unroutable
+    ]
+
+
+def dispatch_pending_jobs():
+    """
+    Route every pending job onto the available fleet, oldest first, without
+    disturbing the relative order of stops drivers already have. Jobs no
+    driver can take (too far, too large, hospital without coordinates) stay
+    pending for the next run. Returns the jobs assigned.
+    """
+    with transaction.atomic():
+        dispatcher = Dispatcher(load_routes())
+        pending = list(
+            DeliveryJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='pending')
+            .select_related('pickup_hospital', 'dropoff_hospital')
+            .order_by('created_at', 'pk')
+        )
+        assigned = {}
+        touched = {}
+        for job in pending:
+            pickup, dropoff = _hospital_point(job.pickup_hospital), _hospital_point(job.dropoff_hospital)
+            if pickup is None or dropoff is None:
+                continue
+            route = dispatcher.assign(Job(job.pk, job.quantity, pickup, dropoff))
+            if route is not None:
+                assigned[job.pk] = (job, route.staff_id)
+                touched[route.staff_id] = route
+        if not assigned:
+            return []
+
+        # Renumber every stop on the routes that changed
+        sequences = {}
+        for route in touched.values():
+            for position, stop in enumerate(route.stops):
+                sequences[(stop.job_id, stop.kind)] = position
+        now = timezone.now()
+        updates = list(
+            DeliveryJob.objects.filter(delivery_staff_id__in=list(touched), status__in=DeliveryJob.ACTIVE_STATUSES)
+        )
+        for job, staff_id in assigned.values():
+            job.status = 'assigned'
+            job.delivery_staff_id = staff_id
+            job.assigned_at = now
+            updates.append(job)
+        for job in updates:
+            job.pickup_sequence = sequences.get((job.pk, PICKUP))
+            job.dropoff_sequence = sequences.get((job.pk, DROPOFF))
+        DeliveryJob.objects.bulk_update(
+            updates, ['status', 'delivery_staff', 'assigned_at', 'pickup_sequence', 'dropoff_sequence'],
+        )
+
+        by_staff = defaultdict(list)
+        for job, staff_id in assigned.values():
+            if job.transfer_id is not None:
+                by_staff[staff_id].append(job.transfer_id)
+        for staff_id, transfer_ids in by_staff.items():
+            Transfer.objects.filter(pk__in=transfer_ids, status='proposed')\
+                .update(status='assigned', delivery_staff_id=staff_id)
+    return [job for job, _staff_id in assigned.values()]
+
+
+_executor = None
+_scheduled = False
+_schedule_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _schedule_lock:
+        if _executor is None:
+            # One thread, so dispatch runs never overlap each other
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='delivery-dispatch')
+        return _executor
+
+
+def _run_scheduled_dispatch():
+    global _scheduled
+    # Let a burst of new jobs and drivers coming on shift land in one run
+    time.sleep(getattr(settings, 'DELIVERY_DISPATCH_DELAY', 1))
+    with _schedule_lock:
+        # Anything scheduled from here on may not be seen by this run, so it queues another
+        _scheduled = False
+    try:
+        dispatch_pending_jobs()
+    except Exception:
+        logger.exception("Scheduled delivery dispatch failed")
+    finally:
+        # The worker thread owns its connection; don't leave it open between runs
+        connection.close()
+
+
+def _schedule():
+    global _scheduled
+    with _schedule_lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    _get_executor().submit(_run_scheduled_dispatch)
+
+
+def schedule_dispatch():
+    """
+    Run dispatch_pending_jobs on a background thread once the surrounding
+    transaction commits. Calls made while a run is waiting to start share
+    it, so a burst of requests costs one dispatch, not one each.
+    """
+    transaction.on_commit(_schedule)
+
+
+def pick_up_job(job_id, staff_id):
+    """
+    Record that the driver has collected the job's units.
+    """
+    with transaction.atomic():
+        job = DeliveryJob.objects.select_for_update().get(pk=job_id, delivery_staff_id=staff_id)
+        if job.status != 'assigned':
+            raise DeliveryError(f"Delivery {job.pk} is {job.status}, not assigned.")
+        job.status = 'picked_up'
+        job.save(update_fields=['status'])
+        if job.transfer_id is not None:
+            Transfer.objects.filter(pk=job.transfer_id).update(status='in_transit')
+    return job
+
+
+def drop_off_job(job_id, staff_id):
+    """
+    Record delivery. For a transfer this also moves the stock between the two
+    hospitals (see accounts.transfers.complete_transfer) in the same
+    transaction.
+    """
+    with transaction.atomic():
+        job = DeliveryJob.objects.select_for_update().get(pk=job_id, delivery_staff_id=staff_id)
+        if job.status != 'picked_up':
+            raise DeliveryError(f"Delivery {job.pk} is {job.status}, not picked up.")
+        if job.transfer_id is not None:
+            complete_transfer(job.transfer_id)
+        job.status = 'delivered'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'completed_at'])
+    return job
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Donation, Donor
+
+
+def deferral_interval():
+    return timedelta(days=getattr(settings, 'DONATION_DEFERRAL_DAYS', 56))
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        # 29 February in a non-leap year
+        return day.replace(year=day.year - years, day=28)
+
+
+def next_eligible_date(last_donation_date):
+    if last_donation_date is None:
+        return None
+    return last_donation_date + deferral_interval()
+
+
+def eligible_donors_q(today=None):
+    """
+    Q matching donors who may donate today: active, within the age limits
+    (from ``dob``) and past their deferral window. Dates are worked out here
+    so the database only compares indexed columns against constants.
+    """
+    today = today or timezone.localdate()
+    min_age = getattr(settings, 'DONOR_MIN_AGE', 18)
+    max_age = getattr(settings, 'DONOR_MAX_AGE', 65)
+
+    # Born on or before this date: at least min_age today
+    latest_dob = _years_before(today, min_age)
+    # Born after this date: hasn't turned max_age + 1 yet
+    earliest_dob = _years_before(today, max_age + 1)
+
+    return (
+        Q(is_active=True, dob__lte=latest_dob, dob__gt=earliest_dob)
+        & (Q(next_eligible_date__isnull=True) | Q(next_eligible_date__lte=today))
+    )
+
+
+def refresh_next_eligible_date(donor_id):
+    """
+    Recompute one donor's ``next_eligible_date`` from their donation history.
+    """
+    last = Donation.objects.filter(donor_id=donor_id).aggregate(last=Max('donation_date'))['last']
+    Donor.objects.filter(pk=donor_id).update(next_eligible_date=next_eligible_date(last))
+
+
+def backfill_next_eligible_dates(chunk_size=2000):
+    """
+    Recompute ``next_eligible_date`` for every donor, a chunk of donors at a
+    time. Returns the number of donors whose value changed.
+    """
+    changed = 0
+    last_pk = 0
+    while True:
+        donors = list(
+            Donor.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'next_eligible_date')[:chunk_size]
+        )
+        if not donors:
+            return changed
+        last_pk = donors[-1].pk
+
+        last_donations = dict(
+            Donation.objects.filter(donor_id__in=[donor.pk for donor in donors])
+            .values('donor_id').annotate(last=Max('donation_date'))
+            .values_list('donor_id', 'last')
+        )
+        stale = []
+        for donor in donors:
+            expected = next_eligible_date(last_donations.get(donor.pk))
+            if donor.next_eligible_date != expected:
+                donor.next_eligible_date = expected
+                stale.append(donor)
+        Donor.objects.bulk_update(stale, ['next_eligible_date'], batch_size=chunk_size)
+        changed += len(stale)
+
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Min, Sum, Value, When
+from django.utils import timezone
+
+from .inventory_cache import inventory_versions
+from .models import BloodUnit
+from .realtime import send_expiry_alert
+
+# Bucket names, most urgent first
+CRITICAL = 'critical'
+HIGH = 'high'
+MEDIUM = 'medium'
+
+# Buckets that trigger an alert to the hospital
+ALERT_BUCKETS = (CRITICAL, HIGH)
+
+
+def expiry_buckets():
+    """
+    ``[(bucket, days), ...]``: a unit is in the first bucket whose ``days`` it
+    expires within (0 = expires today).
+    """
+    days = getattr(settings, 'EXPIRY_RISK_BUCKET_DAYS', {CRITICAL: 1, HIGH: 3, MEDIUM: 7})
+    return sorted(days.items(), key=lambda item: item[1])
+
+
+def expiry_bucket_expression(today):
+    """
+    CASE expression naming each unit's near-expiry bucket. Cut-off dates are
+    worked out here so the database only compares the indexed
+    ``expiration_date`` against constants.
+    """
+    return Case(
+        *[
+            When(expiration_date__lte=today + timedelta(days=days), then=Value(bucket))
+            for bucket, days in expiry_buckets()
+        ],
+        default=Value(None),
+        output_field=CharField(),
+    )
+
+
+def expiry_risk_rows(today=None, hospital_ids=None):
+    """
+    Near-expiry available stock for every hospital (or just ``hospital_ids``)
+    grouped by hospital, blood type and bucket, in one query.
+    """
+    today = today or timezone.localdate()
+    horizon = today + timedelta(days=expiry_buckets()[-1][1])
+    queryset = BloodUnit.objects.filter(
+        status='available', expiration_date__gte=today, expiration_date__lte=horizon,
+    )
+    if hospital_ids is not None:
+        queryset = queryset.filter(hospital_id__in=hospital_ids)
+    return (
+        queryset.annotate(bucket=expiry_bucket_expression(today))
+        .values('hospital_id', 'blood_type', 'bucket')
+        .annotate(units=Count('id'), quantity=Sum('quantity'), earliest_expiration=Min('expiration_date'))
+        .order_by('hospital_id', 'blood_type', 'bucket')
+    )
+
+
+def build_reports(rows, today):
+    """
+    Turn grouped rows into one report per hospital: the buckets with their
+    stock, and the days left until the earliest unit in each expires.
+    """
+    order = {bucket: position for position, (bucket, _days) in enumerate(expiry_buckets())}
+    reports = defaultdict(list)
+    for row in rows:
+        reports[row['hospital_id']].append({
+            'blood_type': row['blood_type'],
+            'bucket': row['bucket'],
+            'units': row['units'],
+            'quantity': row['quantity'],
+            'earliest_expiration': row['earliest_expiration'].isoformat(),
+            'days_to_expire': (row['earliest_expiration'] - today).days,
+        })
+    return {
+        hospital_id: {
+            'date': today.isoformat(),
+            'buckets': sorted(entries, key=lambda entry: (order[entry['bucket']], entry['blood_type'])),
+        }
+        for hospital_id, entries in reports.items()
+    }
+
+
+def _cache_key(hospital_id, today, version):
+    # The hospital's inventory version changes with every stock write (see
+    # accounts.inventory_cache.invalidate_inventory), which drops the report too
+    return f"expiry-risk:{hospital_id}:{version}:{today.isoformat()}"
+
+
+def _cache_ttl():
+    return getattr(settings, 'EXPIRY_RISK_CACHE_TTL', 900)
+
+
+def _empty_report(today):
+    return {'date': today.isoformat(), 'buckets': []}
+
+
+def hospital_expiry_report(hospital_id, today=None, refresh=False):
+    """
+    One hospital's expiry-risk report, from the cache the periodic job fills
+    when possible.
+    """
+    today = today or timezone.localdate()
+    # Read the version before the rows, so a write committing meanwhile leaves
+    # this report under a version nobody asks for again
+    key = _cache_key(hospital_id, today, inventory_versions([hospital_id])[hospital_id])
+    if not refresh:
+        report = cache.get(key)
+        if report is not None:
+            return report
+    report = build_reports(expiry_risk_rows(today, [hospital_id]), today).get(hospital_id) or _empty_report(today)
+    cache.set(key, report, _cache_ttl())
+    return report
+
+
+def refresh_expiry_reports(hospital_ids, today=None):
+    """
+    Recompute the reports for all ``hospital_ids`` with a single grouped
+    query and cache each one. Returns ``{hospital_id: report}``.
+    """
+    today = today or timezone.localdate()
+    versions = inventory_versions(hospital_ids)
+    reports = build_reports(expiry_risk_rows(today), today)
+    for hospital_id in hospital_ids:
+        reports.setdefault(hospital_id, _empty_report(today))
+    cache.set_many(
+        {_cache_key(hospital_id, today, version): reports[hospital_id] for hospital_id, version in versions.items()},
+        _cache_ttl(),
+    )
+    return reports
+
+
+def _alert_signature(entries):
+    return tuple((entry['blood_type'], entry['bucket'], entry['quantity']) for entry in entries)
+
+
+def send_expiry_alerts(reports):
+    """
+    Push an alert to every hospital with stock in the alert buckets. A
+    hospital is alerted again only when that stock changes. Returns the
+    number of alerts sent.
+    """
+    sent = 0
+    for hospital_id, report in reports.items():
+        urgent = [entry for entry in report['buckets'] if entry['bucket'] in ALERT_BUCKETS]
+        key = f"expiry-alert:{hospital_id}"
+        signature = _alert_signature(urgent)
+        if not urgent or cache.get(key) == signature:
+            continue
+        send_expiry_alert(hospital_id, {'date': report['date'], 'buckets': urgent})
+        cache.set(key, signature, 24 * 60 * 60)
+        sent += 1
+    return sent
+
@@ -0,0 +1,252 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .eligibility import eligible_donors_q
+from .models import BloodRequest, BloodUnit, Donor
+
+CSV = 'csv'
+PARQUET = 'parquet'
+FORMATS = (CSV, PARQUET)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _day_bounds(since, until):
+    """
+    Aware datetimes for [since 00:00, the day after until 00:00), so
+    timestamp columns are compared directly and their indexes stay usable.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(since, time.min), tz) if since else None
+    end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min), tz) if until else None
+    return start, end
+
+
+def _created_between(queryset, since, until):
+    start, end = _day_bounds(since, until)
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+def blood_requests_rows(since=None, until=None, hospital_id=None):
+    queryset = BloodRequest.objects.all()
+    if hospital_id is not None:
+        queryset = queryset.filter(hospital_id=hospital_id)
+    return _created_between(queryset, since, until).order_by('pk').values_list(
+        'id', 'hospital_id', 'hospital__hospital_name', 'blood_type', 'quantity', 'priority_level',
+        'status', 'created_at', 'fulfilled_at',
+    )
+
+
+def blood_units_rows(since=None, until=None, hospital_id=None):
+    queryset = BloodUnit.objects.all()
+    if hospital_id is not None:
+        queryset = queryset.filter(hospital_id=hospital_id)
+    return _created_between(queryset, since, until).order_by('pk').values_list(
+        'id', 'hospital_id', 'blood_type', 'quantity', 'status', 'expiration_date', 'created_at', 'allocated_to_id',
+    )
+
+
+def donor_aggregate_rows(since=None, until=None, hospital_id=None):
+    """
+    Donor counts per blood type and gender, with donations made in the date
+    range (at ``hospital_id`` only, if given). No personal data leaves.
+    """
+    donations = Q()
+    if since:
+        donations &= Q(donations__donation_date__gte=since)
+    if until:
+        donations &= Q(donations__donation_date__lte=until)
+    if hospital_id is not None:
+        donations &= Q(donations__hospital_id=hospital_id)
+    return (
+        Donor.objects.values('blood_type', 'gender')
+        .annotate(
+            donors=Count('id', distinct=True),
+            active_donors=Count('id', filter=Q(is_active=True), distinct=True),
+            eligible_donors=Count('id', filter=eligible_donors_q(), distinct=True),
+            donations=Count('donations', filter=donations or None, distinct=True),
+        )
+        .order_by('blood_type', 'gender')
+        .values_list('blood_type', 'gender', 'donors', 'active_donors', 'eligible_donors', 'donations')
+    )
+
+
+# name -> (columns as (name, type), row queryset builder)
+DATASETS = {
+    'blood-requests': (
+        [
+            ('id', 'int'), ('hospital_id', 'int'), ('hospital_name', 'str'), ('blood_type', 'str'),
+            ('quantity', 'int'), ('priority_level', 'str'), ('status', 'str'),
+            ('created_at', 'datetime'), ('fulfilled_at', 'datetime'),
+        ],
+        blood_requests_rows,
+    ),
+    'blood-units': (
+        [
+            ('id', 'int'), ('hospital_id', 'int'), ('blood_type', 'str'), ('quantity', 'int'),
+            ('status', 'str'), ('expiration_date', 'date'), ('created_at', 'datetime'),
+            ('allocated_to_id', 'int'),
+        ],
+        blood_units_rows,
+    ),
+    'donors': (
+        [
+            ('blood_type', 'str'), ('gender', 'str'), ('donors', 'int'), ('active_donors', 'int'),
+            ('eligible_donors', 'int'), ('donations', 'int'),
+        ],
+        donor_aggregate_rows,
+    ),
+}
+
+
+def _chunks(rows, chunk_size):
+    """
+    Group rows read through a server-side cursor (``iterator``) into lists of
+    ``chunk_size``, so only one chunk is ever held in memory.
+    """
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Buffer:
+    """
+    Write-only sink that hands back whatever was written since the last
+    drain; lets csv and Parquet writers feed a streaming response.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.parts[0][:0].join(self.parts) if self.parts else b''
+        self.parts = []
+        return data
+
+
+def iter_csv(columns, rows, chunk_size):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _kind in columns])
+    yield buffer.drain().encode()
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.drain().encode()
+
+
+def _arrow_schema(pa, columns):
+    types = {
+        'int': pa.int64(),
+        'str': pa.string(),
+        'date': pa.date32(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:  # pragma: no cover - pyarrow is optional
+        raise ExportError("Parquet export needs the pyarrow package.")
+    return pyarrow, pyarrow.parquet
+
+
+def iter_parquet(columns, rows, chunk_size):
+    """
+    Parquet with one row group per chunk, each flushed to the client as soon
+    as it is written.
+    """
+    pa, pq = _pyarrow()
+    schema = _arrow_schema(pa, columns)
+    buffer = _Buffer()
+    sink = pa.PythonFile(buffer, mode='w')
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)],
+                schema=schema,
+            ))
+            yield buffer.drain()
+    finally:
+        writer.close()
+    yield buffer.drain()
+
+
+async def aiter_stream(chunks):
+    """
+    Async iterator over a sync chunk iterator, for streaming responses under
+    ASGI. Django would otherwise read a sync iterator into a list before
+    sending any of it. Each chunk is pulled on the request's sync thread, so
+    the cursor stays on the connection that opened it.
+    """
+    done = object()
+    pull = sync_to_async(next)
+    try:
+        while True:
+            chunk = await pull(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        # Release the cursor even if the client goes away mid-download
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def export_stream(dataset, file_format, since=None, until=None, hospital_id=None, chunk_size=None):
+    """
+    Byte chunks of ``dataset`` in ``file_format``. Rows are read with a
+    server-side cursor and written a chunk at a time, so memory stays flat
+    however large the table.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}'.")
+    if file_format not in FORMATS:
+        raise ExportError(f"Unknown format '{file_format}'.")
+    if since and until and since > until:
+        raise ExportError("'since' must not be after 'until'.")
+    columns, build_rows = DATASETS[dataset]
+    rows = build_rows(since=since, until=until, hospital_id=hospital_id)
+    chunk_size = chunk_size or _chunk_size()
+    if file_format == PARQUET:
+        # Fail now rather than once the response has started streaming
+        _pyarrow()
+        return iter_parquet(columns, rows, chunk_size)
+    return iter_csv(columns, rows, chunk_size)
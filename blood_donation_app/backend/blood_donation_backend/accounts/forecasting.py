@@ -0,0 +1,266 @@
+import math
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .inventory_cache import invalidate_inventory
+from .models import BloodRequest, DemandForecast, HospitalInventorySummary
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+
+class ForecastError(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def low_stock_threshold():
+    """
+    Threshold used for blood types that have no forecast yet.
+    """
+    return _setting('LOW_STOCK_THRESHOLD', 5)
+
+
+def _require_numpy():
+    if np is None:  # pragma: no cover - numpy is optional
+        raise ForecastError("Demand forecasting needs the numpy package.")
+
+
+def demand_history(today, days, keys=()):
+    """
+    Daily requested quantity for every hospital and blood type over the
+    ``days`` full days before ``today``, read with one grouped query. Returns
+    the ``(hospital_id, blood_type)`` series keys and a ``(series, days)``
+    array; ``keys`` adds series with no requests (all zeros).
+    """
+    start = today - timedelta(days=days)
+    tz = timezone.get_current_timezone()
+    rows = (
+        BloodRequest.objects.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            created_at__lt=timezone.make_aware(datetime.combine(today, time.min), tz),
+        )
+        .exclude(status='canceled')
+        .annotate(day=TruncDate('created_at'))
+        .values('hospital_id', 'blood_type', 'day')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+
+    index = {key: position for position, key in enumerate(keys)}
+    cells = []
+    for row in rows:
+        position = index.setdefault((row['hospital_id'], row['blood_type']), len(index))
+        cells.append((position, (row['day'] - start).days, row['quantity']))
+
+    demand = np.zeros((len(index), days))
+    if cells:
+        series, day, quantity = np.array(cells, dtype=np.int64).T
+        demand[series, day] = quantity
+    return list(index), demand
+
+
+def _alphas():
+    return np.asarray(_setting('FORECAST_SMOOTHING_GRID', (0.05, 0.1, 0.2, 0.3, 0.5)), dtype=float)
+
+
+def fit_smoothing(demand, alphas=None, warmup=7):
+    """
+    Fit simple exponential smoothing to every row of ``demand`` at once.
+    Each series starts from the mean of its first ``warmup`` days and is run
+    with every smoothing factor in ``alphas`` in parallel, one vector step
+    per day; the factor with the lowest one-step-ahead squared error after
+    the warm-up wins. Returns per-series arrays of the final level (the
+    daily demand forecast), the chosen factor and the forecast error's
+    standard deviation.
+    """
+    alphas = _alphas() if alphas is None else np.asarray(alphas, dtype=float)
+    series, days = demand.shape
+    warmup = max(min(warmup, days - 1), 1)
+    level = np.tile(demand[:, :warmup].mean(axis=1), (len(alphas), 1))
+    sse = np.zeros((len(alphas), series))
+    weights = alphas[:, None]
+    for day in range(warmup, days):
+        error = demand[:, day] - level
+        sse += error ** 2
+        level += weights * error
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(series)
+    scored = max(days - warmup, 1)
+    return (
+        np.maximum(level[best, columns], 0.0),
+        alphas[best],
+        np.sqrt(sse[best, columns] / scored),
+    )
+
+
+def reorder_thresholds(daily_demand, demand_std, cover_days=None, service_z=None, minimum=None):
+    """
+    Stock that covers expected demand over ``cover_days`` (restocking lead
+    time plus the nightly review interval) with a safety margin of
+    ``service_z`` standard deviations, rounded up.
+    """
+    cover_days = cover_days or _setting('FORECAST_COVER_DAYS', 3)
+    service_z = _setting('FORECAST_SERVICE_LEVEL_Z', 1.65) if service_z is None else service_z
+    minimum = _setting('FORECAST_MIN_THRESHOLD', 1) if minimum is None else minimum
+    thresholds = np.ceil(daily_demand * cover_days + service_z * demand_std * math.sqrt(cover_days))
+    return np.maximum(thresholds, minimum).astype(int)
+
+
+def days_of_cover(stock, daily_demand):
+    """
+    Days ``stock`` lasts at ``daily_demand``; NaN where there is no demand.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(daily_demand > 0, stock / daily_demand, np.nan)
+
+
+def backtest(demand, horizon, alphas=None, warmup=7):
+    """
+    Hold out the last ``horizon`` days, fit on the rest and score the flat
+    forecast against what was actually requested. Returns per-series WAPE
+    (NaN for series with no demand in the holdout) and an overall summary
+    that includes the WAPE of the plain historical mean for comparison.
+    """
+    train, test = demand[:, :-horizon], demand[:, -horizon:]
+    level, _alpha, _std = fit_smoothing(train, alphas, warmup)
+    error = np.abs(test - level[:, None]).sum(axis=1)
+    naive_error = np.abs(test - train.mean(axis=1)[:, None]).sum(axis=1)
+    actual = test.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wape = np.where(actual > 0, error / actual, np.nan)
+    total = actual.sum()
+    return wape, {
+        'horizon_days': horizon,
+        'series': int((actual > 0).sum()),
+        'wape': float(error.sum() / total) if total else None,
+        'naive_wape': float(naive_error.sum() / total) if total else None,
+    }
+
+
+def _optional(value, digits):
+    return None if math.isnan(value) else round(float(value), digits)
+
+
+def refresh_forecasts(today=None):
+    """
+    Refit every hospital and blood type series and store the forecasts,
+    thresholds and backtest scores, replacing the previous run. Series are
+    those with requests in the history window or stock on hand. Returns a
+    summary of the run.
+    """
+    _require_numpy()
+    today = today or timezone.localdate()
+    history_days = _setting('FORECAST_HISTORY_DAYS', 90)
+    horizon = _setting('FORECAST_BACKTEST_DAYS', 14)
+
+    stock = {
+        (hospital_id, blood_type): quantity
+        for hospital_id, blood_type, quantity in HospitalInventorySummary.objects.values_list(
+            'hospital_id', 'blood_type', 'available_quantity',
+        )
+    }
+    keys, demand = demand_history(today, history_days, keys=stock)
+    level, alpha, std = fit_smoothing(demand)
+    thresholds = reorder_thresholds(level, std)
+    cover = days_of_cover(np.array([stock.get(key, 0) for key in keys], dtype=float), level)
+    if history_days > horizon * 2:
+        wape, accuracy = backtest(demand, horizon)
+    else:
+        wape, accuracy = np.full(len(keys), np.nan), None
+
+    now = timezone.now()
+    forecasts = [
+        DemandForecast(
+            hospital_id=hospital_id,
+            blood_type=blood_type,
+            daily_demand=round(float(level[position]), 3),
+            demand_std=round(float(std[position]), 3),
+            smoothing=float(alpha[position]),
+            reorder_threshold=int(thresholds[position]),
+            days_of_cover=_optional(cover[position], 1),
+            backtest_wape=_optional(wape[position], 3),
+            history_days=history_days,
+            computed_at=now,
+        )
+        for position, (hospital_id, blood_type) in enumerate(keys)
+    ]
+    with transaction.atomic():
+        DemandForecast.objects.bulk_create(
+            forecasts,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['hospital', 'blood_type'],
+            update_fields=[
+                'daily_demand', 'demand_std', 'smoothing', 'reorder_threshold', 'days_of_cover',
+                'backtest_wape', 'history_days', 'computed_at',
+            ],
+        )
+        stale = DemandForecast.objects.filter(computed_at__lt=now)
+        hospital_ids = {hospital_id for hospital_id, _blood_type in keys}
+        hospital_ids.update(stale.values_list('hospital_id', flat=True))
+        stale.delete()
+        # Cached dashboard summaries carry the old thresholds
+        for hospital_id in hospital_ids:
+            invalidate_inventory(hospital_id)
+
+    return {
+        'series': len(keys),
+        'history_days': history_days,
+        'below_threshold': sum(
+            1 for position, key in enumerate(keys) if stock.get(key, 0) < thresholds[position]
+        ),
+        'backtest': accuracy,
+    }
+
+
+def _forecast_values(hospital_id):
+    return DemandForecast.objects.filter(hospital_id=hospital_id).values(
+        'blood_type', 'daily_demand', 'reorder_threshold', 'backtest_wape',
+    )
+
+
+def hospital_forecasts(hospital_id):
+    """
+    ``{blood_type: forecast values}`` for one hospital's stored forecasts.
+    """
+    return {row['blood_type']: row for row in _forecast_values(hospital_id)}
+
+
+async def ahospital_forecasts(hospital_id):
+    return {row['blood_type']: row async for row in _forecast_values(hospital_id)}
+
+
+def stock_summary(rows, forecasts):
+    """
+    One summary entry per ``{'blood_type', 'total_quantity'}`` row, with a
+    low stock alert against the blood type's forecast reorder threshold, or
+    the fixed threshold for blood types that have no forecast yet.
+    """
+    default_threshold = low_stock_threshold()
+    summary = []
+    for row in rows:
+        total_quantity = row['total_quantity']
+        forecast = forecasts.get(row['blood_type'])
+        daily_demand = forecast['daily_demand'] if forecast else None
+        threshold = forecast['reorder_threshold'] if forecast else default_threshold
+        summary.append({
+            'blood_type': row['blood_type'],
+            'total_quantity': total_quantity,
+            'low_stock_alert': total_quantity < threshold,
+            'reorder_threshold': threshold,
+            'daily_demand': daily_demand,
+            'days_of_cover': round(total_quantity / daily_demand, 1) if daily_demand else None,
+        })
+    return summary
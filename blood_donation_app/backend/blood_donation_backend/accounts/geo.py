@@ -0,0 +1,163 @@
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Precision stored in the geohash columns (~150 m cells)
+GEOHASH_PRECISION = 7
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = bits << 1 | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = bits << 1 | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """
+    Height and width in degrees of a geohash cell at the given precision.
+    """
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _cell_size_km(precision, latitude):
+    lat_deg, lng_deg = cell_size_degrees(precision)
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    return lat_deg * km_per_degree, lng_deg * km_per_degree * max(math.cos(math.radians(latitude)), 0.01)
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover a circle of ``radius_km``:
+    the centre cell and its eight neighbours at the finest precision whose
+    cells are at least ``radius_km`` across. Returns None when the circle is
+    too large for prefix filtering to help.
+    """
+    precision = None
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height_km, width_km = _cell_size_km(candidate, latitude)
+        if min(height_km, width_km) >= radius_km:
+            precision = candidate
+            break
+    if precision is None:
+        return None
+
+    lat_deg, lng_deg = cell_size_degrees(precision)
+    prefixes = set()
+    for dlat in (-lat_deg, 0, lat_deg):
+        for dlng in (-lng_deg, 0, lng_deg):
+            lat = min(max(latitude + dlat, -90.0), 90.0 - 1e-9)
+            lng = (longitude + dlng + 180.0) % 360.0 - 180.0
+            prefixes.add(encode_geohash(lat, lng, precision))
+    return sorted(prefixes)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) enclosing the circle. Longitude
+    bounds are dropped (None) near the poles or across the antimeridian.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    cos_lat = math.cos(math.radians(latitude))
+    if max_lat >= 90 or min_lat <= -90 or cos_lat < 1e-6:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    if longitude - dlng < -180 or longitude + dlng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, longitude - dlng, longitude + dlng
+
+
+def within_radius_q(latitude, longitude, radius_km, prefix=''):
+    """
+    Index-friendly Q narrowing rows to the neighbourhood of a point using the
+    geohash column and a lat/lng bounding box. Candidates still need an exact
+    distance check (see ``filter_within_radius``).
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    q = Q(**{f'{prefix}latitude__gte': min_lat, f'{prefix}latitude__lte': max_lat})
+    if min_lng is not None:
+        q &= Q(**{f'{prefix}longitude__gte': min_lng, f'{prefix}longitude__lte': max_lng})
+
+    prefixes = covering_prefixes(latitude, longitude, radius_km)
+    if prefixes:
+        cells = Q()
+        for cell in prefixes:
+            cells |= Q(**{f'{prefix}geohash__startswith': cell})
+        q &= cells
+    return q
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _numpy():
+    # Imported on first use: models import this module, so a top-level
+    # import would slow down every process start
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - numpy is optional
+        return None
+    return numpy
+
+
+def distances_km(latitudes, longitudes, latitude, longitude):
+    """
+    Great-circle distances from one point to many, vectorised with NumPy when
+    it is installed.
+    """
+    np = _numpy()
+    if np is None:
+        return [haversine_km(lat, lng, latitude, longitude) for lat, lng in zip(latitudes, longitudes)]
+    lats = np.radians(np.asarray(latitudes, dtype=float))
+    lngs = np.radians(np.asarray(longitudes, dtype=float))
+    lat0, lng0 = math.radians(latitude), math.radians(longitude)
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lats) * math.cos(lat0) * np.sin((lngs - lng0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def filter_within_radius(rows, latitude, longitude, radius_km):
+    """
+    Keep the ``(value, lat, lng)`` rows within ``radius_km`` of the point and
+    return their values. Rows without coordinates are dropped.
+    """
+    located = [row for row in rows if row[1] is not None and row[2] is not None]
+    if not located:
+        return []
+    distances = distances_km([row[1] for row in located], [row[2] for row in located], latitude, longitude)
+    return [row[0] for row, distance in zip(located, distances) if distance <= radius_km]
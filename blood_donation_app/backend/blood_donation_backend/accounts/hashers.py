@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    BCryptSHA256PasswordHasher,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+
+
+class ConfigurableBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """
+    BCrypt-SHA256 with the work factor taken from ``PASSWORD_BCRYPT_ROUNDS``.
+    Changing the setting makes ``must_update`` true for older hashes, so they
+    are re-hashed on the user's next login.
+    """
+
+    @property
+    def rounds(self):
+        return getattr(settings, 'PASSWORD_BCRYPT_ROUNDS', BCryptSHA256PasswordHasher.rounds)
+
+
+def _verify(password, encoded):
+    """
+    Return ``(is_correct, must_update)`` for a raw password against a stored
+    hash, following django.contrib.auth.hashers.check_password.
+    """
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        # Unusable or unknown hash: spend the same time as a real check
+        make_password(password)
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+    return is_correct, must_update
+
+
+def _init_worker():
+    # Spawned (non-fork) workers need settings configured before hashing
+    import django
+    django.setup(set_prefix=False)
+
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def _worker_count():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', 0)
+
+
+def _get_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            workers = _worker_count()
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            # Bound the backlog so a login storm queues in the callers, not in memory
+            _pool_slots = threading.BoundedSemaphore(workers * getattr(settings, 'PASSWORD_HASH_QUEUE_DEPTH', 4))
+        return _pool, _pool_slots
+
+
+def _submit(fn, *args):
+    pool, slots = _get_pool()
+    slots.acquire()
+    future = pool.submit(fn, *args)
+    future.add_done_callback(lambda _future: slots.release())
+    return future
+
+
+def verify_password(password, encoded):
+    """
+    Check a password on the hashing process pool (or inline when
+    ``PASSWORD_HASH_WORKERS`` is 0). Returns ``(is_correct, must_update)``.
+    """
+    if not _worker_count():
+        return _verify(password, encoded)
+    return _submit(_verify, password, encoded).result()
+
+
+async def _asubmit(fn, *args):
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        # Backlog is full: wait for a slot without blocking the event loop
+        await asyncio.to_thread(slots.acquire)
+    future = pool.submit(fn, *args)
+    future.add_done_callback(lambda _future: slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def averify_password(password, encoded):
+    """
+    Async verify_password. The hash never runs on the event loop: it goes to
+    the process pool, or a thread when the pool is disabled.
+    """
+    if not _worker_count():
+        return await asyncio.to_thread(_verify, password, encoded)
+    return await _asubmit(_verify, password, encoded)
+
+
+def hash_password(password):
+    """
+    Hash a password with the current default hasher, off the request thread
+    when the pool is enabled.
+    """
+    if not _worker_count():
+        return make_password(password)
+    return _submit(make_password, password).result()
+
+
+async def ahash_password(password):
+    if not _worker_count():
+        return await asyncio.to_thread(make_password, password)
+    return await _asubmit(make_password, password)
+
+
+def shutdown_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = _pool_slots = None
@@ -0,0 +1,231 @@
+import codecs
+import csv
+import json
+from collections import Counter
+from datetime import date, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .matching import BLOOD_TYPES
+from .models import BloodUnit, Hospital, HospitalInventorySummary
+
+_BLOOD_TYPES = frozenset(BLOOD_TYPES)
+
+
+def shelf_life():
+    return timedelta(days=getattr(settings, 'BLOOD_UNIT_SHELF_LIFE_DAYS', 42))
+
+
+class UnparseableRecord:
+    """
+    Stands in for a record the reader couldn't decode, so it is reported like
+    any other invalid row instead of stopping the import.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_lines(stream, encoding='utf-8'):
+    """
+    Decode a binary stream (a file or the request body) line by line.
+    """
+    return codecs.iterdecode(stream, encoding)
+
+
+def read_csv(lines):
+    """
+    Records from CSV text with a header row (blood_type, quantity and
+    optionally expiration_date, collection_date, hospital_id).
+    """
+    return csv.DictReader(lines)
+
+
+def read_ndjson(lines):
+    """
+    Records from newline-delimited JSON, one object per line.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield UnparseableRecord(f"Invalid JSON: {exc}")
+
+
+class IngestResult:
+    def __init__(self, max_errors):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_errors(self, errors):
+        self.failed += len(errors)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+def _parse_quantity(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(str(value).strip()) if not isinstance(value, (int, float)) else int(value)
+
+
+def _column(records, name, parse, errors, message, required=True):
+    """
+    Parse one column of the batch. Failures are recorded per row in
+    ``errors`` (row index -> {field: [message]}); missing optional values
+    come back as None.
+    """
+    values = []
+    for index, record in enumerate(records):
+        raw = record.get(name) if record is not None else None
+        if raw is None or raw == '':
+            if required and record is not None:
+                errors.setdefault(index, {})[name] = ["This field is required."]
+            values.append(None)
+            continue
+        try:
+            values.append(parse(raw))
+        except (TypeError, ValueError):
+            errors.setdefault(index, {})[name] = [message]
+            values.append(None)
+    return values
+
+
+def validate_batch(records, hospital_id=None, today=None):
+    """
+    Validate a batch of raw records column by column: each field is parsed
+    for the whole batch in turn, and hospital ids (when not fixed by
+    ``hospital_id``) are checked with one query. Returns the valid unsaved
+    BloodUnits and ``{index: {field: [message]}}`` for the rest.
+    """
+    today = today or timezone.localdate()
+    errors = {}
+    rows = []
+    for index, record in enumerate(records):
+        if isinstance(record, UnparseableRecord):
+            errors[index] = {'non_field_errors': [record.message]}
+            rows.append(None)
+        elif not isinstance(record, dict):
+            errors[index] = {'non_field_errors': ["Expected an object."]}
+            rows.append(None)
+        else:
+            rows.append(record)
+
+    def blood_type(value):
+        value = str(value).strip().upper()
+        if value not in _BLOOD_TYPES:
+            raise ValueError
+        return value
+
+    types = _column(rows, 'blood_type', blood_type, errors, "Not a valid blood type.")
+    quantities = _column(rows, 'quantity', _parse_quantity, errors, "A valid integer is required.")
+    expirations = _column(rows, 'expiration_date', _parse_date, errors, "Use the YYYY-MM-DD format.", required=False)
+    collections = _column(rows, 'collection_date', _parse_date, errors, "Use the YYYY-MM-DD format.", required=False)
+
+    if hospital_id is None:
+        hospitals = _column(rows, 'hospital_id', _parse_quantity, errors, "A valid integer is required.")
+        known = set(Hospital.objects.filter(pk__in={pk for pk in hospitals if pk is not None})
+                    .values_list('pk', flat=True))
+        for index, pk in enumerate(hospitals):
+            if pk is not None and pk not in known:
+                errors.setdefault(index, {})['hospital_id'] = ["Unknown hospital."]
+    else:
+        hospitals = [hospital_id] * len(rows)
+
+    units = []
+    for index, row in enumerate(rows):
+        if row is None or index in errors:
+            continue
+        quantity = quantities[index]
+        if quantity <= 0:
+            errors[index] = {'quantity': ["Quantity must be greater than zero."]}
+            continue
+        expiration = expirations[index] or (collections[index] or today) + shelf_life()
+        if expiration < today:
+            errors[index] = {'expiration_date': ["Unit has already expired."]}
+            continue
+        units.append(BloodUnit(
+            blood_type=types[index],
+            quantity=quantity,
+            hospital_id=hospitals[index],
+            expiration_date=expiration,
+        ))
+    return units, errors
+
+
+def insert_units(units):
+    """
+    bulk_create a validated batch and add it to the inventory summary, in one
+    transaction.
+    """
+    quantity_delta = Counter()
+    units_delta = Counter()
+    for unit in units:
+        key = (unit.hospital_id, unit.blood_type)
+        quantity_delta[key] += unit.quantity
+        units_delta[key] += 1
+    with transaction.atomic():
+        BloodUnit.objects.bulk_create(units)
+        for key, quantity in quantity_delta.items():
+            HospitalInventorySummary.apply_delta(*key, quantity, units_delta[key])
+
+
+def ingest_records(records, hospital_id=None, chunk_size=None, max_errors=None, on_errors=None):
+    """
+    Validate and insert an iterable of raw records in chunks. Invalid rows
+    are reported (1-based, by position in the input) and skipped; the rest
+    of the batch is still imported. Records are consumed lazily, so a
+    streamed file or request body is never held in memory at once.
+
+    Only the first ``max_errors`` row errors are kept on the result. To see
+    every one, pass ``on_errors``, which is called with each chunk's errors
+    as soon as they are found.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BLOOD_UNIT_INGEST_CHUNK_SIZE', 1000)
+    if max_errors is None:
+        max_errors = getattr(settings, 'BLOOD_UNIT_INGEST_MAX_ERRORS', 1000)
+    result = IngestResult(max_errors)
+    today = timezone.localdate()
+    records = iter(records)
+    offset = 0
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return result
+        units, errors = validate_batch(chunk, hospital_id=hospital_id, today=today)
+        if units:
+            insert_units(units)
+            result.created += len(units)
+        chunk_errors = [
+            {'row': offset + index + 1, 'errors': field_errors}
+            for index, field_errors in sorted(errors.items())
+        ]
+        if chunk_errors and on_errors is not None:
+            on_errors(chunk_errors)
+        result.add_errors(chunk_errors)
+        offset += len(chunk)
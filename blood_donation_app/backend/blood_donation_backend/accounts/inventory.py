@@ -0,0 +1,133 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .inventory_cache import invalidate_inventory
+from .models import BloodUnit, HospitalInventorySummary
+
+
+def aggregate_available_stock(hospital_ids=None):
+    """
+    Compute available stock straight from BloodUnit, keyed by
+    (hospital_id, blood_type) -> (quantity, units).
+    """
+    queryset = BloodUnit.objects.filter(status='available')
+    if hospital_ids is not None:
+        queryset = queryset.filter(hospital_id__in=hospital_ids)
+    rows = queryset.values('hospital_id', 'blood_type').annotate(
+        quantity=Sum('quantity'),
+        units=Count('id'),
+    )
+    return {(row['hospital_id'], row['blood_type']): (row['quantity'], row['units']) for row in rows}
+
+
+def summary_rows(hospital_id):
+    """
+    A hospital's available stock by blood type (``blood_type`` and
+    ``total_quantity``), read from the incrementally maintained summary
+    instead of aggregating BloodUnit.
+    """
+    return HospitalInventorySummary.objects.filter(hospital_id=hospital_id, available_units__gt=0)\
+        .values('blood_type', total_quantity=F('available_quantity'))
+
+
+def _stored_summary(hospital_ids=None):
+    queryset = HospitalInventorySummary.objects.all()
+    if hospital_ids is not None:
+        queryset = queryset.filter(hospital_id__in=hospital_ids)
+    return {
+        (row['hospital_id'], row['blood_type']): (row['available_quantity'], row['available_units'])
+        for row in queryset.values('hospital_id', 'blood_type', 'available_quantity', 'available_units')
+    }
+
+
+def diff_inventory_summary(hospital_ids=None):
+    """
+    Compare the summary table with a fresh aggregate. Returns a list of
+    ``(key, stored, actual)`` tuples for every row that disagrees.
+    """
+    actual = aggregate_available_stock(hospital_ids)
+    stored = _stored_summary(hospital_ids)
+    mismatches = []
+    for key in sorted(set(actual) | set(stored)):
+        stored_value = stored.get(key, (0, 0))
+        actual_value = actual.get(key, (0, 0))
+        if stored_value != actual_value:
+            mismatches.append((key, stored_value, actual_value))
+    return mismatches
+
+
+def rebuild_inventory_summary(hospital_ids=None):
+    """
+    Replace the summary rows with a fresh aggregate. Affected BloodUnit rows
+    are locked for the duration so concurrent writes can't slip in between
+    the aggregate and the insert. Returns the number of rows written.
+    """
+    with transaction.atomic():
+        locked = BloodUnit.objects.select_for_update().filter(status='available')
+        if hospital_ids is not None:
+            locked = locked.filter(hospital_id__in=hospital_ids)
+        list(locked.values_list('id', flat=True))
+
+        actual = aggregate_available_stock(hospital_ids)
+        stale = HospitalInventorySummary.objects.all()
+        if hospital_ids is not None:
+            stale = stale.filter(hospital_id__in=hospital_ids)
+        touched = set(stale.values_list('hospital_id', 'blood_type')) | set(actual)
+        stale.delete()
+        HospitalInventorySummary.objects.bulk_create(
+            [
+                HospitalInventorySummary(
+                    hospital_id=hospital_id,
+                    blood_type=blood_type,
+                    available_quantity=quantity,
+                    available_units=units,
+                )
+                for (hospital_id, blood_type), (quantity, units) in actual.items()
+            ],
+            batch_size=1000,
+        )
+        for hospital_id, blood_type in touched:
+            invalidate_inventory(hospital_id, blood_type)
+    return len(actual)
+
+
+def expire_blood_units(today=None, chunk_size=1000):
+    """
+    Expire every available unit whose expiration date has passed.
+
+    Units are processed in primary-key chunks, each in its own transaction:
+    the chunk is locked, flipped to 'expired' with one UPDATE, and its stock
+    is taken off HospitalInventorySummary before committing. Running it again
+    finds nothing to do. Returns a Counter of units expired per hospital id.
+    """
+    today = today or timezone.now().date()
+    expired_per_hospital = Counter()
+    last_pk = 0
+
+    while True:
+        with transaction.atomic():
+            ids = list(
+                BloodUnit.objects.select_for_update()
+                .filter(status='available', expiration_date__lt=today, pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+
+            chunk = BloodUnit.objects.filter(pk__in=ids, status='available')
+            deltas = list(
+                chunk.values('hospital_id', 'blood_type').annotate(quantity=Sum('quantity'), units=Count('id'))
+            )
+            chunk.update(status='expired')
+            for row in deltas:
+                HospitalInventorySummary.apply_delta(
+                    row['hospital_id'], row['blood_type'], -row['quantity'], -row['units']
+                )
+                expired_per_hospital[row['hospital_id']] += row['units']
+
+    return expired_per_hospital
@@ -0,0 +1,165 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .replicas import replica_max_lag, used_replica
+
+
+def inventory_cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    ttl = getattr(settings, 'INVENTORY_CACHE_TTL', 300)
+    if used_replica():
+        # Built from rows that may predate the last invalidation; keep them
+        # only as long as the replica may lag
+        return min(ttl, replica_max_lag())
+    return ttl
+
+
+def _version_key(hospital_id, blood_type=None):
+    # blood_type None is the hospital-wide scope used by the summary
+    return f"inventory:version:{hospital_id}:{blood_type or '*'}"
+
+
+def _version(hospital_id, blood_type=None):
+    """
+    Current version token of a scope. Tokens are random rather than counters,
+    so an evicted token can never come back with an old value and revive
+    stale entries.
+    """
+    cache = inventory_cache()
+    key = _version_key(hospital_id, blood_type)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+async def _aversion(hospital_id, blood_type=None):
+    cache = inventory_cache()
+    key = _version_key(hospital_id, blood_type)
+    version = await cache.aget(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        await cache.aset(key, version, None)
+    return version
+
+
+def inventory_versions(hospital_ids):
+    """
+    Hospital-wide version tokens of several hospitals at once, as
+    ``{hospital_id: version}``. invalidate_inventory replaces a hospital's
+    token on every stock write, so other caches built from that stock can key
+    their entries on it and be dropped at the same moment.
+    """
+    cache = inventory_cache()
+    keys = {_version_key(hospital_id): hospital_id for hospital_id in hospital_ids}
+    versions = cache.get_many(list(keys))
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate_inventory(hospital_id, blood_type=None):
+    """
+    Drop cached inventory responses for one hospital and blood type, plus the
+    hospital-wide summary (just the summary when ``blood_type`` is None).
+    Runs after the surrounding transaction commits so a request that misses
+    can't re-cache the old rows.
+    """
+    def bump():
+        inventory_cache().set_many({
+            _version_key(hospital_id, blood_type): uuid.uuid4().hex,
+            _version_key(hospital_id): uuid.uuid4().hex,
+        }, None)
+
+    transaction.on_commit(bump)
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _finish(response, etag):
+    response['ETag'] = etag
+    # Let the browser keep a copy but always revalidate it
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _response_key(request, hospital_id, blood_type, version):
+    path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    # Days-to-expiry figures roll over at midnight
+    today = timezone.localdate().isoformat()
+    return f"inventory:response:{hospital_id}:{blood_type or '*'}:{version}:{today}:{path_hash}"
+
+
+def _etag(data):
+    return '"%s"' % hashlib.md5(JSONRenderer().render(data)).hexdigest()
+
+
+def cached_inventory_response(request, hospital_id, blood_type, build):
+    """
+    Serve a hospital's inventory response from the cache, keyed by hospital,
+    blood type (None for hospital-wide) and the full request path. ``build``
+    produces the Response on a miss. Clients that send back the ETag they
+    were given get an empty 304 while the data is unchanged.
+    """
+    cache = inventory_cache()
+    # Read the version before building, so a write committing meanwhile leaves
+    # this (possibly old) response under a version nobody asks for again
+    key = _response_key(request, hospital_id, blood_type, _version(hospital_id, blood_type))
+
+    entry = cache.get(key)
+    if entry is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = (_etag(response.data), response.data)
+        cache.set(key, entry, _ttl())
+
+    etag, data = entry
+    if _etag_matches(request, etag):
+        return _finish(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return _finish(Response(data), etag)
+
+
+async def acached_inventory_response(request, hospital_id, blood_type, build):
+    """
+    cached_inventory_response for async views: the same cache entries and
+    ETags, but ``build`` is a coroutine function returning the response data
+    and the result is a plain JSON HttpResponse.
+    """
+    cache = inventory_cache()
+    key = _response_key(request, hospital_id, blood_type, await _aversion(hospital_id, blood_type))
+
+    entry = await cache.aget(key)
+    if entry is None:
+        data = await build()
+        entry = (_etag(data), data)
+        await cache.aset(key, entry, _ttl())
+
+    etag, data = entry
+    if _etag_matches(request, etag):
+        return _finish(HttpResponseNotModified(), etag)
+    return _finish(HttpResponse(JSONRenderer().render(data), content_type='application/json'), etag)
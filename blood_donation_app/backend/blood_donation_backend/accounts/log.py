@@ -0,0 +1,40 @@
+import json
+import logging
+import random
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and whatever the
+    caller passed as ``extra``.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RESERVED)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only a ``rate`` fraction of records below ``always_level``; warnings
+    and errors always get through.
+    """
+
+    def __init__(self, rate=1.0, always_level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.always_level = logging.getLevelName(always_level)
+
+    def filter(self, record):
+        return record.levelno >= self.always_level or random.random() < self.rate
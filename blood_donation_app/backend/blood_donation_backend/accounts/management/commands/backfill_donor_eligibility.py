@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.eligibility import backfill_next_eligible_dates
+
+
+class Command(BaseCommand):
+    help = "Recompute every donor's next_eligible_date from their donation history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        changed = backfill_next_eligible_dates(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated next_eligible_date for {changed} donors."))
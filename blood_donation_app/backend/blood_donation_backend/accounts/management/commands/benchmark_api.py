@@ -0,0 +1,82 @@
+import statistics
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.forecasting import hospital_forecasts, stock_summary
+from accounts.inventory import aggregate_available_stock, summary_rows
+from accounts.models import BloodRequest, BloodUnit, Donor, Hospital
+from accounts.serializers import BloodRequestSerializer, BloodUnitExpirySerializer, DonorSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks for the serializers and inventory summary behind the hottest endpoints, "
+        "run against whatever data is in the database (see seed_data). Reports the best and median "
+        "time per call and the queries each call makes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Timing runs per benchmark.")
+        parser.add_argument('--page-size', type=int, default=50, help="Rows per serialized list.")
+        parser.add_argument('--hospital', type=int, help="Hospital to benchmark; defaults to the one with most stock.")
+
+    def handle(self, *args, **options):
+        hospital_id = options['hospital'] or self.busiest_hospital()
+        page_size = options['page_size']
+        today = timezone.localdate()
+
+        # Rows are loaded up front so only serialization is timed
+        requests = list(
+            BloodRequest.objects.filter(hospital_id=hospital_id).select_related('hospital')
+            .order_by('-created_at')[:page_size]
+        )
+        units = list(BloodUnit.objects.filter(hospital_id=hospital_id, status='available')[:page_size])
+        donor = Donor.objects.order_by('pk').first()
+
+        benchmarks = [
+            (f"BloodRequestSerializer x{len(requests)}",
+             lambda: BloodRequestSerializer(requests, many=True).data),
+            (f"BloodUnitExpirySerializer x{len(units)}",
+             lambda: BloodUnitExpirySerializer(units, many=True, context={'today': today}).data),
+            ("summary from stored rows",
+             lambda: stock_summary(summary_rows(hospital_id), hospital_forecasts(hospital_id))),
+            ("summary aggregated from units", lambda: aggregate_available_stock([hospital_id])),
+        ]
+        if donor is not None:
+            benchmarks.insert(2, ("DonorSerializer x1", lambda: DonorSerializer(donor).data))
+
+        self.stdout.write(f"Hospital {hospital_id}; {options['repeat']} runs per benchmark\n")
+        self.stdout.write(f"{'benchmark':<36} {'best':>10} {'median':>10} {'queries':>8}")
+        for name, function in benchmarks:
+            best, median = self.time(function, options['repeat'])
+            with CaptureQueriesContext(connection) as queries:
+                function()
+            self.stdout.write(f"{name:<36} {_duration(best):>10} {_duration(median):>10} {len(queries):>8}")
+
+    def busiest_hospital(self):
+        hospital = (
+            Hospital.objects.annotate(units=Count('blood_inventory'))
+            .order_by('-units')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if hospital is None:
+            raise CommandError("No hospitals to benchmark; run seed_data first.")
+        return hospital
+
+    def time(self, function, repeat):
+        timer = timeit.Timer(function)
+        number, _elapsed = timer.autorange()
+        runs = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+        return min(runs), statistics.median(runs)
+
+
+def _duration(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    return f"{seconds * 1e3:.2f} ms"
@@ -0,0 +1,146 @@
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from accounts import hashers
+from accounts.async_views import AsyncDeliveryStaffLoginView, AsyncDonorLoginView, AsyncHospitalLoginView
+from accounts.models import DeliveryStaff, Donor, Hospital
+
+PASSWORD = 'Bench-login-pw-1'
+
+
+@contextmanager
+def count_hash_checks():
+    """
+    Count password hash verifications made inside the block.
+    """
+    counter = {'checks': 0}
+    original = hashers.identify_hasher
+
+    def counting_identify_hasher(encoded):
+        counter['checks'] += 1
+        return original(encoded)
+
+    hashers.identify_hasher = counting_identify_hasher
+    try:
+        yield counter
+    finally:
+        hashers.identify_hasher = original
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the donor, hospital and delivery staff login endpoints for valid logins, "
+        "wrong passwords and unknown emails, reporting queries and hash checks per attempt. "
+        "With --throughput, also measure sustained logins per second per core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--throughput', type=float, default=0,
+            help="Seconds to run concurrent valid logins for; 0 skips the throughput run.",
+        )
+        parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        # Throughput threads use their own connections, so the principals must be committed
+        principals = self.create_principals()
+        try:
+            # Checks run inline here so each hash verification can be counted
+            with override_settings(PASSWORD_HASH_WORKERS=0):
+                self.run(principals, options['iterations'])
+            if options['throughput']:
+                self.measure_throughput(principals[0][2], options['throughput'], options['concurrency'])
+        finally:
+            for model, _view, email in principals:
+                model.objects.filter(email=email).delete()
+
+    def create_principals(self):
+        tag = int(time.time())
+        donor = Donor.objects.create_user(
+            email=f"bench-{tag}@donor.test", password=PASSWORD, firstname='Bench', lastname='Donor',
+            dob=date(1990, 1, 1), gender='Other', blood_type='O-', phone_number=f"b{tag}"[:15],
+        )
+        hospital = Hospital.objects.create_user(
+            email=f"bench-{tag}@hospital.test", password=PASSWORD, hospital_name='Bench',
+            staff_name='Bench', staff_id=f"bench-{tag}", contact_info='000', address='Bench',
+        )
+        staff = DeliveryStaff.objects.create_user(
+            email=f"bench-{tag}@staff.test", password=PASSWORD, firstname='Bench', lastname='Staff',
+            gender='Other', license_number=f"bench-{tag}", vehicle_type='van',
+        )
+
+        # The views served at the login URLs are coroutines; each call runs on its own event loop
+        return [
+            (Donor, async_to_sync(AsyncDonorLoginView.as_view()), donor.email),
+            (Hospital, async_to_sync(AsyncHospitalLoginView.as_view()), hospital.email),
+            (DeliveryStaff, async_to_sync(AsyncDeliveryStaffLoginView.as_view()), staff.email),
+        ]
+
+    def run(self, principals, iterations):
+        factory = APIRequestFactory()
+        tag = int(time.time())
+        self.stdout.write(f"{'endpoint':<14} {'case':<15} {'status':>6} {'queries':>8} {'hashes':>7} {'p50 ms':>8}")
+        for model, view, email in principals:
+            name = model.__name__
+            cases = [
+                ('valid', email, PASSWORD),
+                ('wrong password', email, PASSWORD + 'x'),
+                ('unknown email', f"nobody-{tag}@example.test", PASSWORD),
+            ]
+            for case, login_email, password in cases:
+                timings = []
+                for _ in range(iterations):
+                    request = factory.post('/', {'email': login_email, 'password': password}, format='json')
+                    with CaptureQueriesContext(connection) as queries, count_hash_checks() as hashes:
+                        start = time.perf_counter()
+                        response = view(request)
+                        timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f"{name:<14} {case:<15} {response.status_code:>6} {len(queries):>8} "
+                    f"{hashes['checks']:>7} {statistics.median(timings):>8.1f}"
+                )
+
+    def measure_throughput(self, email, seconds, concurrency):
+        factory = APIRequestFactory()
+        view = async_to_sync(AsyncDonorLoginView.as_view())
+        deadline = time.perf_counter() + seconds
+        completed = []
+
+        def worker():
+            count = 0
+            while time.perf_counter() < deadline:
+                request = factory.post('/', {'email': email, 'password': PASSWORD}, format='json')
+                if view(request).status_code == 200:
+                    count += 1
+            completed.append(count)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        workers = settings.PASSWORD_HASH_WORKERS
+        # Hashing is the bottleneck, so it runs on at most this many cores
+        cores = workers or min(concurrency, os.cpu_count() or 1)
+        per_second = sum(completed) / elapsed
+        self.stdout.write(
+            f"\nThroughput: {sum(completed)} logins in {elapsed:.1f}s with {concurrency} clients, "
+            f"{workers or 'inline'} hash workers, {settings.PASSWORD_BCRYPT_ROUNDS} bcrypt rounds"
+        )
+        self.stdout.write(f"{per_second:.1f} logins/s, {per_second / cores:.1f} logins/s per core")
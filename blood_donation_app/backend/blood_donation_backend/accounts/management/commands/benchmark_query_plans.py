@@ -0,0 +1,183 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from accounts.matching import BLOOD_TYPES, compatible_donors
+from accounts.models import BloodRequest, BloodUnit, Donor, Hospital
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed large synthetic tables inside a transaction, then time the hot inventory/request "
+        "queries and check that their plans use the composite indexes. Rolled back unless --keep."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hospitals', type=int, default=200)
+        parser.add_argument('--units', type=int, default=200000)
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--donors', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed executions per query.")
+        parser.add_argument('--keep', action='store_true', help="Commit the seeded rows instead of rolling back.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(1234)
+        failures = []
+        try:
+            with transaction.atomic():
+                hospital = self.seed()
+                self.analyze()
+                failures = self.check_plans(hospital)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write("Seed data rolled back.")
+
+        if failures:
+            raise CommandError(f"Queries not using an expected index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use a composite index."))
+
+    def seed(self):
+        opts = self.options
+        batch_size = opts['batch_size']
+        today = date.today()
+        tag = int(time.time())
+
+        self.stdout.write(f"Seeding {opts['hospitals']} hospitals...")
+        hospitals = Hospital.objects.bulk_create(
+            [
+                Hospital(
+                    hospital_name=f"Bench Hospital {i}",
+                    staff_name="Bench",
+                    staff_id=f"bench-{tag}-{i}",
+                    email=f"bench-{tag}-{i}@hospital.test",
+                    contact_info="000",
+                    address="Bench",
+                )
+                for i in range(opts['hospitals'])
+            ],
+            batch_size=batch_size,
+        )
+
+        self.stdout.write(f"Seeding {opts['units']} blood units...")
+        statuses = ['available'] * 6 + ['used', 'expired', 'transferred']
+        BloodUnit.objects.bulk_create(
+            (
+                BloodUnit(
+                    hospital=self.rng.choice(hospitals),
+                    blood_type=self.rng.choice(BLOOD_TYPES),
+                    quantity=self.rng.randint(1, 10),
+                    status=self.rng.choice(statuses),
+                    expiration_date=today + timedelta(days=self.rng.randint(-10, 42)),
+                )
+                for _ in range(opts['units'])
+            ),
+            batch_size=batch_size,
+        )
+
+        self.stdout.write(f"Seeding {opts['requests']} blood requests...")
+        request_statuses = ['pending', 'fulfilled', 'fulfilled', 'fulfilled', 'canceled']
+        BloodRequest.objects.bulk_create(
+            (
+                BloodRequest(
+                    hospital=self.rng.choice(hospitals),
+                    blood_type=self.rng.choice(BLOOD_TYPES),
+                    quantity=self.rng.randint(1, 10),
+                    priority_level=self.rng.choice(['urgent', 'normal']),
+                    status=self.rng.choice(request_statuses),
+                )
+                for _ in range(opts['requests'])
+            ),
+            batch_size=batch_size,
+        )
+
+        self.stdout.write(f"Seeding {opts['donors']} donors...")
+        Donor.objects.bulk_create(
+            (
+                Donor(
+                    firstname="Bench",
+                    lastname=str(i),
+                    dob=date(1990, 1, 1),
+                    gender='Other',
+                    email=f"bench-{tag}-{i}@donor.test",
+                    blood_type=self.rng.choice(BLOOD_TYPES),
+                    phone_number=f"{tag % 100000:05d}{i:010d}"[-15:],
+                    is_active=self.rng.random() < 0.9,
+                )
+                for i in range(opts['donors'])
+            ),
+            batch_size=batch_size,
+        )
+        return hospitals[0]
+
+    def analyze(self):
+        # Refresh planner statistics so the plans reflect the seeded volume
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_queries(self, hospital):
+        return [
+            (
+                'inventory summary',
+                BloodUnit.objects.filter(hospital=hospital, status='available')
+                .values('blood_type')
+                .annotate(total_quantity=Coalesce(Sum('quantity'), 0)),
+                {'bloodunit_available_idx', 'bloodunit_hosp_status_type_idx'},
+            ),
+            (
+                'units by type',
+                BloodUnit.objects.filter(hospital=hospital, blood_type='O+', status='available'),
+                {'bloodunit_available_idx', 'bloodunit_hosp_status_type_idx'},
+            ),
+            (
+                'unit list',
+                BloodUnit.objects.filter(hospital=hospital, status='available').order_by('expiration_date'),
+                {'bloodunit_available_idx', 'bloodunit_hosp_status_type_idx'},
+            ),
+            (
+                'request history',
+                BloodRequest.objects.filter(hospital=hospital).order_by('-created_at')[:50],
+                {'bloodreq_hospital_created_idx'},
+            ),
+            (
+                'pending requests',
+                BloodRequest.objects.filter(hospital=hospital, status='pending', blood_type='A+'),
+                {'bloodreq_pending_idx'},
+            ),
+            (
+                'donor fan-out',
+                compatible_donors(BloodRequest(blood_type='A-')).values_list('id', flat=True),
+                {'donor_type_active_idx'},
+            ),
+        ]
+
+    def check_plans(self, hospital):
+        failures = []
+        for name, queryset, expected in self.hot_queries(hospital):
+            plan = queryset.explain()
+            used = sorted(index for index in expected if index in plan)
+
+            start = time.perf_counter()
+            for _ in range(self.options['repeat']):
+                list(queryset)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / self.options['repeat']
+
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"[ok]   {name}: {elapsed_ms:.2f} ms via {', '.join(used)}"))
+            else:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"[fail] {name}: {elapsed_ms:.2f} ms"))
+            if self.options['verbosity'] > 1:
+                self.stdout.write(plan)
+        return failures
@@ -0,0 +1,79 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is imported or cached beforehand
+SETUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - start
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({'setup': setup, 'urls': time.perf_counter() - start - setup}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long a fresh process takes to start Django: django.setup() (settings, apps and "
+        "models, what every management command and test worker pays) and loading the URLconf (the "
+        "views, paid by servers on their first request). Each run is a new interpreter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Fresh processes to time.")
+        parser.add_argument(
+            '--imports', type=int, default=0, metavar='N',
+            help="Also list the N slowest imports during setup (python -X importtime).",
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')]))}
+        runs = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            output = self.run(['-c', SETUP_SCRIPT], env)
+            timings = json.loads(output.stdout.splitlines()[-1])
+            timings['process'] = time.perf_counter() - started
+            runs.append(timings)
+
+        self.stdout.write(f"{options['repeat']} fresh processes, settings {os.environ.get('DJANGO_SETTINGS_MODULE')}\n")
+        self.stdout.write(f"{'stage':<22} {'best':>9} {'median':>9}")
+        for stage, label in (('setup', 'django.setup()'), ('urls', 'URLconf'), ('process', 'whole process')):
+            values = [run[stage] for run in runs]
+            self.stdout.write(
+                f"{label:<22} {min(values) * 1000:>7.1f}ms {statistics.median(values) * 1000:>7.1f}ms"
+            )
+
+        if options['imports']:
+            self.slowest_imports(env, options['imports'])
+
+    def run(self, arguments, env):
+        result = subprocess.run([sys.executable, *arguments], env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Django failed to start:\n{result.stderr.strip()}")
+        return result
+
+    def slowest_imports(self, env, count):
+        stderr = self.run(['-X', 'importtime', '-c', 'import django; django.setup()'], env).stderr
+        imports = []
+        for line in stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            parts = line.removeprefix('import time:').split('|')
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                imports.append((int(parts[1]), parts[2].rstrip()))
+        # Top-level imports only; their cumulative time includes everything below them
+        top = sorted(
+            ((cumulative, name) for cumulative, name in imports if not name.startswith('   ')),
+            reverse=True,
+        )[:count]
+        self.stdout.write(f"\nSlowest top-level imports during django.setup()")
+        for cumulative, name in top:
+            self.stdout.write(f"{cumulative / 1000:>9.1f}ms  {name.strip()}")
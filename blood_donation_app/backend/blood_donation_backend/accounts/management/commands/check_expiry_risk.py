@@ -0,0 +1,60 @@
+import time
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.expiry import refresh_expiry_reports, send_expiry_alerts
+from accounts.models import Hospital
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every hospital's near-expiry report in one grouped query, cache it for the "
+        "expiry-risk endpoint and alert hospitals with critical or high-risk stock. Run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and check every N seconds instead of exiting after one pass.",
+        )
+
+    def handle(self, *args, **options):
+        self.require_shared_backends()
+        while True:
+            self.run_sweep()
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def require_shared_backends(self):
+        # This runs in its own process: reports cached or alerts sent through
+        # process-local backends would never reach the web servers
+        local = [
+            f"the '{alias}' cache" for alias in ('default', getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default'))
+            if isinstance(caches[alias], LocMemCache)
+        ]
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            local.append("the channel layer")
+        if local:
+            raise CommandError(
+                f"{' and '.join(dict.fromkeys(local))} only live in this process, so the web servers would never "
+                f"see the reports or alerts. Set REDIS_URL to share them."
+            )
+
+    def run_sweep(self):
+        start = time.perf_counter()
+        hospital_ids = list(
+            Hospital.objects.filter(is_active=True, approval_status='approved').values_list('pk', flat=True)
+        )
+        reports = refresh_expiry_reports(hospital_ids)
+        sent = send_expiry_alerts(reports)
+        elapsed = time.perf_counter() - start
+        at_risk = sum(1 for report in reports.values() if report['buckets'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{at_risk} of {len(reports)} hospitals have near-expiry stock; "
+            f"sent {sent} alerts in {elapsed * 1000:.1f} ms."
+        ))
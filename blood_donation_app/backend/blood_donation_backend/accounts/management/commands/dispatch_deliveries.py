@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.delivery import Dispatcher, Job, Route, create_transfer_jobs, dispatch_pending_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Open delivery jobs for proposed transfers and route pending jobs onto available drivers. "
+        "With --benchmark, time incremental dispatch on a synthetic fleet instead (no database writes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and dispatch every N seconds instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            '--benchmark', type=int, metavar='DRIVERS', default=0,
+            help="Dispatch synthetic jobs onto a random fleet of this many drivers and report timings.",
+        )
+        parser.add_argument('--jobs', type=int, default=2000, help="Jobs to dispatch in --benchmark mode.")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['benchmark'], options['jobs'])
+            return
+
+        while True:
+            created = create_transfer_jobs()
+            start = time.perf_counter()
+            assigned = dispatch_pending_jobs()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f"Opened {len(created)} transfer jobs; assigned {len(assigned)} jobs in {elapsed * 1000:.1f} ms."
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def benchmark(self, drivers, jobs):
+        rng = random.Random(15)
+
+        def point():
+            return (rng.uniform(8.0, 13.0), rng.uniform(76.0, 80.0))
+
+        hospitals = [point() for _ in range(max(drivers // 2, 10))]
+        capacities = [4, 12, 40]
+        routes = [Route(staff_id, point(), rng.choice(capacities)) for staff_id in range(drivers)]
+        dispatcher = Dispatcher(routes)
+
+        latencies = []
+        unassigned = 0
+        for job_id in range(jobs):
+            pickup, dropoff = rng.sample(hospitals, 2)
+            job = Job(job_id, rng.randint(1, 6), pickup, dropoff)
+            # Jobs arrive one at a time; each is inserted without re-solving the rest
+            start = time.perf_counter()
+            if dispatcher.assign(job) is None:
+                unassigned += 1
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        busy = [route for route in routes if route.stops]
+        total_km = sum(route.length_km() for route in busy)
+        self.stdout.write(
+            f"{drivers} drivers, {jobs} jobs: {jobs - unassigned} assigned to {len(busy)} drivers, "
+            f"{unassigned} unassigned, {total_km:.0f} km of routes"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"per job: mean {sum(latencies) / len(latencies) * 1000:.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms; total {sum(latencies):.2f}s"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.inventory import expire_blood_units
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark every available blood unit past its expiration date as expired, in chunked "
+        "set-based updates. Safe to run repeatedly, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and sweep every N seconds instead of exiting after one pass.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['chunk_size'])
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sweep(self, chunk_size):
+        expired = expire_blood_units(chunk_size=chunk_size)
+        for hospital_id, count in sorted(expired.items()):
+            self.stdout.write(f"hospital {hospital_id}: {count} units expired")
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {sum(expired.values())} units across {len(expired)} hospitals."
+        ))
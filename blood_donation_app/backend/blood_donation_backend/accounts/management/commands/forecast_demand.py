@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.forecasting import ForecastError, backtest, fit_smoothing, refresh_forecasts, reorder_thresholds
+
+
+class Command(BaseCommand):
+    help = (
+        "Refit demand forecasts for every hospital and blood type from blood request history and store "
+        "the reorder thresholds the inventory summary uses. Run nightly from cron. With --benchmark, time "
+        "the fit and backtest on synthetic series instead (no database access)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark', type=int, metavar='HOSPITALS', default=0,
+            help="Fit synthetic demand for this many hospitals (8 blood types each) and report timings.",
+        )
+        parser.add_argument('--days', type=int, default=90, help="History length in --benchmark mode.")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['benchmark'] * 8, options['days'])
+            return
+
+        start = time.perf_counter()
+        try:
+            run = refresh_forecasts()
+        except ForecastError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {run['series']} series from {run['history_days']} days of requests in "
+            f"{elapsed * 1000:.1f} ms; {run['below_threshold']} are below their reorder threshold."
+        ))
+        self.report_accuracy(run['backtest'])
+
+    def report_accuracy(self, accuracy):
+        if not accuracy or accuracy['wape'] is None:
+            self.stdout.write("Not enough request history to backtest.")
+            return
+        self.stdout.write(
+            f"Backtest over the last {accuracy['horizon_days']} days ({accuracy['series']} series with demand): "
+            f"WAPE {accuracy['wape']:.1%}, historical mean {accuracy['naive_wape']:.1%}."
+        )
+
+    def benchmark(self, series, days):
+        import numpy as np
+
+        rng = np.random.default_rng(20)
+        # Poisson demand around a slowly drifting rate with a weekly cycle
+        base = rng.gamma(2.0, 2.0, size=(series, 1))
+        drift = np.cumsum(rng.normal(0, 0.03, size=(series, days)), axis=1)
+        weekly = 1 + 0.2 * np.sin(np.arange(days) * 2 * np.pi / 7)
+        demand = rng.poisson(np.maximum(base * np.exp(drift) * weekly, 0)).astype(float)
+
+        start = time.perf_counter()
+        level, _alpha, std = fit_smoothing(demand)
+        reorder_thresholds(level, std)
+        fitted = time.perf_counter() - start
+        _wape, accuracy = backtest(demand, 14)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"{series} series x {days} days")
+        self.stdout.write(self.style.SUCCESS(
+            f"fit + thresholds {fitted * 1000:.1f} ms; with backtest {elapsed * 1000:.1f} ms"
+        ))
+        self.report_accuracy(accuracy)
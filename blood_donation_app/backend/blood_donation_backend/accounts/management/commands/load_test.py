@@ -0,0 +1,198 @@
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from accounts.matching import BLOOD_TYPES
+from accounts.seeding import SEED_PASSWORD, seed_hospitals
+from accounts.tokens import PRINCIPAL_HOSPITAL, tokens_for
+
+# Share of traffic per scenario: mostly dashboards polling, with some logins and new requests
+DEFAULT_MIX = 'login=1,summary=6,by_type=3,expiry=1,requests=2,create_request=1'
+
+
+def _scenarios():
+    def login(user, rng):
+        return 'POST', '/api/login/hospital/', {'email': user['email'], 'password': SEED_PASSWORD}
+
+    def create_request(user, rng):
+        return 'POST', '/api/blood-requests/', {
+            'blood_type': rng.choice(BLOOD_TYPES), 'quantity': rng.randint(1, 3), 'priority_level': 'normal',
+        }
+
+    return {
+        'login': login,
+        'summary': lambda user, rng: ('GET', '/api/blood-units/summary/', None),
+        'by_type': lambda user, rng: ('GET', f"/api/blood-units/type/{rng.choice(BLOOD_TYPES)}/", None),
+        'expiry': lambda user, rng: ('GET', '/api/blood-units/expiry-risk/', None),
+        'requests': lambda user, rng: ('GET', '/api/blood-requests/', None),
+        'create_request': create_request,
+    }
+
+
+def parse_mix(value):
+    scenarios = _scenarios()
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in scenarios:
+            raise CommandError(f"Unknown scenario '{name}'; choose from {', '.join(scenarios)}.")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight for '{name}': {weight!r}.")
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)]
+
+
+async def call_asgi(application, method, path, headers, body=b''):
+    """
+    Send one HTTP request straight to an ASGI application, with no server
+    or socket in between. Returns the status and response headers.
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': headers + [(b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {}
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        # The client stays connected; the server cancels this wait when it's done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.lower(): value for name, value in message.get('headers', [])}
+
+    await application(scope, receive, send)
+    return response.get('status'), response.get('headers', {})
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a realistic traffic mix (logins, dashboard polls, request creation) against the ASGI "
+        "application in-process, as seeded hospitals, and report p50/p99 latency and throughput per "
+        "scenario. Run seed_data first; works on SQLite or PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=20, help="Seconds to measure for.")
+        parser.add_argument('--warmup', type=float, default=2, help="Seconds to run before measuring.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Simulated clients.")
+        parser.add_argument('--hospitals', type=int, default=50, help="Seeded hospitals the clients act as.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help="Scenario weights, e.g. 'summary=6,login=1'.")
+        parser.add_argument('--seed', type=int, default=22)
+        parser.add_argument(
+            '--notifications', action='store_true',
+            help="Send real push notifications for created requests instead of recording them locally.",
+        )
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        users = [
+            {
+                'email': hospital.email,
+                'token': str(tokens_for(hospital, PRINCIPAL_HOSPITAL).access_token),
+            }
+            for hospital in seed_hospitals().filter(is_active=True).order_by('pk')[:options['hospitals']]
+        ]
+        if not users:
+            raise CommandError("No seeded hospitals; run seed_data first.")
+
+        from blood_donation_backend.asgi import application
+
+        overrides = {}
+        if not options['notifications']:
+            overrides['PUSH_NOTIFICATION_BACKEND'] = 'local'
+        with override_settings(**overrides):
+            results, elapsed = asyncio.run(self.drive(application, users, mix, options))
+        self.report(results, elapsed, options)
+
+    async def drive(self, application, users, mix, options):
+        scenarios = _scenarios()
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'not_modified': 0})
+        loop = asyncio.get_running_loop()
+        measure_from = loop.time() + options['warmup']
+        deadline = measure_from + options['duration']
+
+        async def client(number):
+            rng = random.Random(options['seed'] + number)
+            user = users[number % len(users)]
+            etags = {}
+            while loop.time() < deadline:
+                name = rng.choices(names, weights)[0]
+                method, path, payload = scenarios[name](user, rng)
+                headers = [(b'host', b'localhost'), (b'content-type', b'application/json')]
+                if name != 'login':
+                    headers.append((b'authorization', f"Bearer {user['token']}".encode()))
+                # Dashboards revalidate what they already have
+                if method == 'GET' and path in etags:
+                    headers.append((b'if-none-match', etags[path]))
+                body = json.dumps(payload).encode() if payload is not None else b''
+
+                start = time.perf_counter()
+                status, response_headers = await call_asgi(application, method, path, headers, body)
+                latency = time.perf_counter() - start
+
+                if b'etag' in response_headers:
+                    etags[path] = response_headers[b'etag']
+                if loop.time() < measure_from:
+                    continue
+                result = results[name]
+                result['latencies'].append(latency)
+                if status == 304:
+                    result['not_modified'] += 1
+                elif status is None or status >= 400:
+                    result['errors'] += 1
+
+        started = loop.time()
+        await asyncio.gather(*(client(number) for number in range(options['concurrency'])))
+        return results, loop.time() - max(started, measure_from)
+
+    def report(self, results, elapsed, options):
+        self.stdout.write(
+            f"{options['concurrency']} clients for {options['duration']:.0f}s (after {options['warmup']:.0f}s warm-up)\n"
+        )
+        self.stdout.write(
+            f"{'scenario':<16} {'requests':>9} {'errors':>7} {'304s':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        total = 0
+        for name, result in sorted(results.items()):
+            latencies = sorted(result['latencies'])
+            total += len(latencies)
+            self.stdout.write(
+                f"{name:<16} {len(latencies):>9} {result['errors']:>7} {result['not_modified']:>6} "
+                f"{len(latencies) / elapsed:>8.1f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f}"
+            )
+        every = sorted(latency for result in results.values() for latency in result['latencies'])
+        self.stdout.write(self.style.SUCCESS(
+            f"\nTotal {total} requests, {total / elapsed:.1f} req/s; "
+            f"p50 {percentile(every, 0.5) * 1000:.1f} ms, p99 {percentile(every, 0.99) * 1000:.1f} ms"
+        ))
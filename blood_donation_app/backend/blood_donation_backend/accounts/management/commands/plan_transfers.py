@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.matching import BLOOD_TYPES
+from accounts.transfers import optimize_transfers, plan_transfers
+
+
+class Command(BaseCommand):
+    help = (
+        "Propose stock transfers that move near-expiry surplus to hospitals short of stock. "
+        "With --benchmark, time the optimizer on a synthetic network instead (no database writes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Print the plan without saving it.")
+        parser.add_argument(
+            '--benchmark', type=int, metavar='HOSPITALS', default=0,
+            help="Run the optimizer on a random network of this many hospitals and report the time.",
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['benchmark'], options['repeat'])
+            return
+
+        start = time.perf_counter()
+        transfers = plan_transfers(commit=not options['dry_run'])
+        elapsed = time.perf_counter() - start
+        for transfer in transfers:
+            self.stdout.write(
+                f"{transfer.quantity} x {transfer.blood_type}: hospital {transfer.from_hospital_id} -> "
+                f"hospital {transfer.to_hospital_id} ({transfer.distance_km} km)"
+            )
+        verb = "Planned" if options['dry_run'] else "Proposed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(transfers)} transfers in {elapsed * 1000:.1f} ms."))
+
+    def benchmark(self, hospitals, repeat):
+        rng = random.Random(14)
+        # Hospitals scattered over a region roughly the size of a large state
+        locations = {
+            hospital_id: (rng.uniform(8.0, 13.0), rng.uniform(76.0, 80.0))
+            for hospital_id in range(1, hospitals + 1)
+        }
+        surplus = {}
+        deficit = {}
+        for hospital_id in locations:
+            for blood_type in BLOOD_TYPES:
+                balance = rng.randint(-12, 12)
+                if balance > 0:
+                    surplus[(hospital_id, blood_type)] = balance
+                elif balance < 0:
+                    deficit[(hospital_id, blood_type)] = -balance
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            plan = optimize_transfers(locations, surplus, deficit)
+            timings.append(time.perf_counter() - start)
+
+        moved = sum(row[3] for row in plan)
+        total_km = sum(row[3] * row[4] for row in plan)
+        self.stdout.write(
+            f"{hospitals} hospitals, {len(surplus)} surplus and {len(deficit)} shortage entries: "
+            f"{len(plan)} transfers moving {moved} units ({total_km / max(moved, 1):.1f} km per unit)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"best {min(timings) * 1000:.1f} ms, worst {max(timings) * 1000:.1f} ms over {repeat} runs"
+        ))
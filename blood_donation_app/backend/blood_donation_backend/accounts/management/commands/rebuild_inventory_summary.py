@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.inventory import diff_inventory_summary, rebuild_inventory_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-hospital inventory summary from BloodUnit rows, or verify it with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hospital', type=int, action='append', dest='hospitals',
+            help="Limit to this hospital id (repeatable). Defaults to all hospitals.",
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only compare the summary with BloodUnit and report mismatches; exit non-zero if any.",
+        )
+
+    def handle(self, *args, **options):
+        hospital_ids = options['hospitals']
+
+        if options['verify']:
+            mismatches = diff_inventory_summary(hospital_ids)
+            for (hospital_id, blood_type), stored, actual in mismatches:
+                self.stdout.write(
+                    f"hospital {hospital_id} {blood_type}: stored quantity/units {stored}, actual {actual}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} inventory summary rows are out of date.")
+            self.stdout.write(self.style.SUCCESS("Inventory summary is consistent."))
+            return
+
+        written = rebuild_inventory_summary(hospital_ids)
+        mismatches = diff_inventory_summary(hospital_ids)
+        if mismatches:
+            raise CommandError(f"Rebuild finished but {len(mismatches)} rows still disagree.")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} inventory summary rows."))
@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.allocation import AllocationError, allocate_blood_request
+from accounts.inventory import diff_inventory_summary
+from accounts.matching import BLOOD_TYPES
+from accounts.models import BloodRequest, BloodUnit, Hospital
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency stress test for blood request allocation: many threads fulfil requests "
+        "against the same hospital's stock at once, then stock is checked for double allocation. "
+        "Needs a database with row locking (PostgreSQL); the data is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--units', type=int, default=600)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write("SQLite has no row locks; results only show serialized behaviour.")
+
+        hospital = self.seed(options['units'], options['requests'])
+        try:
+            self.run(hospital, options['threads'])
+            self.verify(hospital)
+        finally:
+            BloodUnit.objects.filter(hospital=hospital).delete()
+            hospital.delete()
+
+    def seed(self, units, requests):
+        rng = random.Random(7)
+        tag = int(time.time())
+        hospital = Hospital.objects.create_user(
+            email=f"stress-{tag}@hospital.test", password=None, hospital_name='Stress',
+            staff_name='Stress', staff_id=f"stress-{tag}", contact_info='000', address='Stress',
+        )
+        today = timezone.localdate()
+        for _ in range(units):
+            # save() keeps the inventory summary in step
+            BloodUnit.objects.create(
+                hospital=hospital,
+                blood_type=rng.choice(BLOOD_TYPES),
+                quantity=rng.randint(1, 4),
+                expiration_date=today + timedelta(days=rng.randint(1, 42)),
+            )
+        BloodRequest.objects.bulk_create([
+            BloodRequest(
+                hospital=hospital,
+                blood_type=rng.choice(BLOOD_TYPES),
+                quantity=rng.randint(1, 6),
+                priority_level='urgent',
+            )
+            for _ in range(requests)
+        ])
+        self.initial_quantity = BloodUnit.objects.filter(hospital=hospital).aggregate(total=Sum('quantity'))['total']
+        return hospital
+
+    def run(self, hospital, thread_count):
+        pending = list(BloodRequest.objects.filter(hospital=hospital).values_list('pk', flat=True))
+        lock = threading.Lock()
+        results = {'fulfilled': 0, 'short': 0, 'errors': 0}
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        request_id = pending.pop()
+                    try:
+                        allocate_blood_request(request_id)
+                        outcome = 'fulfilled'
+                    except AllocationError:
+                        outcome = 'short'
+                    except OperationalError:
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{results['fulfilled']} fulfilled, {results['short']} short of stock, "
+            f"{results['errors']} database errors in {elapsed:.2f}s with {thread_count} threads"
+        )
+
+    def verify(self, hospital):
+        problems = []
+        units = BloodUnit.objects.filter(hospital=hospital)
+
+        total = units.aggregate(total=Sum('quantity'))['total']
+        if total != self.initial_quantity:
+            problems.append(f"stock not conserved: {self.initial_quantity} before, {total} after")
+        if units.filter(quantity__lte=0).exists():
+            problems.append("units with non-positive quantity")
+
+        for blood_request in BloodRequest.objects.filter(hospital=hospital, status='fulfilled'):
+            allocated = blood_request.allocated_units.aggregate(total=Sum('quantity'))['total']
+            if allocated != blood_request.quantity:
+                problems.append(f"request {blood_request.pk} needs {blood_request.quantity}, got {allocated}")
+        if units.filter(status='used', allocated_to__isnull=True).exists():
+            problems.append("used units not linked to a request")
+        if diff_inventory_summary([hospital.pk]):
+            problems.append("inventory summary out of step")
+
+        if problems:
+            raise CommandError("Allocation invariants violated:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("No double allocation; stock and summary consistent."))
@@ -0,0 +1,109 @@
+from django.db.models import Q
+
+from .geo import within_radius_q
+from .models import Donor
+
+# Blood types in a fixed order; a type's position is its bit in the masks below
+BLOOD_TYPES = tuple(choice[0] for choice in Donor.BLOOD_TYPE_CHOICES)
+
+# Antigens carried on red cells: A, B and RhD
+_ANTIGEN_A = 0b001
+_ANTIGEN_B = 0b010
+_ANTIGEN_RH = 0b100
+
+
+def _antigens(blood_type):
+    abo, rh = blood_type[:-1], blood_type[-1]
+    antigens = _ANTIGEN_RH if rh == '+' else 0
+    if 'A' in abo:
+        antigens |= _ANTIGEN_A
+    if 'B' in abo:
+        antigens |= _ANTIGEN_B
+    return antigens
+
+
+def _build_donor_masks():
+    """
+    For each recipient type, a bitmask over BLOOD_TYPES of the donor types it
+    can receive red cells from. A donor is compatible when it carries no
+    antigen the recipient lacks.
+    """
+    masks = {}
+    for recipient in BLOOD_TYPES:
+        recipient_antigens = _antigens(recipient)
+        mask = 0
+        for bit, donor in enumerate(BLOOD_TYPES):
+            if _antigens(donor) & ~recipient_antigens == 0:
+                mask |= 1 << bit
+        masks[recipient] = mask
+    return masks
+
+
+DONOR_MASKS = _build_donor_masks()
+
+
+def _types_from_mask(mask):
+    return tuple(blood_type for bit, blood_type in enumerate(BLOOD_TYPES) if mask >> bit & 1)
+
+
+# Decoded once at import so lookups on the request path are a dict hit
+_COMPATIBLE_DONOR_TYPES = {recipient: _types_from_mask(mask) for recipient, mask in DONOR_MASKS.items()}
+_COMPATIBLE_RECIPIENT_TYPES = {
+    donor: tuple(
+        recipient for recipient, mask in DONOR_MASKS.items()
+        if mask >> BLOOD_TYPES.index(donor) & 1
+    )
+    for donor in BLOOD_TYPES
+}
+
+
+def compatible_donor_types(recipient_type):
+    """
+    Blood types that can donate to a recipient of the given type.
+    """
+    try:
+        return _COMPATIBLE_DONOR_TYPES[recipient_type]
+    except KeyError:
+        raise ValueError(f"Unknown blood type: {recipient_type}")
+
+
+def compatible_recipient_types(donor_type):
+    """
+    Blood types that can receive from a donor of the given type.
+    """
+    try:
+        return _COMPATIBLE_RECIPIENT_TYPES[donor_type]
+    except KeyError:
+        raise ValueError(f"Unknown blood type: {donor_type}")
+
+
+def is_compatible(donor_type, recipient_type):
+    return bool(DONOR_MASKS[recipient_type] >> BLOOD_TYPES.index(donor_type) & 1)
+
+
+def compatible_donors(blood_request, queryset=None, radius_km=None, include_unlocated=True):
+    """
+    Active donors whose blood type is compatible with the request, resolved
+    in a single ``blood_type__in`` query.
+
+    With ``radius_km`` and a hospital that has coordinates, donors are also
+    narrowed to the hospital's neighbourhood via the geohash index. This is a
+    superset of the circle; use ``accounts.geo.filter_within_radius`` on the
+    rows for the exact cut. Donors who haven't shared a location are kept
+    unless ``include_unlocated`` is False.
+    """
+    if queryset is None:
+        queryset = Donor.objects.all()
+    queryset = queryset.filter(
+        blood_type__in=compatible_donor_types(blood_request.blood_type),
+        is_active=True,
+    )
+    if radius_km is None:
+        return queryset
+    hospital = blood_request.hospital
+    if hospital.latitude is not None and hospital.longitude is not None:
+        nearby = within_radius_q(hospital.latitude, hospital.longitude, radius_km)
+        if include_unlocated:
+            nearby |= Q(latitude__isnull=True) | Q(longitude__isnull=True)
+        queryset = queryset.filter(nearby)
+    return queryset
@@ -0,0 +1,291 @@
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+    """
+    Cumulative histogram per label set, rendered in the Prometheus text
+    format. Kept in process memory, so each worker reports its own figures.
+    """
+
+    def __init__(self, name, documentation, buckets, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            names = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{names},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{names}}} {total}")
+            lines.append(f"{self.name}_count{{{names}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            names = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            lines.append(f"{self.name}{{{names}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', "Time to produce a response, by view.",
+    LATENCY_BUCKETS, ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', "Database queries run while handling a request, by view.",
+    QUERY_COUNT_BUCKETS, ('view', 'method'),
+)
+REQUEST_QUERY_TIME = Histogram(
+    'http_request_db_duration_seconds', "Time spent in database queries per request, by view.",
+    LATENCY_BUCKETS, ('view', 'method'),
+)
+REQUEST_SERIALIZER_TIME = Histogram(
+    'http_request_serializer_duration_seconds', "Time spent building serializer output per request, by view.",
+    LATENCY_BUCKETS, ('view', 'method'),
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    'http_request_query_budget_exceeded_total', "Requests that ran more queries than their view's budget.",
+    ('view', 'method'),
+)
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_QUERY_TIME, REQUEST_SERIALIZER_TIME, QUERY_BUDGET_EXCEEDED]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """
+    What one request spent on the database and on serializers. Queries are
+    fed to it by _record_query while it is the current request's scope.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - start
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    scope = _current.get()
+    if scope is None:
+        return execute(sql, params, many, context)
+    return scope(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """
+    connection_created receiver that adds _record_query to every connection.
+    Async views run their queries on a worker thread with its own connection;
+    the context variable follows them there, so one permanent wrapper counts
+    queries for sync and async requests alike.
+    """
+    if _record_query not in connection.execute_wrappers:
+        # First, so execute_wrapper() blocks popping their own wrapper leave it alone
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def _timed_data(data):
+    """
+    Wrap a serializer's ``data`` property so the time spent in it counts
+    towards the current request. Nested serializers are only timed once, at
+    the outermost call.
+    """
+    fget = data.fget
+
+    def timed(self):
+        scope = _current.get()
+        if scope is None or scope.serializing:
+            return fget(self)
+        scope.serializing = True
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            scope.serializing = False
+            scope.serializer_time += time.perf_counter() - start
+
+    return property(timed)
+
+
+def instrument_serializers():
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, '_request_timed', False):
+            cls.data = _timed_data(cls.data)
+            cls.data.fget._request_timed = True
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(request):
+    """
+    Most queries the matched view may run: ``QUERY_BUDGETS[view name]`` if
+    set, else the view class's ``query_budget``. Either may be a number or a
+    ``{method: number}`` dict. None means no budget.
+    """
+    match = request.resolver_match
+    if match is None:
+        return None
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.view_name in budgets:
+        budget = budgets[match.view_name]
+    else:
+        budget = getattr(getattr(match.func, 'view_class', None), 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(request.method)
+    return budget
+
+
+def _view_label(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class InstrumentationMiddleware:
+    """
+    Record latency, database queries and serializer time for every request,
+    by view, and enforce per-view query budgets. Over-budget requests are
+    logged and counted; with QUERY_BUDGET_STRICT (on under the test runner,
+    see accounts.test_runner) they raise so the test fails. Runs natively under both WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        scope = RequestMetrics()
+        token = _current.set(scope)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, scope, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        scope = RequestMetrics()
+        token = _current.set(scope)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, scope, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, scope, elapsed):
+        view = _view_label(request)
+        method = request.method
+        REQUEST_LATENCY.observe(elapsed, view, method, response.status_code)
+        REQUEST_QUERIES.observe(scope.queries, view, method)
+        REQUEST_QUERY_TIME.observe(scope.query_time, view, method)
+        REQUEST_SERIALIZER_TIME.observe(scope.serializer_time, view, method)
+
+        budget = query_budget(request)
+        if budget is not None and scope.queries > budget:
+            QUERY_BUDGET_EXCEEDED.inc(view, method)
+            logger.warning(
+                "Query budget exceeded",
+                extra={'view': view, 'method': method, 'queries': scope.queries, 'budget': budget},
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(
+                    f"{method} {view} ran {scope.queries} queries; its budget is {budget}."
+                )
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Needs ``Authorization: Bearer
+    <METRICS_TOKEN>`` when that setting is set, else only answers local
+    requests.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        allowed = request.headers.get('Authorization') == f"Bearer {token}"
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
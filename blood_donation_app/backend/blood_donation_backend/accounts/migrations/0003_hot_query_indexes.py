@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_hospital_approval_status'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['hospital', '-created_at'], name='bloodreq_hospital_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['hospital', 'blood_type'], name='bloodreq_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodunit',
+            index=models.Index(fields=['hospital', 'status', 'blood_type'], name='bloodunit_hosp_status_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodunit',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['hospital', 'blood_type', 'expiration_date'], name='bloodunit_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donor',
+            index=models.Index(fields=['blood_type', 'is_active'], name='donor_type_active_idx'),
+        ),
+    ]
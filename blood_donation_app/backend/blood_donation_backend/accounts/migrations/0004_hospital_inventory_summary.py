@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_summary(apps, schema_editor):
+    BloodUnit = apps.get_model('accounts', 'BloodUnit')
+    HospitalInventorySummary = apps.get_model('accounts', 'HospitalInventorySummary')
+    rows = BloodUnit.objects.filter(status='available').values('hospital_id', 'blood_type').annotate(
+        quantity=models.Sum('quantity'),
+        units=models.Count('id'),
+    )
+    HospitalInventorySummary.objects.bulk_create(
+        [
+            HospitalInventorySummary(
+                hospital_id=row['hospital_id'],
+                blood_type=row['blood_type'],
+                available_quantity=row['quantity'],
+                available_units=row['units'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HospitalInventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('available_quantity', models.IntegerField(default=0)),
+                ('available_units', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hospital', 'blood_type'), name='inventory_summary_unique')],
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
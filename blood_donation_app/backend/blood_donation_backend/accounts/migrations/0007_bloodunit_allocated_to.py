@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_donation_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bloodunit',
+            name='allocated_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='allocated_units', to='accounts.bloodrequest'),
+        ),
+    ]
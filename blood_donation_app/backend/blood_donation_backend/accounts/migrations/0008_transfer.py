@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_bloodunit_allocated_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('quantity', models.IntegerField()),
+                ('distance_km', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('proposed', 'Proposed'), ('assigned', 'Assigned'), ('in_transit', 'In transit'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], default='proposed', max_length=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('delivery_staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers', to='accounts.deliverystaff')),
+                ('from_hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_transfers', to=settings.AUTH_USER_MODEL)),
+                ('to_hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transfers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'from_hospital'], name='transfer_status_from_idx'), models.Index(fields=['status', 'to_hospital'], name='transfer_status_to_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_transfer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverystaff',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='deliverystaff',
+            name='is_available',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='deliverystaff',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverystaff',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DeliveryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('assigned', 'Assigned'), ('picked_up', 'Picked up'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], default='pending', max_length=15)),
+                ('pickup_sequence', models.PositiveIntegerField(blank=True, null=True)),
+                ('dropoff_sequence', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('blood_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_jobs', to='accounts.bloodrequest')),
+                ('delivery_staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_jobs', to='accounts.deliverystaff')),
+                ('dropoff_hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_dropoffs', to=settings.AUTH_USER_MODEL)),
+                ('pickup_hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_pickups', to=settings.AUTH_USER_MODEL)),
+                ('transfer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='delivery_job', to='accounts.transfer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='deliveryjob_status_created_idx'), models.Index(fields=['delivery_staff', 'status'], name='deliveryjob_staff_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_delivery_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('daily_demand', models.FloatField()),
+                ('demand_std', models.FloatField()),
+                ('smoothing', models.FloatField()),
+                ('reorder_threshold', models.IntegerField()),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('backtest_wape', models.FloatField(blank=True, null=True)),
+                ('history_days', models.IntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demand_forecasts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hospital', 'blood_type'), name='demand_forecast_unique')],
+            },
+        ),
+    ]
@@ -1,7 +1,12 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group, Permission
 from django.utils import timezone
 
+from .geo import encode_geohash
+from .inventory_cache import invalidate_inventory
+
 # Custom user manager
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -25,8 +30,28 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
+# Coordinates plus a geohash column for radius searches (see accounts.geo)
+class GeoLocatedModel(models.Model):
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
 # Model for Donor
-class Donor(AbstractBaseUser, PermissionsMixin):
+class Donor(GeoLocatedModel, AbstractBaseUser, PermissionsMixin):
     BLOOD_TYPE_CHOICES = [
         ('A+', 'A+'),
         ('A-', 'A-'),
@@ -56,6 +81,8 @@ class Donor(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(default=timezone.now)
 
     device_token = models.CharField(max_length=255, null=True, blank=True)
+    # Denormalized from Donation history so eligibility can be checked in SQL
+    next_eligible_date = models.DateField(null=True, blank=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['firstname', 'lastname', 'dob', 'gender', 'blood_type', 'phone_number']
@@ -74,12 +101,18 @@ class Donor(AbstractBaseUser, PermissionsMixin):
         blank=True
     )
 
+    class Meta:
+        indexes = [
+            # Donor fan-out filters on compatible blood types among active donors
+            models.Index(fields=['blood_type', 'is_active'], name='donor_type_active_idx'),
+        ]
+
     def __str__(self):
         return f"{self.firstname} {self.lastname}"
 
 
 # Model for Delivery Staff
-class DeliveryStaff(AbstractBaseUser, PermissionsMixin):
+class DeliveryStaff(GeoLocatedModel, AbstractBaseUser, PermissionsMixin):
     GENDER_CHOICES = [
         ('Male', 'Male'),
         ('Female', 'Female'),
@@ -93,6 +126,8 @@ class DeliveryStaff(AbstractBaseUser, PermissionsMixin):
     gender = models.CharField(max_length=7, choices=GENDER_CHOICES)
     license_number = models.CharField(max_length=50, unique=True)
     vehicle_type = models.CharField(max_length=50)
+    # On shift and accepting delivery jobs (see accounts.delivery)
+    is_available = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
@@ -119,7 +154,7 @@ class DeliveryStaff(AbstractBaseUser, PermissionsMixin):
 
 
     
-class Hospital(AbstractBaseUser, PermissionsMixin):
+class Hospital(GeoLocatedModel, AbstractBaseUser, PermissionsMixin):
     APPROVAL_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -182,6 +217,18 @@ class BloodRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     fulfilled_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # A hospital's request history, newest first
+            models.Index(fields=['hospital', '-created_at'], name='bloodreq_hospital_created_idx'),
+            # Open requests only; small compared to the full history
+            models.Index(
+                fields=['hospital', 'blood_type'],
+                condition=models.Q(status='pending'),
+                name='bloodreq_pending_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Request {self.id} by {self.hospital.hospital_name} for {self.blood_type}"
 
@@ -218,10 +265,55 @@ class BloodUnit(models.Model):
     expiration_date = models.DateField()
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='available')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the unit is consumed to fulfil a blood request (see accounts.allocation)
+    allocated_to = models.ForeignKey(
+        BloodRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='allocated_units'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hospital', 'status', 'blood_type'], name='bloodunit_hosp_status_type_idx'),
+            # Dashboard and allocation queries only ever look at available stock
+            models.Index(
+                fields=['hospital', 'blood_type', 'expiration_date'],
+                condition=models.Q(status='available'),
+                name='bloodunit_available_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.quantity} units of {self.blood_type} at {self.hospital.hospital_name}"
 
+    def _summary_contribution(self):
+        """
+        What this unit adds to its hospital's inventory summary, keyed by
+        (hospital_id, blood_type).
+        """
+        if self.status != 'available':
+            return None
+        return (self.hospital_id, self.blood_type), self.quantity
+
+    def save(self, *args, **kwargs):
+        # Keep HospitalInventorySummary in step with every write, in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            previous = None
+            if self.pk is not None:
+                previous = BloodUnit.objects.select_for_update().filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            before = previous._summary_contribution() if previous else None
+            after = self._summary_contribution()
+            HospitalInventorySummary.apply_change(before, after)
+            if before is not None and before == after:
+                # Stock totals unchanged (e.g. a new expiry date), but cached unit lists are stale
+                invalidate_inventory(self.hospital_id, self.blood_type)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            contribution = self._summary_contribution()
+            result = super().delete(*args, **kwargs)
+            HospitalInventorySummary.apply_change(contribution, None)
+        return result
+
     def check_expiration(self):
         """
         Mark the blood unit as expired if the expiration date has passed.
@@ -245,18 +337,200 @@ class BloodUnit(models.Model):
         self.save()
 
 
+# Per-hospital available stock by blood type, maintained incrementally by BloodUnit writes
+class HospitalInventorySummary(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='inventory_summary')
+    blood_type = models.CharField(max_length=3, choices=BloodUnit.BLOOD_TYPE_CHOICES)
+    available_quantity = models.IntegerField(default=0)
+    available_units = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'blood_type'], name='inventory_summary_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.available_quantity} units of {self.blood_type} at hospital {self.hospital_id}"
+
+    @classmethod
+    def apply_delta(cls, hospital_id, blood_type, quantity, units):
+        """
+        Add ``quantity`` and ``units`` (either may be negative) to one summary row.
+        """
+        if not quantity and not units:
+            return
+        summary, _ = cls.objects.get_or_create(hospital_id=hospital_id, blood_type=blood_type)
+        cls.objects.filter(pk=summary.pk).update(
+            available_quantity=models.F('available_quantity') + quantity,
+            available_units=models.F('available_units') + units,
+            updated_at=timezone.now(),
+        )
+        invalidate_inventory(hospital_id, blood_type)
+
+    @classmethod
+    def apply_change(cls, before, after):
+        """
+        Move a unit's contribution from ``before`` to ``after``; each is either
+        None or a ``((hospital_id, blood_type), quantity)`` pair.
+        """
+        if before == after:
+            return
+        if before is not None:
+            key, quantity = before
+            if after is not None and after[0] == key:
+                cls.apply_delta(*key, after[1] - quantity, 0)
+                return
+            cls.apply_delta(*key, -quantity, -1)
+        if after is not None:
+            key, quantity = after
+            cls.apply_delta(*key, quantity, 1)
+
+
+# Model for a donor's donation history
+class Donation(models.Model):
+    donor = models.ForeignKey(Donor, on_delete=models.CASCADE, related_name='donations')
+    hospital = models.ForeignKey(Hospital, on_delete=models.SET_NULL, null=True, blank=True, related_name='donations')
+    blood_request = models.ForeignKey(
+        BloodRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='donations'
+    )
+    donation_date = models.DateField(default=timezone.localdate)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['donor', '-donation_date'], name='donation_donor_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Donation by donor {self.donor_id} on {self.donation_date}"
 
+    def save(self, *args, **kwargs):
+        from .eligibility import refresh_next_eligible_date
 
+        with transaction.atomic(using=kwargs.get('using')):
+            previous_donor_id = None
+            if self.pk is not None:
+                previous_donor_id = Donation.objects.filter(pk=self.pk).values_list('donor_id', flat=True).first()
+            super().save(*args, **kwargs)
+            refresh_next_eligible_date(self.donor_id)
+            if previous_donor_id is not None and previous_donor_id != self.donor_id:
+                refresh_next_eligible_date(previous_donor_id)
 
+    def delete(self, *args, **kwargs):
+        from .eligibility import refresh_next_eligible_date
 
+        with transaction.atomic(using=kwargs.get('using')):
+            result = super().delete(*args, **kwargs)
+            refresh_next_eligible_date(self.donor_id)
+        return result
 
 
+# Model for moving stock between hospitals (proposed by accounts.transfers)
+class Transfer(models.Model):
+    STATUS_CHOICES = [
+        ('proposed', 'Proposed'),
+        ('assigned', 'Assigned'),
+        ('in_transit', 'In transit'),
+        ('delivered', 'Delivered'),
+        ('canceled', 'Canceled'),
+    ]
 
+    # Statuses whose quantity is already committed and must not be planned again
+    OPEN_STATUSES = ('proposed', 'assigned', 'in_transit')
 
+    from_hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='outgoing_transfers')
+    to_hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='incoming_transfers')
+    blood_type = models.CharField(max_length=3, choices=BloodUnit.BLOOD_TYPE_CHOICES)
+    quantity = models.IntegerField()
+    distance_km = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='proposed')
+    delivery_staff = models.ForeignKey(
+        DeliveryStaff, on_delete=models.SET_NULL, null=True, blank=True, related_name='transfers'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'from_hospital'], name='transfer_status_from_idx'),
+            models.Index(fields=['status', 'to_hospital'], name='transfer_status_to_idx'),
+        ]
 
+    def __str__(self):
+        return (
+            f"Transfer {self.id}: {self.quantity} units of {self.blood_type} "
+            f"from hospital {self.from_hospital_id} to hospital {self.to_hospital_id}"
+        )
 
 
+# Model for a pickup and drop-off between hospitals, routed by accounts.delivery
+class DeliveryJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('assigned', 'Assigned'),
+        ('picked_up', 'Picked up'),
+        ('delivered', 'Delivered'),
+        ('canceled', 'Canceled'),
+    ]
 
+    # Jobs that still occupy a place on a driver's route
+    ACTIVE_STATUSES = ('assigned', 'picked_up')
 
+    pickup_hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='delivery_pickups')
+    dropoff_hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='delivery_dropoffs')
+    transfer = models.OneToOneField(
+        Transfer, on_delete=models.CASCADE, null=True, blank=True, related_name='delivery_job'
+    )
+    blood_request = models.ForeignKey(
+        BloodRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='delivery_jobs'
+    )
+    quantity = models.IntegerField()
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
+    delivery_staff = models.ForeignKey(
+        DeliveryStaff, on_delete=models.SET_NULL, null=True, blank=True, related_name='delivery_jobs'
+    )
+    # Positions of the two stops on the assigned driver's route
+    pickup_sequence = models.PositiveIntegerField(null=True, blank=True)
+    dropoff_sequence = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    assigned_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='deliveryjob_status_created_idx'),
+            models.Index(fields=['delivery_staff', 'status'], name='deliveryjob_staff_status_idx'),
+        ]
 
+    def __str__(self):
+        return (
+            f"Delivery {self.id}: {self.quantity} units from hospital {self.pickup_hospital_id} "
+            f"to hospital {self.dropoff_hospital_id}"
+        )
+
+
+# Demand forecast per hospital and blood type, refreshed nightly by accounts.forecasting
+class DemandForecast(models.Model):
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='demand_forecasts')
+    blood_type = models.CharField(max_length=3, choices=BloodUnit.BLOOD_TYPE_CHOICES)
+    # Expected units requested per day, and the spread of the daily forecast error
+    daily_demand = models.FloatField()
+    demand_std = models.FloatField()
+    smoothing = models.FloatField()
+    # Stock below which the hospital should reorder (replaces a fixed low-stock level)
+    reorder_threshold = models.IntegerField()
+    # Days the stock on hand lasted at forecast time; None when there is no demand
+    days_of_cover = models.FloatField(null=True, blank=True)
+    # Weighted absolute percentage error over the held-out days; None without demand to score
+    backtest_wape = models.FloatField(null=True, blank=True)
+    history_days = models.IntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'blood_type'], name='demand_forecast_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.daily_demand:.1f}/day of {self.blood_type} at hospital {self.hospital_id}"
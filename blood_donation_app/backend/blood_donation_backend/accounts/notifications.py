@@ -0,0 +1,318 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .eligibility import eligible_donors_q
+from .geo import filter_within_radius
+from .matching import compatible_donors
+from .models import BloodRequest, Donor
+
+logger = logging.getLogger(__name__)
+
+# FCM accepts at most 500 registration tokens per multicast call
+MAX_MULTICAST_TOKENS = 500
+
+
+class FirebaseMessagingBackend:
+    """
+    Sends push notifications through the Firebase Admin SDK multicast API.
+    The SDK is imported and the app initialised on the first send, not at
+    startup, from FIREBASE_SERVICE_ACCOUNT_KEY (or Google application default
+    credentials when that is unset).
+    """
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+
+    def app(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = _firebase_app()
+        return self._app
+
+    def send_multicast(self, tokens, title, body, data=None):
+        from firebase_admin import messaging
+
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(title=title, body=body),
+            data=data or {},
+            tokens=list(tokens),
+        )
+        response = messaging.send_each_for_multicast(message, app=self.app())
+        # FCM no longer knows these devices (app uninstalled, token rotated)
+        invalid = [
+            token for token, result in zip(message.tokens, response.responses)
+            if isinstance(result.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+        ]
+        return response.success_count, response.failure_count, invalid
+
+
+def _firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        # Already initialised, e.g. by another backend instance
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    key = getattr(settings, 'FIREBASE_SERVICE_ACCOUNT_KEY', None)
+    return firebase_admin.initialize_app(credentials.Certificate(key) if key else None)
+
+
+class LocalMessagingBackend:
+    """
+    In-process backend that records every batch instead of sending it.
+    Used for local development and tests. Tokens in ``invalid_tokens`` are
+    reported back as unregistered, like FCM does for uninstalled apps.
+    """
+
+    outbox = []
+    invalid_tokens = set()
+    _lock = threading.Lock()
+
+    def send_multicast(self, tokens, title, body, data=None):
+        tokens = list(tokens)
+        with self._lock:
+            self.outbox.append({
+                'tokens': tokens,
+                'title': title,
+                'body': body,
+                'data': data or {},
+            })
+        invalid = [token for token in tokens if token in self.invalid_tokens]
+        return len(tokens) - len(invalid), len(invalid), invalid
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.outbox.clear()
+            cls.invalid_tokens.clear()
+
+
+# Push providers PUSH_NOTIFICATION_BACKEND may name; it also takes a dotted path
+MESSAGING_BACKENDS = {
+    'firebase': 'accounts.notifications.FirebaseMessagingBackend',
+    'local': 'accounts.notifications.LocalMessagingBackend',
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_messaging_backend(name, path):
+    MESSAGING_BACKENDS[name] = path
+
+
+def get_messaging_backend():
+    """
+    The configured push provider. Each provider is imported and created on
+    first use and then shared, so startup never pays for one that isn't used.
+    """
+    name = getattr(settings, 'PUSH_NOTIFICATION_BACKEND', 'firebase')
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = _backends[name] = import_string(MESSAGING_BACKENDS.get(name, name))()
+    return backend
+
+
+def _worker_count():
+    return getattr(settings, 'DONOR_NOTIFICATION_WORKERS', 4)
+
+
+def _batch_size():
+    return min(getattr(settings, 'DONOR_NOTIFICATION_BATCH_SIZE', MAX_MULTICAST_TOKENS), MAX_MULTICAST_TOKENS)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_worker_count(),
+                thread_name_prefix='donor-notify',
+            )
+        return _executor
+
+
+def notification_radius_km():
+    return getattr(settings, 'DONOR_NOTIFICATION_RADIUS_KM', None)
+
+
+def eligible_donor_queryset(blood_request):
+    """
+    Donors that should be notified about the given blood request: compatible,
+    nearby, currently eligible to donate and reachable by push.
+    """
+    include_unlocated = getattr(settings, 'DONOR_NOTIFICATION_INCLUDE_UNLOCATED', True)
+    return compatible_donors(
+        blood_request, radius_km=notification_radius_km(), include_unlocated=include_unlocated,
+    ).filter(
+        eligible_donors_q(),
+        device_token__isnull=False,
+    ).exclude(device_token='')
+
+
+def iter_token_batches(queryset, batch_size, origin=None, radius_km=None):
+    """
+    Stream device tokens from the database in fixed-size batches so memory
+    stays constant regardless of how many donors match.
+
+    With an ``origin`` (lat, lng) and ``radius_km``, each chunk is cut to the
+    exact circle; donors without coordinates pass through unchanged.
+    """
+    rows = queryset.values_list('device_token', 'latitude', 'longitude').iterator(chunk_size=batch_size)
+    batch = []
+    chunk = []
+
+    def flush_chunk():
+        if origin is None:
+            return [row[0] for row in chunk]
+        unlocated = [row[0] for row in chunk if row[1] is None or row[2] is None]
+        return unlocated + filter_within_radius(chunk, origin[0], origin[1], radius_km)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            batch.extend(flush_chunk())
+            chunk = []
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+    batch.extend(flush_chunk())
+    while batch:
+        yield batch[:batch_size]
+        batch = batch[batch_size:]
+
+
+def build_notification(blood_request):
+    hospital = blood_request.hospital
+    title = "Urgent Blood Donation Request!"
+    body = (
+        f"{hospital.hospital_name} needs {blood_request.quantity} units of {blood_request.blood_type} blood. "
+        f"Contact: {hospital.contact_info}. Location: {hospital.address if hospital.address else 'N/A'}."
+    )
+    data = {
+        'blood_request_id': str(blood_request.pk),
+        'blood_type': blood_request.blood_type,
+        'priority_level': blood_request.priority_level,
+    }
+    return title, body, data
+
+
+def _send_batch(backend, tokens, title, body, data):
+    try:
+        return backend.send_multicast(tokens, title, body, data)
+    except Exception:
+        logger.exception("Failed to send notification batch of %d tokens", len(tokens))
+        return 0, len(tokens), []
+
+
+def prune_device_tokens(tokens, batch_size=MAX_MULTICAST_TOKENS):
+    """
+    Forget device tokens the push provider reported as unregistered, so those
+    donors aren't sent to again until their app registers a new token.
+    Returns the number of donors updated.
+    """
+    pruned = 0
+    for start in range(0, len(tokens), batch_size):
+        pruned += Donor.objects.filter(device_token__in=tokens[start:start + batch_size]).update(device_token=None)
+    return pruned
+
+
+def send_donor_notifications(blood_request, backend=None):
+    """
+    Notify every eligible donor about a blood request.
+
+    Tokens are streamed in batches and each batch is sent with one multicast
+    call on the shared worker pool. At most one batch per worker is in flight,
+    so a very large donor pool never builds up an unbounded queue. Tokens the
+    provider reports as unregistered are pruned afterwards.
+    Returns a ``(success_count, failure_count)`` tuple.
+    """
+    backend = backend or get_messaging_backend()
+    title, body, data = build_notification(blood_request)
+    executor = _get_executor()
+    in_flight = threading.BoundedSemaphore(_worker_count())
+    futures = []
+
+    def release(_future):
+        in_flight.release()
+
+    hospital = blood_request.hospital
+    radius_km = notification_radius_km()
+    origin = None
+    if radius_km is not None and hospital.latitude is not None and hospital.longitude is not None:
+        origin = (hospital.latitude, hospital.longitude)
+
+    queryset = eligible_donor_queryset(blood_request)
+    for tokens in iter_token_batches(queryset, _batch_size(), origin, radius_km):
+        in_flight.acquire()
+        future = executor.submit(_send_batch, backend, tokens, title, body, data)
+        future.add_done_callback(release)
+        futures.append(future)
+
+    success = failure = 0
+    invalid = []
+    for future in futures:
+        sent, failed, unregistered = future.result()
+        success += sent
+        failure += failed
+        invalid.extend(unregistered)
+    if invalid:
+        prune_device_tokens(invalid)
+
+    logger.info(
+        "Blood request %s: notified %d donors (%d failures)", blood_request.pk, success, failure
+    )
+    return success, failure
+
+
+def _dispatch(blood_request_id):
+    try:
+        blood_request = BloodRequest.objects.select_related('hospital').get(pk=blood_request_id)
+        send_donor_notifications(blood_request)
+    except BloodRequest.DoesNotExist:
+        logger.warning("Blood request %s no longer exists; skipping notifications", blood_request_id)
+    except Exception:
+        logger.exception("Notification dispatch failed for blood request %s", blood_request_id)
+    finally:
+        # Worker threads own their connection; don't leave it open between jobs
+        connection.close()
+
+
+_dispatcher = None
+
+
+def _get_dispatcher():
+    global _dispatcher
+    with _executor_lock:
+        if _dispatcher is None:
+            # A separate single-threaded stage streams donors so that the
+            # sender pool is never blocked waiting on its own submissions.
+            _dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='donor-dispatch')
+        return _dispatcher
+
+
+def dispatch_donor_notifications(blood_request):
+    """
+    Queue notifications for a blood request once the surrounding transaction
+    commits. Returns immediately; sending happens in the background.
+    """
+    if getattr(settings, 'DONOR_NOTIFICATIONS_SYNC', False):
+        transaction.on_commit(lambda: send_donor_notifications(blood_request))
+        return
+    transaction.on_commit(lambda: _get_dispatcher().submit(_dispatch, blood_request.pk))
@@ -0,0 +1,78 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .matching import compatible_donor_types
+
+logger = logging.getLogger(__name__)
+
+BLOOD_REQUEST_EVENT = 'blood_request.created'
+EXPIRY_ALERT_EVENT = 'inventory.expiry_alert'
+
+
+def blood_type_group(blood_type):
+    """
+    Channel layer group for donors of a blood type. Group names may only
+    contain ASCII letters, digits, hyphens, underscores and periods.
+    """
+    suffix = 'pos' if blood_type.endswith('+') else 'neg'
+    return f"donors.{blood_type[:-1]}_{suffix}"
+
+
+def hospital_group(hospital_id):
+    return f"hospital.{hospital_id}"
+
+
+def blood_request_payload(blood_request):
+    hospital = blood_request.hospital
+    return {
+        'id': blood_request.pk,
+        'hospital_name': hospital.hospital_name,
+        'contact_info': hospital.contact_info,
+        'address': hospital.address,
+        'blood_type': blood_request.blood_type,
+        'quantity': blood_request.quantity,
+        'priority_level': blood_request.priority_level,
+        'status': blood_request.status,
+        'created_at': blood_request.created_at.isoformat() if blood_request.created_at else None,
+    }
+
+
+def _blood_request_event(blood_request):
+    event = {'type': BLOOD_REQUEST_EVENT, 'request': blood_request_payload(blood_request)}
+    groups = [blood_type_group(blood_type) for blood_type in compatible_donor_types(blood_request.blood_type)]
+    groups.append(hospital_group(blood_request.hospital_id))
+    return groups, event
+
+
+def broadcast_blood_request(blood_request):
+    """
+    Publish a new blood request to every connected donor who can give to it,
+    and to the requesting hospital's own dashboards.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    groups, event = _blood_request_event(blood_request)
+    try:
+        for group in groups:
+            async_to_sync(channel_layer.group_send)(group, event)
+    except Exception:
+        # Real-time delivery is best effort; push notifications still go out
+        logger.exception("Failed to broadcast blood request %s", blood_request.pk)
+
+
+def send_expiry_alert(hospital_id, alert):
+    """
+    Push a near-expiry stock alert to a hospital's connected dashboards.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            hospital_group(hospital_id), {'type': EXPIRY_ALERT_EVENT, 'alert': alert},
+        )
+    except Exception:
+        logger.exception("Failed to send expiry alert to hospital %s", hospital_id)
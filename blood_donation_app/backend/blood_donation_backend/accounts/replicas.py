@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Zero when the replica has replayed everything it received, so an idle
+# primary doesn't read as lag; NULL until the replica has replayed anything
+LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+@lru_cache(maxsize=None)
+def _warn_pins_not_shared():
+    logger.warning(
+        "Replica reads are off: read-your-writes pins would live in a process-local cache. "
+        "Set REDIS_URL to share the default cache between workers."
+    )
+
+
+def replica_reads_enabled():
+    """
+    Whether reads may go to a replica at all. Clients that wrote are pinned
+    to the primary through the default cache; if that cache is local to the
+    process, a client could write through one worker and read stale rows
+    through another, so replicas are not used.
+    """
+    if not replica_aliases():
+        return False
+    if isinstance(caches['default'], (LocMemCache, DummyCache)):
+        _warn_pins_not_shared()
+        return False
+    return True
+
+
+def replica_max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+
+def measure_lag(alias):
+    """
+    Seconds the replica ``alias`` is behind the primary, or None if unknown.
+    Backends other than PostgreSQL (SQLite aliases in tests) only have to
+    answer.
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor != 'postgresql':
+            cursor.execute('SELECT 1')
+            return 0.0
+        cursor.execute(LAG_SQL)
+        (lag,) = cursor.fetchone()
+    return None if lag is None else float(lag)
+
+
+class ReplicaMonitor:
+    """
+    Last measured lag of each replica. Measurements are refreshed on a
+    background thread at most every REPLICA_LAG_CHECK_INTERVAL seconds, so
+    requests never wait on them; until the first one lands a replica counts
+    as lagging.
+    """
+
+    def __init__(self):
+        self._lag = {}
+        self._checking = set()
+        self._lock = threading.Lock()
+
+    def lag(self, alias):
+        interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+        with self._lock:
+            lag, checked_at = self._lag.get(alias, (None, None))
+            stale = checked_at is None or time.monotonic() - checked_at >= interval
+            if stale and alias not in self._checking:
+                self._checking.add(alias)
+                threading.Thread(
+                    target=self._check, args=(alias,), name=f'replica-lag-{alias}', daemon=True,
+                ).start()
+        return lag
+
+    def _check(self, alias):
+        try:
+            lag = measure_lag(alias)
+        except Exception:
+            logger.warning("Replica %s is unreachable; reading from the primary", alias, exc_info=True)
+            lag = None
+        finally:
+            # The thread is done with its connection
+            connections[alias].close()
+        self.record(alias, lag)
+
+    def record(self, alias, lag):
+        """
+        Store a lag measurement (None if unknown) for ``alias``.
+        """
+        with self._lock:
+            self._lag[alias] = (lag, time.monotonic())
+            self._checking.discard(alias)
+
+    def healthy(self):
+        max_lag = replica_max_lag()
+        for alias in replica_aliases():
+            lag = self.lag(alias)
+            if lag is not None and lag <= max_lag:
+                return alias
+        return None
+
+
+monitor = ReplicaMonitor()
+
+
+class RequestRouting:
+    """
+    What the router knows about the request in progress: which view it is
+    for, whether it has written anything and which replica it read from.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self.replica = None
+        self._pinned = None
+
+    def wants_replica(self):
+        request = self.request
+        if self.wrote or request.method not in READ_METHODS or request.resolver_match is None:
+            return False
+        view_class = getattr(request.resolver_match.func, 'view_class', None)
+        return getattr(view_class, 'read_replica', False) and not self.pinned()
+
+    def pinned(self):
+        # Cached for the request; the pin is only looked up on the first read
+        if self._pinned is None:
+            key = pin_key(self.request)
+            self._pinned = bool(key and cache.get(key))
+        return self._pinned
+
+
+_current = ContextVar('request_routing', default=None)
+
+
+def pin_key(request):
+    """
+    Cache key of a client's read-your-writes pin: one per bearer token, so
+    the pin needs no user lookup.
+    """
+    header = request.headers.get('Authorization')
+    if not header:
+        return None
+    return f"replica:pin:{hashlib.md5(header.encode()).hexdigest()}"
+
+
+def used_replica():
+    """
+    Whether the current request has read from a replica, whose rows may be
+    up to REPLICA_MAX_LAG seconds old.
+    """
+    routing = _current.get()
+    return routing is not None and routing.replica is not None
+
+
+class ReplicaRouter:
+    """
+    Writes always go to the primary. Reads go to a replica only for GET and
+    HEAD requests to views that set ``read_replica = True``, only while the
+    replica is within REPLICA_MAX_LAG seconds, and not for a client that
+    wrote within that window, so clients always see their own writes.
+    Everything outside a request (commands, workers) uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or not replica_reads_enabled() or not routing.wants_replica():
+            return None
+        alias = monitor.healthy()
+        if alias is not None:
+            routing.replica = alias
+        return alias
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Make the request visible to ReplicaRouter, and pin a client to the
+    primary for REPLICA_MAX_LAG seconds after a request of theirs writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request)
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request)
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        await self.afinish(routing)
+        return response
+
+    def finish(self, routing):
+        key = pin_key(routing.request)
+        if routing.wrote and key and replica_reads_enabled():
+            cache.set(key, True, replica_max_lag())
+
+    async def afinish(self, routing):
+        key = pin_key(routing.request)
+        if routing.wrote and key and replica_reads_enabled():
+            await cache.aset(key, True, replica_max_lag())
@@ -0,0 +1,214 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .geo import encode_geohash
+from .inventory import rebuild_inventory_summary
+from .models import BloodRequest, BloodUnit, Donor, Hospital
+
+# Seeded principals all use this domain and password, so load tests can log in
+# as them and clear_seed_data can find them again
+SEED_DOMAIN = 'seed.test'
+SEED_PASSWORD = 'Seed-password-1'
+
+# Rough share of each blood type in the donor population
+BLOOD_TYPE_WEIGHTS = {
+    'O+': 37, 'A+': 34, 'B+': 10, 'AB+': 4, 'O-': 6, 'A-': 6, 'B-': 2, 'AB-': 1,
+}
+
+# Area hospitals and donors are scattered over (south India)
+LATITUDE_RANGE = (8.0, 13.0)
+LONGITUDE_RANGE = (76.0, 80.0)
+
+
+def _batches(total, batch_size):
+    while total > 0:
+        size = min(batch_size, total)
+        yield size
+        total -= size
+
+
+class Seeder:
+    """
+    Generate synthetic hospitals, donors, blood units and requests with
+    ``bulk_create``, a batch at a time so millions of rows never sit in
+    memory together. Rows are tagged per run so repeated seeding never
+    collides with unique emails, phone numbers or staff ids.
+    """
+
+    def __init__(self, seed=22, batch_size=5000, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        # Five hex digits, so 's' + tag + donor number fits a 15-character phone number
+        self.tag = format(int(time.time()) % 16 ** 5, '05x')
+        self.today = timezone.localdate()
+        # One real hash, shared by every seeded principal
+        self.password = make_password(SEED_PASSWORD)
+        self._types = list(BLOOD_TYPE_WEIGHTS)
+        self._weights = [BLOOD_TYPE_WEIGHTS[blood_type] for blood_type in self._types]
+
+    def blood_types(self, count):
+        return self.rng.choices(self._types, weights=self._weights, k=count)
+
+    def point(self):
+        return self.rng.uniform(*LATITUDE_RANGE), self.rng.uniform(*LONGITUDE_RANGE)
+
+    def near(self, latitude, longitude, spread=0.3):
+        return latitude + self.rng.gauss(0, spread), longitude + self.rng.gauss(0, spread)
+
+    def hospitals(self, count):
+        hospitals = []
+        for number in range(count):
+            latitude, longitude = self.point()
+            hospitals.append(Hospital(
+                email=f"{self.tag}-hospital-{number}@{SEED_DOMAIN}",
+                password=self.password,
+                hospital_name=f"Seed Hospital {number}",
+                staff_name='Seed',
+                staff_id=f"seed-{self.tag}-{number}",
+                contact_info='000',
+                address='Seed',
+                approval_status='approved',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+            ))
+        created = Hospital.objects.bulk_create(hospitals, batch_size=self.batch_size)
+        self.progress(f"{count} hospitals")
+        return [(hospital.pk, hospital.latitude, hospital.longitude) for hospital in created]
+
+    def donors(self, count, hospitals):
+        rng = self.rng
+        done = 0
+        for size in _batches(count, self.batch_size):
+            types = self.blood_types(size)
+            batch = []
+            for offset in range(size):
+                number = done + offset
+                _hospital_id, hospital_latitude, hospital_longitude = rng.choice(hospitals)
+                latitude, longitude = self.near(hospital_latitude, hospital_longitude)
+                batch.append(Donor(
+                    email=f"{self.tag}-donor-{number}@{SEED_DOMAIN}",
+                    password=self.password,
+                    firstname='Seed',
+                    lastname=f"Donor {number}",
+                    dob=self.today - timedelta(days=rng.randint(18 * 365, 66 * 365)),
+                    gender=rng.choice(('Male', 'Female', 'Other')),
+                    blood_type=types[offset],
+                    phone_number=f"s{self.tag}{number}",
+                    device_token=f"seed-{self.tag}-{number}" if rng.random() < 0.6 else None,
+                    # About a fifth donated recently and are deferred
+                    next_eligible_date=(
+                        self.today + timedelta(days=rng.randint(1, 56)) if rng.random() < 0.2 else None
+                    ),
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=encode_geohash(latitude, longitude),
+                ))
+            Donor.objects.bulk_create(batch)
+            done += size
+            self.progress(f"{done}/{count} donors")
+
+    def blood_units(self, count, hospital_ids):
+        rng = self.rng
+        done = 0
+        for size in _batches(count, self.batch_size):
+            types = self.blood_types(size)
+            batch = []
+            for offset in range(size):
+                expiration = self.today + timedelta(days=rng.randint(-5, 42))
+                if expiration < self.today:
+                    unit_status = 'expired'
+                else:
+                    unit_status = 'used' if rng.random() < 0.15 else 'available'
+                batch.append(BloodUnit(
+                    hospital_id=rng.choice(hospital_ids),
+                    blood_type=types[offset],
+                    quantity=rng.randint(1, 4),
+                    expiration_date=expiration,
+                    status=unit_status,
+                ))
+            # bulk_create bypasses save(); the summary is rebuilt once at the end
+            BloodUnit.objects.bulk_create(batch)
+            done += size
+            self.progress(f"{done}/{count} blood units")
+        rebuild_inventory_summary(hospital_ids)
+
+    def blood_requests(self, count, hospital_ids, days=90):
+        """
+        Spread requests evenly over the last ``days`` days. created_at is
+        auto_now_add, so each day's rows are back-dated with one UPDATE.
+        """
+        rng = self.rng
+        now = timezone.now()
+        done = 0
+        for day in range(days):
+            # Spread the remainder over the most recent days
+            for size in _batches(count // days + (day < count % days), self.batch_size):
+                created_at = now - timedelta(days=day)
+                types = self.blood_types(size)
+                batch = []
+                for offset in range(size):
+                    roll = rng.random()
+                    if day == 0 or roll < 0.1:
+                        request_status, fulfilled_at = 'pending', None
+                    elif roll < 0.15:
+                        request_status, fulfilled_at = 'canceled', None
+                    else:
+                        request_status, fulfilled_at = 'fulfilled', created_at + timedelta(hours=rng.randint(1, 12))
+                    batch.append(BloodRequest(
+                        hospital_id=rng.choice(hospital_ids),
+                        blood_type=types[offset],
+                        quantity=rng.randint(1, 3),
+                        priority_level='urgent' if rng.random() < 0.2 else 'normal',
+                        status=request_status,
+                        fulfilled_at=fulfilled_at,
+                    ))
+                created = BloodRequest.objects.bulk_create(batch)
+                BloodRequest.objects.filter(
+                    pk__gte=created[0].pk, pk__lte=created[-1].pk,
+                ).update(created_at=created_at)
+                done += size
+            self.progress(f"{done}/{count} blood requests")
+
+    def run(self, hospitals, donors, units, requests, days=90):
+        locations = self.hospitals(hospitals)
+        hospital_ids = [hospital_id for hospital_id, _latitude, _longitude in locations]
+        self.blood_units(units, hospital_ids)
+        self.blood_requests(requests, hospital_ids, days)
+        self.donors(donors, locations)
+        return hospital_ids
+
+
+def seed_hospitals():
+    return Hospital.objects.filter(email__endswith=f"@{SEED_DOMAIN}")
+
+
+def _delete_in_chunks(queryset, chunk_size):
+    """
+    Delete a large queryset a chunk of primary keys at a time, so the delete
+    collector never loads every row at once.
+    """
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=pks).delete()[0]
+
+
+def clear_seed_data(chunk_size=5000):
+    """
+    Delete everything a Seeder created. Inventory summaries and forecasts go
+    with their hospitals. Returns the number of rows deleted.
+    """
+    hospital_ids = list(seed_hospitals().values_list('pk', flat=True))
+    deleted = _delete_in_chunks(Donor.objects.filter(email__endswith=f"@{SEED_DOMAIN}"), chunk_size)
+    deleted += _delete_in_chunks(BloodUnit.objects.filter(hospital_id__in=hospital_ids), chunk_size)
+    deleted += _delete_in_chunks(BloodRequest.objects.filter(hospital_id__in=hospital_ids), chunk_size)
+    deleted += seed_hospitals().delete()[0]
+    return deleted
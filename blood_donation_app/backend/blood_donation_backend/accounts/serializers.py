@@ -1,8 +1,47 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import Donor, DeliveryStaff, Hospital, BloodRequest, BloodUnit
+from .models import Donor, DeliveryStaff, Hospital, BloodRequest, BloodUnit, Transfer, DeliveryJob, DemandForecast
 from django.utils import timezone
 from datetime import timedelta
+from .ingestion import shelf_life
+
+
+def requested_fields(request):
+    """
+    Field names asked for with ``?fields=a,b`` on a GET request, or None.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+# Lets list endpoints return only the fields the client asks for
+class FieldProjectionMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+def validate_coordinates(data, instance=None):
+    """
+    Check that latitude and longitude come as an in-range pair. Pass the
+    instance on a partial update, so a coordinate left out keeps its saved
+    value and either one can be changed alone.
+    """
+    latitude = data.get('latitude', getattr(instance, 'latitude', None))
+    longitude = data.get('longitude', getattr(instance, 'longitude', None))
+    if (latitude is None) != (longitude is None):
+        raise serializers.ValidationError("Latitude and longitude must be provided together.")
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise serializers.ValidationError("Coordinates are out of range.")
+    return data
+
 
 class DonorSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -10,8 +49,11 @@ class DonorSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Donor
-        fields = ['id', 'firstname', 'lastname', 'dob', 'gender', 'email', 'blood_type', 'phone_number', 'password', 'device_token']
-        read_only_fields = ['id', 'password', 'device_token']
+        fields = ['id', 'firstname', 'lastname', 'dob', 'gender', 'email', 'blood_type', 'phone_number', 'password', 'device_token', 'latitude', 'longitude', 'next_eligible_date']
+        read_only_fields = ['id', 'password', 'device_token', 'next_eligible_date']
+
+    def validate(self, data):
+        return validate_coordinates(data, self.instance if self.partial else None)
 
     def create(self, validated_data):
         donor = Donor.objects.create_user(
@@ -23,7 +65,9 @@ class DonorSerializer(serializers.ModelSerializer):
             gender=validated_data['gender'],
             blood_type=validated_data['blood_type'],
             phone_number=validated_data['phone_number'],
-            device_token=validated_data.get('device_token')
+            device_token=validated_data.get('device_token'),
+            latitude=validated_data.get('latitude'),
+            longitude=validated_data.get('longitude'),
         )
         return donor
 
@@ -35,6 +79,8 @@ class DonorSerializer(serializers.ModelSerializer):
         instance.blood_type = validated_data.get('blood_type', instance.blood_type)
         instance.phone_number = validated_data.get('phone_number', instance.phone_number)
         instance.device_token = validated_data.get('device_token', instance.device_token)
+        instance.latitude = validated_data.get('latitude', instance.latitude)
+        instance.longitude = validated_data.get('longitude', instance.longitude)
         instance.save()
         return instance
 
@@ -45,7 +91,10 @@ class DeliveryStaffSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DeliveryStaff
-        fields = ['id', 'firstname', 'lastname', 'gender', 'email', 'license_number', 'vehicle_type', 'password']
+        fields = ['id', 'firstname', 'lastname', 'gender', 'email', 'license_number', 'vehicle_type', 'latitude', 'longitude', 'password']
+
+    def validate(self, data):
+        return validate_coordinates(data, self.instance if self.partial else None)
 
     def create(self, validated_data):
         # Create delivery staff with hashed password
@@ -56,11 +105,23 @@ class DeliveryStaffSerializer(serializers.ModelSerializer):
             lastname=validated_data['lastname'],
             gender=validated_data['gender'],
             license_number=validated_data['license_number'],
-            vehicle_type=validated_data['vehicle_type']
+            vehicle_type=validated_data['vehicle_type'],
+            latitude=validated_data.get('latitude'),
+            longitude=validated_data.get('longitude'),
         )
         return staff
 
 
+# Serializer for a driver going on/off shift and reporting their position
+class DeliveryStaffStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryStaff
+        fields = ['latitude', 'longitude', 'is_available']
+
+    def validate(self, data):
+        return validate_coordinates(data, self.instance if self.partial else None)
+
+
 # Donor Login Serializer (authentication handled in views)
 class DonorLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -90,7 +151,10 @@ class HospitalSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Hospital
-        fields = ['hospital_name', 'staff_name', 'staff_id', 'email', 'contact_info', 'address', 'documents', 'password']
+        fields = ['hospital_name', 'staff_name', 'staff_id', 'email', 'contact_info', 'address', 'latitude', 'longitude', 'documents', 'password']
+
+    def validate(self, data):
+        return validate_coordinates(data, self.instance if self.partial else None)
 
     def create(self, validated_data):
         # Create hospital with hashed password
@@ -103,6 +167,8 @@ class HospitalSerializer(serializers.ModelSerializer):
             contact_info=validated_data['contact_info'],
             address=validated_data['address'],
             documents=validated_data['documents'],
+            latitude=validated_data.get('latitude'),
+            longitude=validated_data.get('longitude'),
         )
         return hospital
 
@@ -119,7 +185,7 @@ class HospitalLoginSerializer(serializers.Serializer):
 
 
 # Serializer for Hospital to make a blood request
-class BloodRequestSerializer(serializers.ModelSerializer):
+class BloodRequestSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     hospital_name = serializers.ReadOnlyField(source='hospital.hospital_name')
     contact_info = serializers.ReadOnlyField(source='hospital.contact_info')  # for push notifications
 
@@ -154,7 +220,7 @@ class BloodRequestSerializer(serializers.ModelSerializer):
 
 
 # Serializer for blood units at hospitals
-class BloodUnitSerializer(serializers.ModelSerializer):
+class BloodUnitSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = BloodUnit
         fields = ['id', 'blood_type', 'quantity', 'hospital', 'expiration_date', 'status', 'created_at']
@@ -168,11 +234,8 @@ class BloodUnitSerializer(serializers.ModelSerializer):
         """
         Override the create method to automatically assign an expiration date and hospital.
         """
-        # Define the shelf life for blood units (e.g., 42 days)
-        shelf_life = timedelta(days=42)
-
         # Automatically set the expiration date based on the current date and shelf life
-        validated_data['expiration_date'] = timezone.now().date() + shelf_life
+        validated_data['expiration_date'] = timezone.now().date() + shelf_life()
 
         return super().create(validated_data)
 
@@ -186,8 +249,63 @@ class BloodUnitSerializer(serializers.ModelSerializer):
         return data
 
 
+# Serializer for available blood units of one type, with days left before expiry
+class BloodUnitExpirySerializer(FieldProjectionMixin, serializers.ModelSerializer):
+    days_to_expire = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BloodUnit
+        fields = ['id', 'blood_type', 'quantity', 'expiration_date', 'days_to_expire']
+
+    def get_days_to_expire(self, obj):
+        today = self.context.get('today') or timezone.now().date()
+        return (obj.expiration_date - today).days
+
+
+# Serializer for stock transfers between hospitals
+class TransferSerializer(serializers.ModelSerializer):
+    from_hospital_name = serializers.CharField(source='from_hospital.hospital_name', read_only=True)
+    to_hospital_name = serializers.CharField(source='to_hospital.hospital_name', read_only=True)
+
+    class Meta:
+        model = Transfer
+        fields = [
+            'id', 'from_hospital', 'from_hospital_name', 'to_hospital', 'to_hospital_name', 'blood_type',
+            'quantity', 'distance_km', 'status', 'delivery_staff', 'created_at', 'delivered_at',
+        ]
+        read_only_fields = fields
 
 
+# Serializer for a hospital's demand forecast per blood type (see accounts.forecasting)
+class DemandForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DemandForecast
+        fields = [
+            'blood_type', 'daily_demand', 'demand_std', 'reorder_threshold', 'days_of_cover',
+            'backtest_wape', 'history_days', 'computed_at',
+        ]
+        read_only_fields = fields
+
 
+# Serializer for delivery jobs; hospitals create them for a blood request
+class DeliveryJobSerializer(serializers.ModelSerializer):
+    pickup_hospital_name = serializers.CharField(source='pickup_hospital.hospital_name', read_only=True)
+    dropoff_hospital_name = serializers.CharField(source='dropoff_hospital.hospital_name', read_only=True)
 
+    class Meta:
+        model = DeliveryJob
+        fields = [
+            'id', 'pickup_hospital', 'pickup_hospital_name', 'dropoff_hospital', 'dropoff_hospital_name',
+            'transfer', 'blood_request', 'quantity', 'status', 'delivery_staff', 'pickup_sequence',
+            'dropoff_sequence', 'created_at', 'assigned_at', 'completed_at',
+        ]
+        read_only_fields = [
+            'id', 'dropoff_hospital', 'transfer', 'status', 'delivery_staff', 'pickup_sequence',
+            'dropoff_sequence', 'created_at', 'assigned_at', 'completed_at',
+        ]
+        extra_kwargs = {'blood_request': {'required': True, 'allow_null': False}}
 
+    def validate(self, data):
+        if data['quantity'] <= 0:
+            raise serializers.ValidationError("Quantity must be greater than zero.")
+        return data
@@ -1,3 +1,1641 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from blood_donation_backend.routing import websocket_urlpatterns
+
+from . import delivery, forecasting, replicas
+from .allocation import AllocationError, allocate_blood_request
+from .authentication import PrincipalJWTAuthentication, TokenPrincipal
+from .backends import (
+    DeliveryStaffBackend,
+    DonorBackend,
+    HospitalBackend,
+    PrincipalBackend,
+    dummy_password_hash,
+)
+from .consumers import CLOSE_FORBIDDEN, CLOSE_UNAUTHENTICATED
+from .eligibility import eligible_donors_q
+from .expiry import hospital_expiry_report, refresh_expiry_reports, send_expiry_alerts
+from .hashers import verify_password
+from .ingestion import ingest_records
+from .inventory import expire_blood_units, rebuild_inventory_summary
+from .matching import BLOOD_TYPES, compatible_donor_types, compatible_recipient_types, is_compatible
+from .metrics import QueryBudgetExceeded
+from .models import (
+    BloodRequest,
+    BloodUnit,
+    DeliveryJob,
+    DeliveryStaff,
+    DemandForecast,
+    Donation,
+    Donor,
+    Hospital,
+    HospitalInventorySummary,
+    Transfer,
+)
+from .notifications import (
+    MAX_MULTICAST_TOKENS,
+    LocalMessagingBackend,
+    dispatch_donor_notifications,
+    get_messaging_backend,
+    send_donor_notifications,
+)
+from .realtime import blood_type_group, hospital_group
+from .tokens import PRINCIPAL_DONOR, PRINCIPAL_HOSPITAL, PRINCIPAL_STAFF, tokens_for
+from .transfers import complete_transfer, optimize_transfers, plan_transfers
+
+
+def make_hospital(number=0, **fields):
+    defaults = {
+        'email': f"hospital-{number}@example.com",
+        'hospital_name': f"Hospital {number}",
+        'staff_name': 'Staff',
+        'staff_id': f"staff-{number}",
+        'contact_info': '000',
+        'address': 'Address',
+        'approval_status': 'approved',
+    }
+    defaults.update(fields)
+    return Hospital.objects.create(password='!', **defaults)
+
+
+def make_donors(count, blood_type='O-', token_prefix='token'):
+    return Donor.objects.bulk_create(
+        Donor(
+            email=f"donor-{token_prefix}-{number}@example.com",
+            password='!',
+            firstname='Test',
+            lastname=f"Donor {number}",
+            dob=date(1990, 1, 1),
+            gender='Other',
+            blood_type=blood_type,
+            phone_number=f"{token_prefix[:4]}{number}",
+            device_token=f"{token_prefix}-{number}",
+        )
+        for number in range(count)
+    )
+
+
+# The standard red cell chart: each recipient and the donors it can receive from
+RED_CELL_COMPATIBILITY = {
+    'O-': {'O-'},
+    'O+': {'O-', 'O+'},
+    'A-': {'O-', 'A-'},
+    'A+': {'O-', 'O+', 'A-', 'A+'},
+    'B-': {'O-', 'B-'},
+    'B+': {'O-', 'O+', 'B-', 'B+'},
+    'AB-': {'O-', 'A-', 'B-', 'AB-'},
+    'AB+': {'O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'},
+}
+
+
+class BloodTypeMatchingTests(SimpleTestCase):
+    def test_every_donor_recipient_pair(self):
+        self.assertEqual(set(BLOOD_TYPES), set(RED_CELL_COMPATIBILITY))
+        for recipient, donors in RED_CELL_COMPATIBILITY.items():
+            for donor in BLOOD_TYPES:
+                with self.subTest(donor=donor, recipient=recipient):
+                    self.assertEqual(is_compatible(donor, recipient), donor in donors)
+
+    def test_compatible_types_in_both_directions(self):
+        for recipient, donors in RED_CELL_COMPATIBILITY.items():
+            self.assertEqual(set(compatible_donor_types(recipient)), donors)
+        for donor in BLOOD_TYPES:
+            recipients = {recipient for recipient, donors in RED_CELL_COMPATIBILITY.items() if donor in donors}
+            self.assertEqual(set(compatible_recipient_types(donor)), recipients)
+
+    def test_unknown_blood_type(self):
+        with self.assertRaisesMessage(ValueError, "Unknown blood type: C+"):
+            compatible_donor_types('C+')
+        with self.assertRaisesMessage(ValueError, "Unknown blood type: C+"):
+            compatible_recipient_types('C+')
+
+
+@override_settings(
+    PUSH_NOTIFICATION_BACKEND='local',
+    DONOR_NOTIFICATIONS_SYNC=True,
+    DONOR_NOTIFICATION_RADIUS_KM=None,
+)
+class DonorNotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+        cls.blood_request = BloodRequest.objects.create(
+            hospital=cls.hospital, blood_type='AB+', quantity=2, priority_level='urgent',
+        )
+
+    def setUp(self):
+        LocalMessagingBackend.reset()
+        self.addCleanup(LocalMessagingBackend.reset)
+
+    def test_batches_are_split_at_the_multicast_limit(self):
+        make_donors(2 * MAX_MULTICAST_TOKENS + 7)
+
+        # Asking for bigger batches than FCM accepts still caps them
+        with self.settings(DONOR_NOTIFICATION_BATCH_SIZE=MAX_MULTICAST_TOKENS * 2):
+            sent, failed = send_donor_notifications(self.blood_request)
+
+        sizes = sorted((len(batch['tokens']) for batch in LocalMessagingBackend.outbox), reverse=True)
+        self.assertEqual(sizes, [MAX_MULTICAST_TOKENS, MAX_MULTICAST_TOKENS, 7])
+        self.assertEqual((sent, failed), (2 * MAX_MULTICAST_TOKENS + 7, 0))
+        tokens = [token for batch in LocalMessagingBackend.outbox for token in batch['tokens']]
+        self.assertEqual(len(tokens), len(set(tokens)))
+
+    def test_unregistered_tokens_are_pruned(self):
+        donors = make_donors(3)
+        LocalMessagingBackend.invalid_tokens.add(donors[1].device_token)
+
+        sent, failed = send_donor_notifications(self.blood_request)
+
+        self.assertEqual((sent, failed), (2, 1))
+        tokens = dict(Donor.objects.filter(pk__in=[donor.pk for donor in donors]).values_list('pk', 'device_token'))
+        self.assertIsNone(tokens[donors[1].pk])
+        self.assertEqual(tokens[donors[0].pk], donors[0].device_token)
+
+        # The pruned donor isn't sent to again
+        LocalMessagingBackend.reset()
+        send_donor_notifications(self.blood_request)
+        self.assertEqual(len(LocalMessagingBackend.outbox[0]['tokens']), 2)
+
+    def test_nothing_is_sent_before_commit(self):
+        make_donors(3)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            dispatch_donor_notifications(self.blood_request)
+            self.assertEqual(LocalMessagingBackend.outbox, [])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(LocalMessagingBackend.outbox), 1)
+
+    def test_nothing_is_sent_on_rollback(self):
+        make_donors(3)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    dispatch_donor_notifications(self.blood_request)
+                    raise RuntimeError("request failed")
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(LocalMessagingBackend.outbox, [])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "Needs row locks (SELECT ... FOR UPDATE SKIP LOCKED)")
+class ConcurrentAllocationTests(TransactionTestCase):
+    thread_count = 8
+
+    def setUp(self):
+        self.hospital = make_hospital()
+        today = timezone.localdate()
+        for number in range(30):
+            # save() keeps the inventory summary in step
+            BloodUnit.objects.create(
+                hospital=self.hospital,
+                blood_type='O-',
+                quantity=number % 3 + 1,
+                expiration_date=today + timedelta(days=number % 7 + 1),
+            )
+        self.requests = BloodRequest.objects.bulk_create(
+            BloodRequest(hospital=self.hospital, blood_type='O-', quantity=5, priority_level='urgent')
+            for _ in range(3 * self.thread_count)
+        )
+
+    def summary(self):
+        return set(
+            HospitalInventorySummary.objects.filter(hospital=self.hospital)
+            .values_list('blood_type', 'available_quantity', 'available_units')
+        )
+
+    def test_concurrent_allocations_never_share_a_unit(self):
+        initial_quantity = BloodUnit.objects.aggregate(total=Sum('quantity'))['total']
+        pending = [blood_request.pk for blood_request in self.requests]
+        allocated = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.thread_count)
+
+        def worker():
+            try:
+                start.wait()
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        request_id = pending.pop()
+                    try:
+                        units = allocate_blood_request(request_id)
+                    except AllocationError:
+                        continue
+                    with lock:
+                        allocated.extend(unit.pk for unit in units)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(allocated), len(set(allocated)))
+        fulfilled = BloodRequest.objects.filter(status='fulfilled')
+        self.assertTrue(fulfilled.exists())
+        for blood_request in fulfilled:
+            total = blood_request.allocated_units.aggregate(total=Sum('quantity'))['total']
+            self.assertEqual(total, blood_request.quantity)
+        self.assertFalse(BloodUnit.objects.filter(status='used', allocated_to__isnull=True).exists())
+        self.assertEqual(BloodUnit.objects.aggregate(total=Sum('quantity'))['total'], initial_quantity)
+
+        # The summary kept up incrementally matches one rebuilt from the units
+        summary = self.summary()
+        rebuild_inventory_summary([self.hospital.pk])
+        self.assertEqual(summary, self.summary())
+
+
+def make_driver(number, latitude, longitude, vehicle_type='car'):
+    return DeliveryStaff.objects.create(
+        email=f"driver-{number}@example.com",
+        password='!',
+        firstname='Test',
+        lastname=f"Driver {number}",
+        gender='Other',
+        license_number=f"license-{number}",
+        vehicle_type=vehicle_type,
+        is_available=True,
+        latitude=latitude,
+        longitude=longitude,
+    )
+
+
+class DeliveryDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.north = make_hospital(1, latitude=13.0, longitude=80.2)
+        cls.south = make_hospital(2, latitude=12.9, longitude=80.1)
+        cls.unlocated = make_hospital(3)
+
+    def test_stops_without_coordinates_are_skipped(self):
+        stuck = make_driver(1, 13.0, 80.2)
+        free = make_driver(2, 12.9, 80.1)
+        # Assigned before the hospital lost its coordinates
+        DeliveryJob.objects.create(
+            pickup_hospital=self.north, dropoff_hospital=self.unlocated, quantity=1,
+            status='assigned', delivery_staff=stuck, pickup_sequence=0, dropoff_sequence=1,
+        )
+        routable = DeliveryJob.objects.create(pickup_hospital=self.north, dropoff_hospital=self.south, quantity=2)
+        unroutable = DeliveryJob.objects.create(pickup_hospital=self.unlocated, dropoff_hospital=self.south, quantity=2)
+
+        with self.assertLogs('accounts.delivery', 'WARNING'):
+            self.assertEqual([route.staff_id for route in delivery.load_routes()], [free.pk])
+            assigned = delivery.dispatch_pending_jobs()
+
+        self.assertEqual([job.pk for job in assigned], [routable.pk])
+        routable.refresh_from_db()
+        unroutable.refresh_from_db()
+        self.assertEqual(routable.delivery_staff_id, free.pk)
+        self.assertEqual(unroutable.status, 'pending')
+
+    @override_settings(DELIVERY_DISPATCH_DELAY=0.2)
+    def test_scheduled_dispatches_share_one_run(self):
+        with mock.patch.object(delivery, 'dispatch_pending_jobs') as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(3):
+                    delivery.schedule_dispatch()
+                # Nothing runs before commit
+                dispatch.assert_not_called()
+            # The dispatch thread runs one job at a time; wait for the run to finish
+            delivery._get_executor().submit(lambda: None).result()
+
+        dispatch.assert_called_once_with()
+
+
+class ExpiryReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+
+    def setUp(self):
+        # Reports and versions left by other tests may share this hospital's pk
+        for cache in caches.all():
+            cache.clear()
+
+    def add_unit(self, quantity, days):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BloodUnit.objects.create(
+                hospital=self.hospital, blood_type='A+', quantity=quantity,
+                expiration_date=timezone.localdate() + timedelta(days=days),
+            )
+
+    def quantities(self, report):
+        return {entry['bucket']: entry['quantity'] for entry in report['buckets']}
+
+    def test_stock_writes_drop_the_cached_report(self):
+        self.add_unit(2, 1)
+        self.assertEqual(self.quantities(hospital_expiry_report(self.hospital.pk)), {'critical': 2})
+
+        unit = self.add_unit(3, 5)
+        self.assertEqual(self.quantities(hospital_expiry_report(self.hospital.pk)), {'critical': 2, 'medium': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.delete()
+        self.assertEqual(self.quantities(hospital_expiry_report(self.hospital.pk)), {'critical': 2})
+
+    def test_periodic_refresh_is_dropped_by_writes(self):
+        self.add_unit(2, 1)
+        refresh_expiry_reports([self.hospital.pk])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.quantities(hospital_expiry_report(self.hospital.pk)), {'critical': 2})
+        self.add_unit(1, 0)
+        self.assertEqual(self.quantities(hospital_expiry_report(self.hospital.pk)), {'critical': 3})
+
+    def test_command_refuses_process_local_backends(self):
+        # skip_checks=False runs the command the way manage.py does, system checks included
+        with mock.patch('accounts.management.commands.check_expiry_risk.refresh_expiry_reports') as refresh:
+            with self.assertRaisesMessage(CommandError, "REDIS_URL"):
+                call_command('check_expiry_risk', skip_checks=False)
+        refresh.assert_not_called()
+
+    def test_command_sweeps_once(self):
+        command = 'accounts.management.commands.check_expiry_risk'
+        with mock.patch(f'{command}.Command.require_shared_backends'), \
+                mock.patch(f'{command}.refresh_expiry_reports', return_value={}) as refresh:
+            call_command('check_expiry_risk', skip_checks=False, stdout=StringIO())
+        refresh.assert_called_once_with([self.hospital.pk])
+
+
+class BloodUnitImportTests(TestCase):
+    # Rows in file order; every chunk of three holds one valid unit
+    ROWS = [
+        {'blood_type': 'A+', 'quantity': '2'},
+        {'blood_type': 'Z+', 'quantity': '1'},
+        {'blood_type': 'B-', 'quantity': 'lots'},
+        {'blood_type': 'b-', 'quantity': '3', 'expiration_date': '2099-01-01'},
+        {'blood_type': 'O+', 'quantity': '1', 'expiration_date': '2000-01-01'},
+        {'blood_type': 'O+', 'quantity': '0'},
+        {'blood_type': 'A+', 'quantity': '4', 'collection_date': '2099-01-01'},
+        {'blood_type': 'AB-', 'quantity': '1', 'expiration_date': '01/02/2099'},
+    ]
+    ROW_ERRORS = {
+        2: {'blood_type': ["Not a valid blood type."]},
+        3: {'quantity': ["A valid integer is required."]},
+        5: {'expiration_date': ["Unit has already expired."]},
+        6: {'quantity': ["Quantity must be greater than zero."]},
+        8: {'expiration_date': ["Use the YYYY-MM-DD format."]},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def write_csv(self):
+        columns = ['blood_type', 'quantity', 'expiration_date', 'collection_date']
+        return self.write('units.csv', [','.join(columns)] + [
+            ','.join(row.get(column, '') for column in columns) for row in self.ROWS
+        ])
+
+    def import_units(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch.object(BloodUnit.objects, 'bulk_create', wraps=BloodUnit.objects.bulk_create) as bulk_create:
+            call_command(
+                'import_blood_units', path, hospital=self.hospital.pk, chunk_size=3,
+                stdout=stdout, stderr=stderr, **options,
+            )
+        return bulk_create, stdout.getvalue(), stderr.getvalue()
+
+    def assertImported(self, bulk_create):
+        # One insert per chunk, each holding only that chunk's valid rows
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [1, 1, 1])
+        units = BloodUnit.objects.filter(hospital=self.hospital)
+        self.assertEqual(
+            sorted(units.values_list('blood_type', 'quantity', 'expiration_date')),
+            [
+                ('A+', 2, timezone.localdate() + timedelta(days=42)),
+                ('A+', 4, date(2099, 2, 12)),
+                ('B-', 3, date(2099, 1, 1)),
+            ],
+        )
+        summary = HospitalInventorySummary.objects.filter(hospital=self.hospital)
+        self.assertEqual(
+            sorted(summary.values_list('blood_type', 'available_quantity', 'available_units')),
+            [('A+', 6, 2), ('B-', 3, 1)],
+        )
+        # And it agrees with a fresh aggregate of the imported rows
+        rebuild_inventory_summary([self.hospital.pk])
+        self.assertEqual(
+            sorted(summary.values_list('blood_type', 'available_quantity', 'available_units')),
+            [('A+', 6, 2), ('B-', 3, 1)],
+        )
+
+    def test_csv_import_reports_row_errors(self):
+        bulk_create, stdout, stderr = self.import_units(self.write_csv())
+
+        self.assertImported(bulk_create)
+        self.assertIn("Imported 3 units, rejected 5 rows", stdout)
+        self.assertEqual(
+            stderr.splitlines(), [f"row {row}: {errors}" for row, errors in self.ROW_ERRORS.items()],
+        )
+
+    def test_ndjson_import_streams_errors_to_a_file(self):
+        lines = [json.dumps(row) for row in self.ROWS]
+        # Bad lines are reported in place, without shifting the row numbers after them
+        lines[1] = '{"blood_type": '
+        lines[5] = '["O+", 0]'
+        path = self.write('units.ndjson', lines)
+        errors_path = os.path.join(self.directory, 'errors.ndjson')
+
+        bulk_create, stdout, stderr = self.import_units(path, errors=errors_path)
+
+        self.assertImported(bulk_create)
+        self.assertIn("Imported 3 units, rejected 5 rows", stdout)
+        self.assertEqual(stderr, "")
+        with open(errors_path) as errors_file:
+            errors = [json.loads(line) for line in errors_file]
+        self.assertEqual([error['row'] for error in errors], list(self.ROW_ERRORS))
+        self.assertTrue(errors[0]['errors']['non_field_errors'][0].startswith("Invalid JSON"))
+        self.assertEqual(errors[3]['errors'], {'non_field_errors': ["Expected an object."]})
+        self.assertEqual(errors[1]['errors'], self.ROW_ERRORS[3])
+
+    def test_kept_errors_are_capped(self):
+        seen = []
+        result = ingest_records(
+            [{'blood_type': 'A+', 'quantity': '0'}] * 5, hospital_id=self.hospital.pk,
+            chunk_size=2, max_errors=2, on_errors=seen.extend,
+        )
+
+        self.assertEqual(result.as_dict()['failed'], 5)
+        self.assertEqual([error['row'] for error in result.errors], [1, 2])
+        self.assertTrue(result.as_dict()['errors_truncated'])
+        self.assertEqual([error['row'] for error in seen], [1, 2, 3, 4, 5])
+
+    def test_command_mentions_errors_left_out(self):
+        path = self.write('units.csv', ['blood_type,quantity'] + ['A+,0'] * 25)
+        _, _, stderr = self.import_units(path)
+
+        lines = stderr.splitlines()
+        self.assertEqual(len(lines), 21)
+        self.assertEqual(lines[-1], "... 5 more; pass --errors to list them all.")
+
+
+class TransferTests(TestCase):
+    # About 5 km, 65 km and 790 km north of the first hospital
+    LOCATIONS = {1: (12.90, 77.60), 2: (12.95, 77.60), 3: (13.50, 77.60), 4: (20.00, 77.60)}
+
+    def optimize(self, surplus, deficit, **kwargs):
+        plans = {}
+        # The pure-Python fallback must plan exactly what NumPy does
+        for use_numpy in (True, False):
+            patches = [] if use_numpy else [
+                mock.patch('accounts.transfers.np', None), mock.patch('accounts.geo._numpy', return_value=None),
+            ]
+            for patch in patches:
+                patch.start()
+            try:
+                plan = optimize_transfers(self.LOCATIONS, surplus, deficit, **kwargs)
+            finally:
+                for patch in patches:
+                    patch.stop()
+            plans[use_numpy] = sorted((source, sink, blood_type, quantity) for source, sink, blood_type, quantity, _ in plan)
+        self.assertEqual(plans[True], plans[False])
+        return plans[True]
+
+    def test_surplus_goes_to_the_nearest_shortages(self):
+        plan = self.optimize({(1, 'A+'): 6}, {(2, 'A+'): 2, (3, 'A+'): 10, (4, 'A+'): 10})
+        # Hospital 4 is beyond TRANSFER_MAX_DISTANCE_KM
+        self.assertEqual(plan, [(1, 2, 'A+', 2), (1, 3, 'A+', 4)])
+
+    def test_surplus_never_exceeds_what_is_spare(self):
+        plan = self.optimize({(1, 'O+'): 3, (2, 'O+'): 1}, {(3, 'O+'): 10})
+        self.assertEqual(plan, [(1, 3, 'O+', 3), (2, 3, 'O+', 1)])
+
+    def test_only_compatible_types_are_sent(self):
+        plan = self.optimize({(1, 'A+'): 5, (1, 'AB+'): 5}, {(2, 'O+'): 3, (2, 'B+'): 3})
+        self.assertEqual(plan, [])
+
+        # O- gives to anyone, but an exact match of the same cost is used first
+        plan = self.optimize({(1, 'O-'): 5, (1, 'B+'): 5}, {(2, 'B+'): 3, (2, 'O-'): 1})
+        self.assertEqual(plan, [(1, 2, 'B+', 3), (1, 2, 'O-', 1)])
+
+        # A substitute is sent from nearby only when the exact match is more
+        # than the substitution penalty further away
+        surplus, deficit = {(1, 'O-'): 5, (3, 'B+'): 5}, {(2, 'B+'): 3}
+        self.assertEqual(self.optimize(surplus, deficit, substitution_penalty_km=50), [(1, 2, 'O-', 3)])
+        self.assertEqual(self.optimize(surplus, deficit, substitution_penalty_km=100), [(3, 2, 'B+', 3)])
+
+    def add_units(self, hospital, quantity, blood_type='A+', days=3):
+        BloodUnit.objects.bulk_create(
+            BloodUnit(
+                hospital=hospital, blood_type=blood_type, quantity=1,
+                expiration_date=timezone.localdate() + timedelta(days=days),
+            )
+            for _ in range(quantity)
+        )
+
+    def available(self, hospital, blood_type='A+'):
+        return HospitalInventorySummary.objects.filter(hospital=hospital, blood_type=blood_type)\
+            .values_list('available_quantity', flat=True).first() or 0
+
+    @override_settings(TRANSFER_MIN_STOCK=5, TRANSFER_NEAR_EXPIRY_DAYS=7)
+    def test_planned_transfers_keep_donors_at_their_threshold(self):
+        donor = make_hospital(1, latitude=12.90, longitude=77.60)
+        busy = make_hospital(2, latitude=12.95, longitude=77.60)
+        needy = make_hospital(3, latitude=13.50, longitude=77.60)
+        self.add_units(donor, 7)
+        # Plenty of near-expiry stock, but a pending request of its own uses it up
+        self.add_units(busy, 8)
+        BloodRequest.objects.create(hospital=busy, blood_type='A+', quantity=3, priority_level='normal')
+        # Stock that isn't near expiry is kept where it is
+        self.add_units(donor, 3, days=30)
+        # A+ could also cover the busy hospital's AB+ shortage, were it short
+        self.add_units(busy, 5, blood_type='AB+', days=30)
+        rebuild_inventory_summary()
+
+        transfers = plan_transfers()
+
+        self.assertEqual(
+            [(t.from_hospital_id, t.to_hospital_id, t.blood_type, t.quantity) for t in transfers],
+            [(donor.pk, needy.pk, 'A+', 5)],
+        )
+        # Open transfers count as moved, so planning again proposes nothing new
+        self.assertEqual(plan_transfers(), [])
+
+        complete_transfer(transfers[0].pk)
+        self.assertEqual(self.available(donor), 5)
+        self.assertEqual(self.available(busy), 8)
+        self.assertEqual(self.available(needy), 5)
+
+    def test_completing_moves_the_units(self):
+        source = make_hospital(1)
+        destination = make_hospital(2)
+        soon, later = timezone.localdate() + timedelta(days=2), timezone.localdate() + timedelta(days=9)
+        for quantity, expiration_date in ((2, later), (3, soon), (4, later)):
+            with self.captureOnCommitCallbacks(execute=True):
+                BloodUnit.objects.create(
+                    hospital=source, blood_type='B-', quantity=quantity, expiration_date=expiration_date,
+                )
+        transfer = Transfer.objects.create(from_hospital=source, to_hospital=destination, blood_type='B-', quantity=4)
+
+        transfer, consumed, received = complete_transfer(transfer.pk)
+
+        self.assertEqual(transfer.status, 'delivered')
+        self.assertIsNotNone(transfer.delivered_at)
+        # First expiry first: the whole unit expiring soon, then part of one expiring later
+        self.assertEqual(sorted((unit.quantity, unit.expiration_date) for unit in consumed), [(1, later), (3, soon)])
+        self.assertEqual(
+            sorted(BloodUnit.objects.filter(hospital=destination).values_list('quantity', 'expiration_date', 'status')),
+            [(1, later, 'available'), (3, soon, 'available')],
+        )
+        self.assertEqual(len(received), 2)
+        self.assertEqual(self.available(source, 'B-'), 5)
+        self.assertEqual(self.available(destination, 'B-'), 4)
+        self.assertEqual(
+            BloodUnit.objects.filter(hospital=source, status='transferred').aggregate(total=Sum('quantity'))['total'], 4,
+        )
+
+        with self.assertRaisesMessage(AllocationError, "is delivered"):
+            complete_transfer(transfer.pk)
+
+
+@unittest.skipIf(forecasting.np is None, "Forecasting needs numpy")
+@override_settings(FORECAST_HISTORY_DAYS=30, FORECAST_BACKTEST_DAYS=7, FORECAST_COVER_DAYS=3, LOW_STOCK_THRESHOLD=5)
+class ForecastingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_constant_demand_is_forecast_as_is(self):
+        demand = forecasting.np.array([[4.0] * 30, [0.0] * 30])
+        level, alpha, std = forecasting.fit_smoothing(demand)
+
+        self.assertEqual(level.tolist(), [4.0, 0.0])
+        self.assertEqual(std.tolist(), [0.0, 0.0])
+        self.assertTrue(set(alpha.tolist()) <= set(settings.FORECAST_SMOOTHING_GRID))
+
+    def test_thresholds_rise_with_variance(self):
+        # The same mean demand of 5 a day, swinging further each row
+        demand = forecasting.np.array([[5 - swing, 5 + swing] * 15 for swing in (0, 1, 2, 4)], dtype=float)
+        level, _alpha, std = forecasting.fit_smoothing(demand)
+        thresholds = forecasting.reorder_thresholds(level, std).tolist()
+
+        self.assertEqual(std[0], 0.0)
+        self.assertTrue(all(low < high for low, high in zip(std, std[1:])), std)
+        self.assertEqual(thresholds[0], 15)
+        self.assertTrue(all(low < high for low, high in zip(thresholds, thresholds[1:])), thresholds)
+
+    def add_daily_requests(self, blood_type, quantity, days):
+        requests = BloodRequest.objects.bulk_create(
+            BloodRequest(hospital=self.hospital, blood_type=blood_type, quantity=quantity, priority_level='normal')
+            for _ in range(days)
+        )
+        for days_ago, blood_request in enumerate(requests, start=1):
+            BloodRequest.objects.filter(pk=blood_request.pk).update(
+                created_at=timezone.now() - timedelta(days=days_ago),
+            )
+
+    def summary(self):
+        access = tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token
+        response = self.client.get(reverse('blood_unit_summary'), headers={'Authorization': f"Bearer {access}"})
+        self.assertEqual(response.status_code, 200)
+        return {entry['blood_type']: entry for entry in response.json()}
+
+    def test_refresh_stores_forecasts_used_by_the_summary(self):
+        self.add_daily_requests('A+', 2, 30)
+        BloodUnit.objects.bulk_create([
+            BloodUnit(hospital=self.hospital, blood_type=blood_type, quantity=quantity,
+                      expiration_date=timezone.localdate() + timedelta(days=10))
+            for blood_type, quantity in (('A+', 4), ('B+', 3))
+        ])
+        rebuild_inventory_summary()
+        other = make_hospital(1)
+        DemandForecast.objects.create(
+            hospital=other, blood_type='O-', daily_demand=1, demand_std=0, smoothing=0.1,
+            reorder_threshold=3, history_days=30, computed_at=timezone.now() - timedelta(days=1),
+        )
+
+        # Without forecasts both types are held to LOW_STOCK_THRESHOLD
+        before = self.summary()
+        self.assertTrue(before['A+']['low_stock_alert'])
+        self.assertTrue(before['B+']['low_stock_alert'])
+        self.assertIsNone(before['A+']['daily_demand'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run = forecasting.refresh_forecasts()
+
+        self.assertEqual(run['series'], 2)
+        self.assertEqual(run['below_threshold'], 1)
+        self.assertEqual(run['backtest']['wape'], 0.0)
+        forecasts = {forecast.blood_type: forecast for forecast in DemandForecast.objects.all()}
+        # The other hospital's forecast was from an earlier run and is gone
+        self.assertEqual(set(forecasts), {'A+', 'B+'})
+        self.assertEqual(forecasts['A+'].daily_demand, 2.0)
+        self.assertEqual(forecasts['A+'].reorder_threshold, 6)
+        self.assertEqual(forecasts['A+'].days_of_cover, 2.0)
+        self.assertEqual(forecasts['B+'].daily_demand, 0.0)
+        self.assertEqual(forecasts['B+'].reorder_threshold, 1)
+        self.assertIsNone(forecasts['B+'].days_of_cover)
+
+        # The cached summary was dropped and now uses the stored thresholds
+        after = self.summary()
+        self.assertEqual(after['A+']['reorder_threshold'], 6)
+        self.assertEqual(after['A+']['daily_demand'], 2.0)
+        self.assertEqual(after['A+']['days_of_cover'], 2.0)
+        self.assertTrue(after['A+']['low_stock_alert'])
+        self.assertEqual(after['B+']['reorder_threshold'], 1)
+        self.assertFalse(after['B+']['low_stock_alert'])
+
+
+@override_settings(DONOR_MIN_AGE=18, DONOR_MAX_AGE=65, DONATION_DEFERRAL_DAYS=56)
+class DonorEligibilityTests(TestCase):
+    TODAY = date(2025, 6, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donors = make_donors(4)
+
+    def donor_with(self, **fields):
+        donor = self.donors[0]
+        Donor.objects.filter(pk=donor.pk).update(**fields)
+        return donor
+
+    def is_eligible(self, today=TODAY, **fields):
+        donor = self.donor_with(**fields)
+        return Donor.objects.filter(eligible_donors_q(today), pk=donor.pk).exists()
+
+    def test_age_limits(self):
+        cases = [
+            (date(2007, 6, 15), True),  # 18 today
+            (date(2007, 6, 16), False),  # 18 tomorrow
+            (date(1959, 6, 16), True),  # 66 tomorrow
+            (date(1959, 6, 15), False),  # 66 today
+        ]
+        for dob, eligible in cases:
+            with self.subTest(dob=dob):
+                self.assertEqual(self.is_eligible(dob=dob), eligible)
+
+    def test_leap_day(self):
+        # Turning 18 on a leap day is counted from 28 February in other years
+        self.assertTrue(self.is_eligible(date(2024, 2, 29), dob=date(2006, 2, 28)))
+        self.assertFalse(self.is_eligible(date(2024, 2, 29), dob=date(2006, 3, 1)))
+        self.assertTrue(self.is_eligible(date(2025, 2, 28), dob=date(2007, 2, 28)))
+
+    def test_deferral_and_active_flag(self):
+        cases = [
+            ({'next_eligible_date': None, 'is_active': True}, True),
+            ({'next_eligible_date': self.TODAY, 'is_active': True}, True),  # eligible again from this day
+            ({'next_eligible_date': self.TODAY + timedelta(days=1), 'is_active': True}, False),
+            ({'next_eligible_date': None, 'is_active': False}, False),
+        ]
+        for fields, eligible in cases:
+            with self.subTest(**fields):
+                self.assertEqual(self.is_eligible(dob=date(1990, 1, 1), **fields), eligible)
+
+    def next_eligible(self, donor):
+        return Donor.objects.values_list('next_eligible_date', flat=True).get(pk=donor.pk)
+
+    def test_donations_refresh_the_donor(self):
+        donor, other = self.donors[:2]
+
+        latest = Donation.objects.create(donor=donor, donation_date=date(2025, 5, 1))
+        self.assertEqual(self.next_eligible(donor), date(2025, 6, 26))
+        # An older donation recorded late doesn't move the date back
+        earlier = Donation.objects.create(donor=donor, donation_date=date(2025, 3, 1))
+        self.assertEqual(self.next_eligible(donor), date(2025, 6, 26))
+
+        latest.delete()
+        self.assertEqual(self.next_eligible(donor), date(2025, 4, 26))
+
+        earlier.donor = other
+        earlier.save()
+        self.assertIsNone(self.next_eligible(donor))
+        self.assertEqual(self.next_eligible(other), date(2025, 4, 26))
+
+    def test_backfill_command(self):
+        # Rows written without save() leave the donors stale
+        Donation.objects.bulk_create([
+            Donation(donor=self.donors[0], donation_date=date(2025, 5, 1)),
+            Donation(donor=self.donors[0], donation_date=date(2025, 1, 1)),
+            Donation(donor=self.donors[2], donation_date=date(2025, 6, 1)),
+        ])
+        Donor.objects.filter(pk=self.donors[3].pk).update(next_eligible_date=date(2025, 1, 1))
+
+        out = StringIO()
+        call_command('backfill_donor_eligibility', chunk_size=2, stdout=out)
+
+        self.assertIn("Updated next_eligible_date for 3 donors.", out.getvalue())
+        self.assertEqual(
+            [self.next_eligible(donor) for donor in self.donors],
+            [date(2025, 6, 26), None, date(2025, 7, 27), None],
+        )
+        out = StringIO()
+        call_command('backfill_donor_eligibility', stdout=out)
+        self.assertIn("for 0 donors", out.getvalue())
+
+
+class PrincipalAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital(approval_status='pending')
+        cls.donor = make_donors(1, blood_type='B-')[0]
+        cls.driver = make_driver(1, None, None)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', headers={'Authorization': f"Bearer {token}"})
+        return PrincipalJWTAuthentication().authenticate(request)
+
+    def test_claims_authenticate_without_a_query(self):
+        cases = [
+            (tokens_for(self.hospital, PRINCIPAL_HOSPITAL), self.hospital, 'is_hospital'),
+            (tokens_for(self.donor, PRINCIPAL_DONOR), self.donor, 'is_donor'),
+            (tokens_for(self.driver, PRINCIPAL_STAFF), self.driver, 'is_delivery_staff'),
+        ]
+        for refresh, user, kind in cases:
+            with self.subTest(kind=kind), self.assertNumQueries(0):
+                principal, _token = self.authenticate(refresh.access_token)
+                self.assertIsInstance(principal, TokenPrincipal)
+                self.assertTrue(getattr(principal, kind))
+                # The real pk type, so comparisons with model ids work
+                self.assertEqual(principal.pk, user.pk)
+                self.assertEqual(principal.email, user.email)
+
+        principal, _token = self.authenticate(tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token)
+        self.assertEqual(principal.approval_status, 'pending')
+        self.assertFalse(principal.is_approved_hospital)
+        principal, _token = self.authenticate(tokens_for(self.donor, PRINCIPAL_DONOR).access_token)
+        self.assertEqual(principal.blood_type, 'B-')
+
+    def test_legacy_token_loads_the_hospital(self):
+        with self.assertNumQueries(1):
+            principal, _token = self.authenticate(AccessToken.for_user(self.hospital))
+
+        self.assertTrue(principal.is_hospital)
+        self.assertEqual(principal.pk, self.hospital.pk)
+        self.assertEqual(principal.approval_status, 'pending')
+
+    def test_legacy_token_for_a_missing_or_inactive_hospital(self):
+        token = AccessToken.for_user(self.hospital)
+        Hospital.objects.filter(pk=self.hospital.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.hospital.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_malformed_user_id_is_rejected(self):
+        token = tokens_for(self.donor, PRINCIPAL_DONOR).access_token
+        token['user_id'] = 'not-a-number'
+        with self.assertRaises(InvalidToken):
+            self.authenticate(token)
+
+    def test_full_row_is_cached_briefly(self):
+        principal, _token = self.authenticate(tokens_for(self.donor, PRINCIPAL_DONOR).access_token)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(principal.get_object(), self.donor)
+        with self.assertNumQueries(0):
+            self.assertEqual(principal.get_object(), self.donor)
+        with self.assertNumQueries(1):
+            principal.get_object(use_cache=False)
+        principal.invalidate()
+        with self.assertNumQueries(1):
+            principal.get_object()
+
+    def test_queries_per_request(self):
+        BloodRequest.objects.create(hospital=self.hospital, blood_type='A+', quantity=1, priority_level='normal')
+        url = reverse('blood_request_list_create')
+
+        # Only the page itself
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={
+                'Authorization': f"Bearer {tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token}",
+            })
+        self.assertEqual(len(response.json()['results']), 1)
+
+        # A token without claims adds the hospital lookup
+        with self.assertNumQueries(2):
+            response = self.client.get(url, headers={
+                'Authorization': f"Bearer {AccessToken.for_user(self.hospital)}",
+            })
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+@override_settings(PASSWORD_BCRYPT_ROUNDS=4)
+class PrincipalBackendTests(TestCase):
+    EMAIL = 'shared@example.com'
+
+    @classmethod
+    def setUpTestData(cls):
+        # The same email in every table, each with its own password
+        cls.hospital = make_hospital(email=cls.EMAIL)
+        cls.donor = make_donors(1)[0]
+        cls.driver = make_driver(1, None, None)
+        for user, password in ((cls.hospital, 'hospital-pass'), (cls.donor, 'donor-pass'), (cls.driver, 'driver-pass')):
+            user.email = cls.EMAIL
+            user.password = make_password(password)
+            user.save(update_fields=['email', 'password'])
+
+    def authenticate(self, password, principal_type, email=EMAIL):
+        return PrincipalBackend().authenticate(None, email=email, password=password, principal_type=principal_type)
+
+    def test_each_login_checks_its_own_table(self):
+        cases = [
+            (PRINCIPAL_HOSPITAL, 'hospital-pass', self.hospital),
+            (PRINCIPAL_DONOR, 'donor-pass', self.donor),
+            (PRINCIPAL_STAFF, 'driver-pass', self.driver),
+        ]
+        for principal_type, password, user in cases:
+            with self.subTest(principal_type=principal_type), self.assertNumQueries(1):
+                self.assertEqual(self.authenticate(password, principal_type), user)
+
+    def test_failed_logins_are_denied(self):
+        Donor.objects.create_user(
+            email='inactive@example.com', password='donor-pass', firstname='Test', lastname='Donor',
+            dob=date(1990, 1, 1), gender='Other', blood_type='A+', phone_number='inactive', is_active=False,
+        )
+        cases = {
+            'wrong password': ('hospital-pass', PRINCIPAL_DONOR, self.EMAIL),
+            'wrong principal type': ('driver-pass', PRINCIPAL_DONOR, self.EMAIL),
+            'unknown email': ('donor-pass', PRINCIPAL_DONOR, 'nobody@example.com'),
+            'inactive': ('donor-pass', PRINCIPAL_DONOR, 'inactive@example.com'),
+        }
+        for case, (password, principal_type, email) in cases.items():
+            with self.subTest(case), self.assertNumQueries(1), self.assertRaises(PermissionDenied):
+                self.authenticate(password, principal_type, email)
+
+    def test_unknown_email_costs_a_hash_check(self):
+        with mock.patch('accounts.backends.verify_password', wraps=verify_password) as verify:
+            with self.assertRaises(PermissionDenied):
+                self.authenticate('donor-pass', PRINCIPAL_DONOR, 'nobody@example.com')
+        verify.assert_called_once_with('donor-pass', dummy_password_hash())
+
+    def test_denial_stops_the_backend_chain(self):
+        later_backends = [
+            mock.patch.object(backend, 'authenticate', return_value=None)
+            for backend in (HospitalBackend, DonorBackend, DeliveryStaffBackend, ModelBackend)
+        ]
+        mocks = [patch.start() for patch in later_backends]
+        for patch in later_backends:
+            self.addCleanup(patch.stop)
+
+        self.assertIsNone(authenticate(None, email=self.EMAIL, password='driver-pass', principal_type=PRINCIPAL_DONOR))
+        for backend in mocks:
+            backend.assert_not_called()
+
+        # Logins that aren't for the API (the admin site) go on to the other backends
+        self.assertIsNone(authenticate(None, email=self.EMAIL, password='hospital-pass'))
+        mocks[0].assert_called_once()
+
+    def login(self, url_name, password):
+        return self.client.post(
+            reverse(url_name), {'email': self.EMAIL, 'password': password}, content_type='application/json',
+        )
+
+    def test_login_endpoints(self):
+        with self.assertNumQueries(1):
+            response = self.login('login_hospital', 'hospital-pass')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['status'])
+        principal, _token = PrincipalJWTAuthentication().authenticate(
+            RequestFactory().get('/', headers={'Authorization': f"Bearer {response.json()['access']}"}),
+        )
+        self.assertTrue(principal.is_hospital)
+        self.assertEqual(principal.pk, self.hospital.pk)
+
+        with self.assertNumQueries(1):
+            response = self.login('login_donor', 'hospital-pass')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid login credentials."})
+
+    def test_login_upgrades_an_old_hash(self):
+        with self.settings(PASSWORD_BCRYPT_ROUNDS=5):
+            Donor.objects.filter(pk=self.donor.pk).update(password=make_password('donor-pass'))
+
+        # The lookup, then saving the re-hashed password
+        with self.assertNumQueries(2):
+            response = self.login('login_donor', 'donor-pass')
+        self.assertEqual(response.status_code, 200)
+        self.donor.refresh_from_db()
+        self.assertFalse(get_hasher('default').must_update(self.donor.password))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.login('login_donor', 'donor-pass').status_code, 200)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+        BloodRequest.objects.bulk_create(
+            BloodRequest(hospital=cls.hospital, blood_type='A+', quantity=1, priority_level='normal')
+            for _ in range(5)
+        )
+
+    def setUp(self):
+        access = tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {access}"
+
+    def test_budgets_are_enforced_under_the_test_runner(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    def test_request_list_stays_within_its_budget(self):
+        response = self.client.get(reverse('blood_request_list_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    @override_settings(QUERY_BUDGETS={'blood_request_list_create': 0})
+    def test_exceeding_the_budget_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "its budget is 0"):
+            self.client.get(reverse('blood_request_list_create'))
+
+
+class InventoryCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital(1)
+        cls.other = make_hospital(2)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def add_unit(self, hospital, quantity, blood_type='A+', days=10):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BloodUnit.objects.create(
+                hospital=hospital, blood_type=blood_type, quantity=quantity,
+                expiration_date=timezone.localdate() + timedelta(days=days),
+            )
+
+    def get(self, hospital, url=None, etag=None):
+        headers = {'Authorization': f"Bearer {tokens_for(hospital, PRINCIPAL_HOSPITAL).access_token}"}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.client.get(url or reverse('blood_unit_summary'), headers=headers)
+
+    def totals(self, response):
+        return {entry['blood_type']: entry['total_quantity'] for entry in response.json()}
+
+    def assertNotModified(self, hospital, etag, url=None):
+        # Served from the cache: the token's claims authorize it without a query
+        with self.assertNumQueries(0):
+            response = self.get(hospital, url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b"")
+
+    def assertChanged(self, hospital, etag, url=None):
+        response = self.get(hospital, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_repeat_get_with_the_etag_is_not_modified(self):
+        self.add_unit(self.hospital, 2)
+        response = self.get(self.hospital)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(response), {'A+': 2})
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        self.assertNotModified(self.hospital, response['ETag'])
+        # Without the ETag the cached body comes back in full
+        self.assertEqual(self.totals(self.get(self.hospital)), {'A+': 2})
+
+    def test_unit_save_changes_the_etag(self):
+        unit = self.add_unit(self.hospital, 2)
+        etag = self.get(self.hospital)['ETag']
+
+        self.add_unit(self.hospital, 3, blood_type='B+')
+        response = self.assertChanged(self.hospital, etag)
+        self.assertEqual(self.totals(response), {'A+': 2, 'B+': 3})
+
+        etag = response['ETag']
+        unit.quantity = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.save()
+        self.assertEqual(self.totals(self.assertChanged(self.hospital, etag)), {'A+': 5, 'B+': 3})
+
+    def test_unit_delete_changes_the_etag(self):
+        unit = self.add_unit(self.hospital, 2)
+        self.add_unit(self.hospital, 3, blood_type='B+')
+        etag = self.get(self.hospital)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.delete()
+        response = self.assertChanged(self.hospital, etag)
+        self.assertEqual(self.totals(response), {'B+': 3})
+
+    def test_expiry_sweep_changes_the_etag(self):
+        unit = self.add_unit(self.hospital, 2)
+        self.add_unit(self.hospital, 3, blood_type='B+')
+        # Backdated without going through save(), as time passing would
+        BloodUnit.objects.filter(pk=unit.pk).update(expiration_date=timezone.localdate() - timedelta(days=1))
+        etag = self.get(self.hospital)['ETag']
+        self.assertNotModified(self.hospital, etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expired = expire_blood_units()
+        self.assertEqual(expired, {self.hospital.pk: 1})
+        self.assertEqual(self.totals(self.assertChanged(self.hospital, etag)), {'B+': 3})
+
+    def test_edit_keeping_totals_changes_the_unit_list(self):
+        unit = self.add_unit(self.hospital, 2)
+        url = reverse('blood_unit_by_type', args=['A+'])
+        etag = self.get(self.hospital, url)['ETag']
+        self.assertNotModified(self.hospital, etag, url)
+
+        unit.expiration_date += timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            unit.save()
+        response = self.assertChanged(self.hospital, etag, url)
+        self.assertEqual(response.json()['results'][0]['expiration_date'], unit.expiration_date.isoformat())
+
+    def test_writes_leave_other_hospitals_cached(self):
+        self.add_unit(self.hospital, 2)
+        self.add_unit(self.other, 4)
+        etag = self.get(self.hospital)['ETag']
+        other_etag = self.get(self.other)['ETag']
+        by_type = reverse('blood_unit_by_type', args=['A+'])
+        other_list_etag = self.get(self.other, by_type)['ETag']
+
+        self.add_unit(self.hospital, 1)
+        self.assertChanged(self.hospital, etag)
+        self.assertNotModified(self.other, other_etag)
+        self.assertNotModified(self.other, other_list_etag, by_type)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+        cls.requests = BloodRequest.objects.bulk_create(
+            BloodRequest(hospital=cls.hospital, blood_type='O+', quantity=number + 1, priority_level='normal')
+            for number in range(7)
+        )
+
+    def setUp(self):
+        access = tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {access}"
+
+    def get(self, url=None, **params):
+        return self.client.get(url or reverse('blood_request_list_create'), params)
+
+    def pages(self, **params):
+        ids = []
+        response = self.get(**params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.append([row['id'] for row in response.json()['results']])
+            if response.json()['next'] is None:
+                return ids
+            response = self.get(response.json()['next'])
+
+    def test_cursor_walks_every_row_once(self):
+        # Spread out so newest first is the reverse of creation order
+        for minutes, blood_request in enumerate(self.requests):
+            BloodRequest.objects.filter(pk=blood_request.pk).update(
+                created_at=timezone.now() - timedelta(minutes=len(self.requests) - minutes),
+            )
+        ids = [blood_request.pk for blood_request in reversed(self.requests)]
+
+        self.assertEqual(self.pages(page_size=3), [ids[:3], ids[3:6], ids[6:]])
+
+    def test_equal_timestamps_are_ordered_by_id(self):
+        BloodRequest.objects.update(created_at=timezone.now())
+        ids = sorted((blood_request.pk for blood_request in self.requests), reverse=True)
+
+        self.assertEqual(self.pages(page_size=2), [ids[:2], ids[2:4], ids[4:6], ids[6:]])
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.get(page_size=0).json()['results']), 1)
+        self.assertEqual(len(self.get(page_size='many').json()['results']), 7)
+
+    def test_invalid_cursor_is_not_found(self):
+        def encode(raw):
+            return base64.urlsafe_b64encode(raw.encode()).decode()
+
+        for cursor in ('not base64!', encode('no separator'), encode('yesterday|3'), encode('2024-01-01T00:00:00|x')):
+            with self.subTest(cursor=cursor):
+                response = self.get(cursor=cursor)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['detail'], "Invalid cursor")
+
+    def test_fields_limit_the_response_and_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(fields='id,blood_type', page_size=2)
+
+        self.assertEqual(response.json()['results'][0].keys(), {'id', 'blood_type'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('quantity', sql)
+        # hospital_name is left out, so the hospital isn't joined
+        self.assertNotIn('JOIN', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(page_size=2)
+        self.assertEqual(response.json()['results'][0]['hospital_name'], self.hospital.hospital_name)
+        self.assertIn('JOIN', queries.captured_queries[-1]['sql'])
+
+
+class CoordinateUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_donors(1)[0]
+        Donor.objects.filter(pk=cls.donor.pk).update(latitude=12.9, longitude=77.6)
+
+    def patch(self, data):
+        access = tokens_for(self.donor, PRINCIPAL_DONOR).access_token
+        return self.client.patch(
+            reverse('donor_detail'), data, content_type='application/json',
+            headers={'Authorization': f"Bearer {access}"},
+        )
+
+    def test_one_coordinate_can_be_patched_alone(self):
+        response = self.patch({'latitude': 13.1})
+
+        self.assertEqual(response.status_code, 200)
+        self.donor.refresh_from_db()
+        self.assertEqual((self.donor.latitude, self.donor.longitude), (13.1, 77.6))
+
+    def test_patched_coordinate_is_checked_against_the_saved_one(self):
+        response = self.patch({'longitude': 200})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['non_field_errors'], ["Coordinates are out of range."])
+
+        Donor.objects.filter(pk=self.donor.pk).update(latitude=None, longitude=None)
+        response = self.patch({'latitude': 13.1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['non_field_errors'], ["Latitude and longitude must be provided together."])
+
+
+@override_settings(PUSH_NOTIFICATION_BACKEND='local', DONOR_NOTIFICATIONS_SYNC=True)
+class BloodRequestCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.approved = make_hospital(1)
+        cls.pending = make_hospital(2, approval_status='pending')
+
+    def setUp(self):
+        LocalMessagingBackend.reset()
+        self.addCleanup(LocalMessagingBackend.reset)
+
+    def post(self, hospital, data):
+        access = tokens_for(hospital, PRINCIPAL_HOSPITAL).access_token
+        return self.client.post(
+            reverse('blood_request_list_create'), data, content_type='application/json',
+            headers={'Authorization': f"Bearer {access}"},
+        )
+
+    def test_approved_hospital_creates_and_notifies(self):
+        make_donors(2, blood_type='A+')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(self.approved, {'blood_type': 'A+', 'quantity': 2, 'priority_level': 'urgent'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['hospital_name'], self.approved.hospital_name)
+        blood_request = BloodRequest.objects.get(pk=response.json()['id'])
+        self.assertEqual(blood_request.hospital_id, self.approved.pk)
+        self.assertEqual(len(LocalMessagingBackend.outbox), 1)
+
+    def test_permission_is_checked_before_the_body(self):
+        response = self.post(self.pending, {'quantity': 'lots'})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(BloodRequest.objects.exists())
+
+    def test_invalid_body_is_rejected(self):
+        response = self.post(self.approved, {'blood_type': 'A+', 'quantity': 0, 'priority_level': 'urgent'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BloodRequest.objects.exists())
+
+
+@unittest.skipUnless('replica' in settings.DATABASES, "Needs the 'replica' alias from test_settings")
+@override_settings(
+    REPLICA_DATABASES=['replica'],
+    REPLICA_MAX_LAG=5,
+    REPLICA_LAG_CHECK_INTERVAL=3600,
+    PUSH_NOTIFICATION_BACKEND='local',
+    DONOR_NOTIFICATIONS_SYNC=True,
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    # The replica is a second connection mirroring the test database, so it
+    # only sees committed rows; hence TransactionTestCase
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.hospital = make_hospital()
+        BloodRequest.objects.create(hospital=self.hospital, blood_type='A+', quantity=1, priority_level='normal')
+        # Read-your-writes pins live in the default cache, which has to be
+        # shared between processes for replica reads to be used
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared_cache = self.settings(CACHES={
+            **settings.CACHES,
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name},
+        })
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+        for cache in caches.all():
+            cache.clear()
+        replicas.monitor.record('replica', 0.0)
+        self.addCleanup(replicas.monitor._lag.clear)
+        access = tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {access}"
+
+    def request(self, method, path, **kwargs):
+        """
+        Make a request and return it with the number of queries it sent to
+        the primary and to the replica.
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def list_requests(self):
+        return self.request('get', reverse('blood_request_list_create'))
+
+    def test_healthy_reads_go_to_the_replica(self):
+        response, primary, replica = self.list_requests()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_views_without_read_replica_use_the_primary(self):
+        response, primary, replica = self.request('get', reverse('hospital-detail'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+
+    def test_lagging_replica_is_skipped(self):
+        replicas.monitor.record('replica', 30.0)
+        response, primary, replica = self.list_requests()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_unknown_lag_is_treated_as_lagging(self):
+        replicas.monitor.record('replica', None)
+        _response, primary, replica = self.list_requests()
+
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_process_local_cache_keeps_reads_on_the_primary(self):
+        replicas._warn_pins_not_shared.cache_clear()
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}), \
+                self.assertLogs('accounts.replicas', 'WARNING') as logs:
+            response, primary, replica = self.list_requests()
+
+        self.assertIn("REDIS_URL", logs.output[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writes_go_to_the_primary_and_pin_the_client(self):
+        response, primary, replica = self.request(
+            'post', reverse('blood_request_list_create'),
+            data={'blood_type': 'B+', 'quantity': 1, 'priority_level': 'normal'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # The client's next reads see its own write
+        response, primary, replica = self.list_requests()
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other clients still read from the replica
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token}"
+        _response, primary, replica = self.list_requests()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+
+# Runs in a fresh interpreter, so only what startup and the send import is loaded
+LOCAL_SEND_SCRIPT = """
+import sys
+import django
+django.setup()
+from django.test.utils import override_settings
+from accounts.notifications import get_messaging_backend
+with override_settings(PUSH_NOTIFICATION_BACKEND='local'):
+    get_messaging_backend().send_multicast(['token'], 'title', 'body')
+print('firebase_admin' in sys.modules)
+"""
+
+
+class MessagingBackendTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict('accounts.notifications._backends', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(PUSH_NOTIFICATION_BACKEND='local')
+    def test_backend_is_created_on_first_use_and_shared(self):
+        with mock.patch.object(LocalMessagingBackend, '__init__', return_value=None) as init:
+            self.assertEqual(init.call_count, 0)
+            backend = get_messaging_backend()
+            self.assertIs(get_messaging_backend(), backend)
+
+        self.assertIsInstance(backend, LocalMessagingBackend)
+        init.assert_called_once_with()
+
+    def test_local_backend_never_imports_firebase(self):
+        path = os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')]))
+        result = subprocess.run(
+            [sys.executable, '-c', LOCAL_SEND_SCRIPT],
+            env={**os.environ, 'PYTHONPATH': path}, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.splitlines()[-1], 'False')
+
+
+# Cheap hashes; the benchmarks' own timings don't matter here
+@override_settings(PASSWORD_BCRYPT_ROUNDS=4)
+class BenchmarkCommandTests(TransactionTestCase):
+    """
+    The benchmark suite is a set of management commands (the project runs
+    Django's test runner, not pytest, so there is no pytest-benchmark).
+    These run each one on a tiny data set so they keep working.
+    """
+
+    def call(self, name, **options):
+        out = StringIO()
+        call_command(name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_benchmarks_run_on_seeded_data(self):
+        self.call('seed_data', hospitals=3, donors=30, units=40, requests=10, batch_size=16)
+
+        output = self.call('benchmark_api', repeat=1)
+        self.assertIn("summary from stored rows", output)
+
+        output = self.call('load_test', duration=0.5, warmup=0, concurrency=2, hospitals=3)
+        self.assertIn("p99", output)
+
+    def test_login_benchmark(self):
+        output = self.call('benchmark_logins', iterations=1)
+        self.assertIn("unknown email", output)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportStreamingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital()
+        BloodRequest.objects.bulk_create(
+            BloodRequest(hospital=cls.hospital, blood_type='O+', quantity=number + 1, priority_level='normal')
+            for number in range(5)
+        )
+
+    def setUp(self):
+        access = tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token
+        self.headers = {'Authorization': f"Bearer {access}"}
+
+    def export(self, client):
+        return client.get(reverse('export', args=['blood-requests', 'csv']), headers=self.headers)
+
+    async def test_asgi_export_streams_chunk_by_chunk(self):
+        pulled = []
+
+        def chunks(*args, **kwargs):
+            for number in range(3):
+                pulled.append(number)
+                yield f"chunk {number}\n".encode()
+
+        with mock.patch('accounts.views.export_stream', chunks):
+            response = await self.export(self.async_client)
+            self.assertTrue(response.is_async)
+            content = aiter(response.streaming_content)
+
+            self.assertEqual(await anext(content), b"chunk 0\n")
+            # Only what has been sent so far was produced
+            self.assertEqual(pulled, [0])
+            self.assertEqual([chunk async for chunk in content], [b"chunk 1\n", b"chunk 2\n"])
+
+    async def test_asgi_export_reads_the_cursor_in_chunks(self):
+        response = await self.export(self.async_client)
+        self.assertEqual(response.status_code, 200)
+        chunks = [chunk async for chunk in response.streaming_content]
+
+        # The header, then one chunk per two rows
+        self.assertEqual(len(chunks), 4)
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'id')
+        self.assertEqual(len(lines), 6)
+
+    def test_wsgi_export_streams_sync_chunks(self):
+        response = self.export(self.client)
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 6)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    PUSH_NOTIFICATION_BACKEND='local',
+    DONOR_NOTIFICATIONS_SYNC=True,
+)
+class BloodRequestConsumerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = make_hospital(1)
+        cls.pending = make_hospital(2, approval_status='pending')
+        cls.donor = make_donors(1, blood_type='O-')[0]
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        LocalMessagingBackend.reset()
+        self.addCleanup(LocalMessagingBackend.reset)
+        self.hospital_token = str(tokens_for(self.hospital, PRINCIPAL_HOSPITAL).access_token)
+        self.donor_token = str(tokens_for(self.donor, PRINCIPAL_DONOR).access_token)
+
+    def communicator(self, token=None, headers=()):
+        path = "/ws/blood-request/" if token is None else f"/ws/blood-request/?token={token}"
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), path, headers=list(headers))
+
+    @asynccontextmanager
+    async def connected(self, token=None, headers=()):
+        communicator = self.communicator(token, headers)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        try:
+            yield communicator
+        finally:
+            await communicator.disconnect()
+
+    async def assertRefused(self, expected_code, token=None, headers=()):
+        connected, code = await self.communicator(token, headers).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, expected_code)
+
+    async def test_missing_or_invalid_token_is_refused(self):
+        await self.assertRefused(CLOSE_UNAUTHENTICATED)
+        await self.assertRefused(CLOSE_UNAUTHENTICATED, token='not-a-jwt')
+        await self.assertRefused(CLOSE_UNAUTHENTICATED, headers=[(b'authorization', b'Bearer not-a-jwt')])
+
+    async def test_unapproved_hospital_is_refused(self):
+        await self.assertRefused(CLOSE_FORBIDDEN, token=str(tokens_for(self.pending, PRINCIPAL_HOSPITAL).access_token))
+        # Tokens without the principal claims are checked against the row
+        await self.assertRefused(CLOSE_FORBIDDEN, token=str(AccessToken.for_user(self.pending)))
+
+    async def test_clients_join_their_groups(self):
+        authorization = [(b'authorization', f"Bearer {self.hospital_token}".encode())]
+        async with self.connected(self.donor_token) as donor, self.connected(headers=authorization) as hospital:
+            channel_layer = get_channel_layer()
+            event = {'type': 'blood_request.created', 'request': {'id': 1}}
+            await channel_layer.group_send(blood_type_group('O-'), event)
+            self.assertEqual(await donor.receive_json_from(), {'type': 'blood_request', 'request': {'id': 1}})
+            self.assertTrue(await hospital.receive_nothing())
+
+            await channel_layer.group_send(hospital_group(self.hospital.pk), event)
+            self.assertEqual(await hospital.receive_json_from(), {'type': 'blood_request', 'request': {'id': 1}})
+            self.assertTrue(await donor.receive_nothing())
+
+    async def test_legacy_token_joins_the_hospital_group(self):
+        async with self.connected(str(AccessToken.for_user(self.hospital))) as hospital:
+            await hospital.send_json_to({'type': 'ping'})
+            self.assertEqual(await hospital.receive_json_from(), {'type': 'pong'})
+            await get_channel_layer().group_send(
+                hospital_group(self.hospital.pk), {'type': 'inventory.expiry_alert', 'alert': {}},
+            )
+            self.assertEqual(await hospital.receive_json_from(), {'type': 'expiry_alert', 'alert': {}})
+
+    async def test_new_blood_request_is_broadcast(self):
+        def create_request():
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(
+                    reverse('blood_request_list_create'),
+                    {'blood_type': 'A+', 'quantity': 2, 'priority_level': 'urgent'},
+                    content_type='application/json',
+                    headers={'Authorization': f"Bearer {self.hospital_token}"},
+                )
+
+        async with self.connected(self.donor_token) as donor, self.connected(self.hospital_token) as hospital:
+            response = await sync_to_async(create_request)()
+            self.assertEqual(response.status_code, 201)
+
+            # O- donors can give to A+ patients
+            for communicator in (donor, hospital):
+                message = await communicator.receive_json_from()
+                self.assertEqual(message['type'], 'blood_request')
+                self.assertEqual(message['request']['id'], response.json()['id'])
+                self.assertEqual(message['request']['blood_type'], 'A+')
+
+    async def test_expiring_units_alert_the_hospital(self):
+        def add_expiring_unit():
+            with self.captureOnCommitCallbacks(execute=True):
+                BloodUnit.objects.create(
+                    hospital=self.hospital, blood_type='B+', quantity=3,
+                    expiration_date=timezone.localdate() + timedelta(days=1),
+                )
+            return send_expiry_alerts(refresh_expiry_reports([self.hospital.pk]))
+
+        async with self.connected(self.hospital_token) as hospital:
+            self.assertEqual(await sync_to_async(add_expiring_unit)(), 1)
+
+            message = await hospital.receive_json_from()
+            self.assertEqual(message['type'], 'expiry_alert')
+            self.assertEqual(
+                [(entry['blood_type'], entry['quantity']) for entry in message['alert']['buckets']], [('B+', 3)],
+            )
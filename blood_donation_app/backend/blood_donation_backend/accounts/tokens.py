@@ -0,0 +1,30 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claim recording which table the token's user_id refers to
+PRINCIPAL_TYPE_CLAIM = 'principal_type'
+
+PRINCIPAL_DONOR = 'donor'
+PRINCIPAL_HOSPITAL = 'hospital'
+PRINCIPAL_STAFF = 'staff'
+
+
+def tokens_for(user, principal_type):
+    """
+    Issue a refresh/access token pair tagged with the principal type, so
+    donor, hospital and delivery staff ids can't be confused with each other.
+    Claims go stale if the row changes, until the access token expires.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh[PRINCIPAL_TYPE_CLAIM] = principal_type
+    refresh['email'] = user.email
+    # Enough to authorize most requests without loading the row again
+    if principal_type == PRINCIPAL_HOSPITAL:
+        refresh['approval_status'] = user.approval_status
+    elif principal_type == PRINCIPAL_DONOR:
+        refresh['blood_type'] = user.blood_type
+    return refresh
+
+
+def principal_type_of(token):
+    # Tokens issued before the claim existed were always resolved as hospitals
+    return token.get(PRINCIPAL_TYPE_CLAIM, PRINCIPAL_HOSPITAL)
@@ -0,0 +1,244 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .allocation import AllocationError, consume_units, reserve_units
+from .geo import distances_km
+from .matching import BLOOD_TYPES, compatible_recipient_types
+from .models import BloodRequest, BloodUnit, Hospital, HospitalInventorySummary, Transfer
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cheapest_candidates(distances, penalties, sinks, source, limit, max_distance_km):
+    """
+    Indexes of the ``limit`` cheapest reachable destinations for one source.
+    """
+    if np is not None:
+        costs = distances + penalties
+        reachable = np.flatnonzero((distances <= max_distance_km) & (sinks != source))
+        if len(reachable) > limit:
+            reachable = reachable[np.argpartition(costs[reachable], limit)[:limit]]
+        return reachable.tolist(), costs, distances
+    costs = [distance + penalty for distance, penalty in zip(distances, penalties)]
+    reachable = [
+        index for index, distance in enumerate(distances)
+        if distance <= max_distance_km and sinks[index] != source
+    ]
+    return heapq.nsmallest(limit, reachable, key=costs.__getitem__), costs, distances
+
+
+def optimize_transfers(locations, surplus, deficit, max_distance_km=None, substitution_penalty_km=None,
+                       candidates_per_source=None):
+    """
+    Greedy min-cost matching of surplus stock to shortages across the network.
+
+    ``locations`` maps hospital id -> (lat, lng); ``surplus`` and ``deficit``
+    map (hospital id, blood type) -> quantity. Each surplus entry is offered
+    to its ``candidates_per_source`` cheapest compatible shortages within
+    ``max_distance_km``; cost is distance, plus ``substitution_penalty_km``
+    when the unit type differs from the type needed so exact matches win.
+    Distances and the candidate cut are vectorised with NumPy when it is
+    available, and the pruned edges are then filled cheapest first.
+
+    Returns ``[(from_id, to_id, blood_type, quantity, distance_km), ...]``
+    where blood_type is the type of the units that move.
+    """
+    if max_distance_km is None:
+        max_distance_km = _setting('TRANSFER_MAX_DISTANCE_KM', 300)
+    if substitution_penalty_km is None:
+        substitution_penalty_km = _setting('TRANSFER_SUBSTITUTION_PENALTY_KM', 50)
+    if candidates_per_source is None:
+        candidates_per_source = _setting('TRANSFER_CANDIDATES_PER_SOURCE', 16)
+
+    shortages = [
+        (hospital_id, blood_type) for (hospital_id, blood_type), quantity in deficit.items()
+        if quantity > 0 and hospital_id in locations
+    ]
+
+    # Destination columns per unit type: every shortage that type can cover
+    columns = {}
+    for donor_type in BLOOD_TYPES:
+        recipients = set(compatible_recipient_types(donor_type))
+        keys = [key for key in shortages if key[1] in recipients]
+        if not keys:
+            continue
+        sinks = [key[0] for key in keys]
+        penalties = [0 if key[1] == donor_type else substitution_penalty_km for key in keys]
+        lats = [locations[key[0]][0] for key in keys]
+        lngs = [locations[key[0]][1] for key in keys]
+        if np is not None:
+            sinks, penalties = np.asarray(sinks), np.asarray(penalties, dtype=float)
+            lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+        columns[donor_type] = (keys, sinks, penalties, lats, lngs)
+
+    edges = []
+    for (source, donor_type), quantity in surplus.items():
+        if quantity <= 0 or source not in locations or donor_type not in columns:
+            continue
+        keys, sinks, penalties, lats, lngs = columns[donor_type]
+        distances = distances_km(lats, lngs, *locations[source])
+        chosen, costs, distances = _cheapest_candidates(
+            distances, penalties, sinks, source, candidates_per_source, max_distance_km,
+        )
+        for index in chosen:
+            edges.append((float(costs[index]), float(distances[index]), source, donor_type, keys[index]))
+
+    edges.sort()
+    remaining_surplus = dict(surplus)
+    remaining_deficit = dict(deficit)
+    planned = defaultdict(int)
+    distance_of = {}
+    for _cost, distance, source, donor_type, shortage in edges:
+        amount = min(remaining_surplus[(source, donor_type)], remaining_deficit[shortage])
+        if amount <= 0:
+            continue
+        remaining_surplus[(source, donor_type)] -= amount
+        remaining_deficit[shortage] -= amount
+        planned[(source, shortage[0], donor_type)] += amount
+        distance_of[(source, shortage[0])] = distance
+
+    return [
+        (source, sink, blood_type, quantity, distance_of[(source, sink)])
+        for (source, sink, blood_type), quantity in planned.items()
+    ]
+
+
+def network_balance(today=None):
+    """
+    Work out each approved hospital's transferable surplus and shortage per
+    blood type with a handful of GROUP BY queries.
+
+    Surplus is near-expiry stock (within TRANSFER_NEAR_EXPIRY_DAYS) beyond
+    what the hospital needs itself; a shortage is pending demand plus
+    TRANSFER_MIN_STOCK not covered by available stock. Quantities already in
+    open transfers count as moved.
+    """
+    today = today or timezone.localdate()
+    near_expiry_days = _setting('TRANSFER_NEAR_EXPIRY_DAYS', 7)
+    min_stock = _setting('TRANSFER_MIN_STOCK', 5)
+
+    locations = {
+        row[0]: (row[1], row[2])
+        for row in Hospital.objects.filter(
+            approval_status='approved', is_active=True, latitude__isnull=False, longitude__isnull=False,
+        ).values_list('pk', 'latitude', 'longitude')
+    }
+
+    def grouped(queryset, hospital_field, value_field):
+        return {
+            (row[hospital_field], row['blood_type']): row['total']
+            for row in queryset.values(hospital_field, 'blood_type').annotate(total=Sum(value_field))
+        }
+
+    available = grouped(HospitalInventorySummary.objects.all(), 'hospital_id', 'available_quantity')
+    near_expiry = grouped(
+        BloodUnit.objects.filter(
+            status='available',
+            expiration_date__gte=today,
+            expiration_date__lte=today + timedelta(days=near_expiry_days),
+        ),
+        'hospital_id', 'quantity',
+    )
+    pending = grouped(BloodRequest.objects.filter(status='pending'), 'hospital_id', 'quantity')
+    open_transfers = Transfer.objects.filter(status__in=Transfer.OPEN_STATUSES)
+    outgoing = grouped(open_transfers, 'from_hospital_id', 'quantity')
+    incoming = grouped(open_transfers, 'to_hospital_id', 'quantity')
+
+    surplus = {}
+    deficit = {}
+    for hospital_id in locations:
+        for blood_type in BLOOD_TYPES:
+            key = (hospital_id, blood_type)
+            effective = available.get(key, 0) - outgoing.get(key, 0)
+            need = pending.get(key, 0) + min_stock
+            if effective < need:
+                deficit[key] = need - effective
+            spare = min(near_expiry.get(key, 0) - outgoing.get(key, 0), effective - need)
+            if spare > 0:
+                surplus[key] = spare
+
+    # Stock on its way may have been sent as a substitute, so it covers any
+    # shortage it is compatible with, its own type first
+    for (hospital_id, unit_type), quantity in incoming.items():
+        for recipient_type in sorted(compatible_recipient_types(unit_type), key=lambda t: t != unit_type):
+            key = (hospital_id, recipient_type)
+            covered = min(quantity, deficit.get(key, 0))
+            if covered:
+                deficit[key] -= covered
+                quantity -= covered
+            if not quantity:
+                break
+    return locations, surplus, {key: quantity for key, quantity in deficit.items() if quantity > 0}
+
+
+def plan_transfers(commit=True):
+    """
+    Propose transfers for the whole network. Returns the Transfer objects,
+    saved with status 'proposed' unless ``commit`` is False.
+    """
+    locations, surplus, deficit = network_balance()
+    transfers = [
+        Transfer(
+            from_hospital_id=source,
+            to_hospital_id=sink,
+            blood_type=blood_type,
+            quantity=quantity,
+            distance_km=round(distance, 2),
+        )
+        for source, sink, blood_type, quantity, distance in optimize_transfers(locations, surplus, deficit)
+    ]
+    if commit:
+        transfers = Transfer.objects.bulk_create(transfers)
+    return transfers
+
+
+def complete_transfer(transfer_id):
+    """
+    Deliver a transfer: consume the units at the source, first expiry first,
+    and add matching units (same expiry dates) to the destination's stock, in
+    one transaction.
+    """
+    with transaction.atomic():
+        transfer = Transfer.objects.select_for_update().get(pk=transfer_id)
+        if transfer.status not in Transfer.OPEN_STATUSES:
+            raise AllocationError(f"Transfer {transfer.pk} is {transfer.status}.")
+
+        candidates = BloodUnit.objects.filter(
+            hospital_id=transfer.from_hospital_id,
+            blood_type=transfer.blood_type,
+            status='available',
+            expiration_date__gte=timezone.localdate(),
+        ).order_by('expiration_date', 'pk')
+        taken = reserve_units(candidates, transfer.quantity)
+        consumed = consume_units(taken, 'transferred')
+
+        received = BloodUnit.objects.bulk_create([
+            BloodUnit(
+                blood_type=unit.blood_type,
+                quantity=take,
+                hospital_id=transfer.to_hospital_id,
+                expiration_date=unit.expiration_date,
+            )
+            for unit, take in taken
+        ])
+        HospitalInventorySummary.apply_delta(
+            transfer.to_hospital_id, transfer.blood_type, transfer.quantity, len(received),
+        )
+
+        transfer.status = 'delivered'
+        transfer.delivered_at = timezone.now()
+        transfer.save(update_fields=['status', 'delivered_at'])
+    return transfer, consumed, received
@@ -1,25 +1,38 @@
 from django.urls import path
 from .views import (
-    DeliveryStaffLoginView,
     DonorCreateView,
     DeliveryStaffCreateView,
-    DonorLoginView,
     HospitalCreateView,
-    HospitalLoginView,
-    BloodRequestListCreateView,
     BloodRequestDetailView,
+    BloodRequestFulfilView,
     DonorDetailView,
-    BloodUnitSummaryView,
     BloodUnitByTypeView,
     BloodUnitCRUDView,
+    BloodUnitExpiryRiskView,
+    DemandForecastListView,
+    BloodUnitBulkCreateView,
     HospitalDetailView,
+    TransferListView,
+    TransferCompleteView,
+    DeliveryJobCreateView,
+    DeliveryStaffStatusView,
+    DeliveryRouteView,
+    DeliveryJobActionView,
+    ExportView,
+)
+from .async_views import (
+    AsyncBloodRequestListCreateView,
+    AsyncBloodUnitSummaryView,
+    AsyncDeliveryStaffLoginView,
+    AsyncDonorLoginView,
+    AsyncHospitalLoginView,
 )
 
 urlpatterns = [
 
     # Donor registration and login
     path('register/donor/', DonorCreateView.as_view(), name='register_donor'),
-    path('login/donor/', DonorLoginView.as_view(), name='login_donor'),
+    path('login/donor/', AsyncDonorLoginView.as_view(), name='login_donor'),
 
     
     # Donor details (for logged-in donors)
@@ -27,30 +40,51 @@ urlpatterns = [
 
     # Delivery staff registration and login
     path('register/deliverystaff/', DeliveryStaffCreateView.as_view(), name='register_delivery_staff'),
-    path('login/deliverystaff/', DeliveryStaffLoginView.as_view(), name='login_delivery_staff'),
+    path('login/deliverystaff/', AsyncDeliveryStaffLoginView.as_view(), name='login_delivery_staff'),
+
+    # Delivery staff shift status, route and job updates
+    path('deliverystaff/status/', DeliveryStaffStatusView.as_view(), name='delivery_staff_status'),
+    path('deliverystaff/route/', DeliveryRouteView.as_view(), name='delivery_staff_route'),
+    path('delivery-jobs/<int:pk>/<str:action>/', DeliveryJobActionView.as_view(), name='delivery_job_action'),
 
     # Hospital registration and login
     path('register/hospital/', HospitalCreateView.as_view(), name='register_hospital'),
-    path('login/hospital/', HospitalLoginView.as_view(), name='login_hospital'),
+    path('login/hospital/', AsyncHospitalLoginView.as_view(), name='login_hospital'),
 
     path('hospital/details/', HospitalDetailView.as_view(), name='hospital-detail'),
 
 
 
     # Blood request management
-    path('blood-requests/', BloodRequestListCreateView.as_view(), name='blood_request_list_create'),
+    path('blood-requests/', AsyncBloodRequestListCreateView.as_view(), name='blood_request_list_create'),
     path('blood-requests/<int:pk>/', BloodRequestDetailView.as_view(), name='blood_request_detail'),
+    path('blood-requests/<int:pk>/fulfil/', BloodRequestFulfilView.as_view(), name='blood_request_fulfil'),
 
 
     # Blood Unit CRUD operations
     path('blood-units/', BloodUnitCRUDView.as_view(), name='blood_unit_crud_list'),
     path('blood-units/<int:pk>/', BloodUnitCRUDView.as_view(), name='blood_unit_crud_detail'),
 
+    # Bulk ingestion of a shipment (JSON array, CSV or NDJSON)
+    path('blood-units/bulk/', BloodUnitBulkCreateView.as_view(), name='blood_unit_bulk_create'),
+
     # Blood Unit Summary with Low Stock Alert
-    path('blood-units/summary/', BloodUnitSummaryView.as_view(), name='blood_unit_summary'),
+    path('blood-units/summary/', AsyncBloodUnitSummaryView.as_view(), name='blood_unit_summary'),
 
     # Blood Units by Type with Expiration Details
     path('blood-units/type/<str:blood_type>/', BloodUnitByTypeView.as_view(), name='blood_unit_by_type'),
 
-    # Cross-hospital donation and settlement (if applicable, add here)
+    # Near-expiry stock by risk bucket
+    path('blood-units/expiry-risk/', BloodUnitExpiryRiskView.as_view(), name='blood_unit_expiry_risk'),
+
+    # Demand forecasts, reorder thresholds and their backtest accuracy
+    path('blood-units/forecast/', DemandForecastListView.as_view(), name='blood_unit_forecast'),
+
+    # Cross-hospital stock transfers
+    path('transfers/', TransferListView.as_view(), name='transfer_list'),
+    path('transfers/<int:pk>/complete/', TransferCompleteView.as_view(), name='transfer_complete'),
+    path('delivery-jobs/', DeliveryJobCreateView.as_view(), name='delivery_job_create'),
+
+    # Analytics exports
+    path('exports/<slug:dataset>.<slug:file_format>', ExportView.as_view(), name='export'),
 ]
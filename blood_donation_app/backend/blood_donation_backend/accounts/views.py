@@ -1,29 +1,83 @@
+import logging
+
 from rest_framework import status, generics
-from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework.exceptions import PermissionDenied, NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
 from .serializers import (
     DonorSerializer, 
     DeliveryStaffSerializer, 
-    DonorLoginSerializer, 
-    DeliveryStaffLoginSerializer, 
     HospitalSerializer, 
-    HospitalLoginSerializer, 
     BloodRequestSerializer,
     BloodUnitSerializer,
+    BloodUnitExpirySerializer,
+    TransferSerializer,
+    DeliveryStaffStatusSerializer,
+    DeliveryJobSerializer,
+    DemandForecastSerializer,
+)
+from .models import (
+    Donor, DeliveryStaff, Hospital, BloodRequest, BloodUnit, Transfer, DeliveryJob,
+    DemandForecast,
 )
-from .models import Donor, DeliveryStaff, Hospital, BloodRequest, BloodUnit
+from .notifications import dispatch_donor_notifications
+from .pagination import KeysetPagination
+from .realtime import broadcast_blood_request
+from .allocation import AllocationError, InsufficientStock, allocate_blood_request
+from .transfers import complete_transfer
+from .expiry import hospital_expiry_report
+from .inventory_cache import cached_inventory_response
+from .ingestion import ingest_records, iter_lines, read_csv, read_ndjson
+from .exports import CONTENT_TYPES, DATASETS, ExportError, aiter_stream, export_stream
+from .delivery import DeliveryError, drop_off_job, pick_up_job, schedule_dispatch
+from .authentication import PrincipalJWTAuthentication
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Sum, Case, When, BooleanField, Value, IntegerField
-from datetime import timedelta
+from django.db.models import Q, Sum, Case, When, BooleanField, Value, IntegerField
+from datetime import date, timedelta
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.db.models.functions import Coalesce, Cast
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+logger = logging.getLogger(__name__)
+
+
+# Only hospital principals may use inventory endpoints
+class IsHospital(BasePermission):
+    message = "You do not have access to this resource."
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and getattr(request.user, 'is_hospital', False))
+
+
+# Only delivery staff principals may use the driver endpoints
+class IsDeliveryStaff(BasePermission):
+    message = "You do not have access to this resource."
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and getattr(request.user, 'is_delivery_staff', False))
+
+
+# Shared by the list endpoints: keyset pagination plus a queryset that loads
+# only the columns the (possibly ?fields= projected) serializer will read
+class ProjectedListMixin:
+    pagination_class = KeysetPagination
+    projection_required_fields = ('id', 'created_at')
+
+    def project_queryset(self, queryset):
+        if self.request.method != 'GET':
+            return queryset
+        columns = set(self.projection_required_fields)
+        for field in self.get_serializer().fields.values():
+            if field.source != '*':
+                columns.add(field.source.replace('.', '__'))
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
 
 
 # Donor registration view
@@ -40,76 +94,31 @@ class DeliveryStaffCreateView(generics.CreateAPIView):
     permission_classes = [AllowAny]  # Anyone can register
 
 
-# Donor login view
-class DonorLoginView(APIView):
-    permission_classes = [AllowAny]  # Anyone can login
-
-    def post(self, request):
-        serializer = DonorLoginSerializer(data=request.data)
-        if serializer.is_valid():
-            # Authenticate using the custom Donor backend
-            donor = authenticate(
-                request,
-                email=serializer.validated_data['email'],
-                password=serializer.validated_data['password']
-            )
-            
-            if donor is not None:
-                # Generate JWT tokens for the donor
-                refresh = RefreshToken.for_user(donor)
-                return Response({
-                    'success': True,
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Invalid login credentials."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-
 class DonorDetailView(generics.RetrieveUpdateDestroyAPIView):
+    query_budget = {'GET': 3}
     serializer_class = DonorSerializer
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        # Get the authenticated donor based on email
-        print(f"Request user: {self.request.user.email}")
-        try:
-            donor = Donor.objects.get(email=self.request.user.email)
-            return donor
-        except Donor.DoesNotExist:
+        # Get the authenticated donor from the token principal
+        user = self.request.user
+        logger.debug("Donor detail requested", extra={'principal_id': user.pk, 'method': self.request.method})
+        donor = None
+        if user.is_donor:
+            # Only plain reads may be served from the principal cache
+            donor = user.get_object(use_cache=self.request.method == 'GET')
+        if donor is None:
             raise NotFound("Donor not found for this user.")
+        return donor
 
+    def perform_update(self, serializer):
+        serializer.save()
+        self.request.user.invalidate()
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        self.request.user.invalidate()
 
-# Delivery staff login view
-class DeliveryStaffLoginView(APIView):
-    permission_classes = [AllowAny]  # Anyone can login
-
-    def post(self, request):
-        serializer = DeliveryStaffLoginSerializer(data=request.data)
-        if serializer.is_valid():
-            # Authenticate using the custom DeliveryStaff backend
-            staff = authenticate(
-                request,
-                email=serializer.validated_data['email'],
-                password=serializer.validated_data['password']
-            )
-            
-            if staff is not None:
-                # Generate JWT tokens for the delivery staff
-                refresh = RefreshToken.for_user(staff)
-                return Response({
-                    'success': True,
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Invalid login credentials."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # Hospital registration view
@@ -124,42 +133,18 @@ class HospitalCreateView(generics.CreateAPIView):
         return response
 
 
-# Hospital login view
-class HospitalLoginView(APIView):
-    permission_classes = [AllowAny]  # Anyone can attempt login
-
-    def post(self, request):
-        serializer = HospitalLoginSerializer(data=request.data)
-        if serializer.is_valid():
-            # Authenticate using the custom Hospital backend
-            hospital = authenticate(
-                request,
-                email=serializer.validated_data['email'],
-                password=serializer.validated_data['password']
-            )
-            
-            if hospital is not None:
-                print(f"Authenticated user: {hospital}")
-                # Generate JWT tokens for the hospital user
-                refresh = RefreshToken.for_user(hospital)
-                return Response({
-                    'status': True,
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Invalid login credentials."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
 # View for retrieving hospital details
 class HospitalDetailView(APIView):
+    query_budget = 2
     permission_classes = [IsAuthenticated]  # Only authenticated users can access this view
 
     def get(self, request):
         # Get the authenticated hospital user
-        hospital = request.user
+        if not request.user.is_hospital:
+            raise PermissionDenied("You do not have access to this resource.")
+        hospital = request.user.get_object()
+        if hospital is None:
+            raise NotFound("Hospital not found for this user.")
         
         # Serialize the hospital data
         serializer = HospitalSerializer(hospital)
@@ -176,79 +161,53 @@ class HospitalDetailView(APIView):
 
 
 # View for listing and creating blood requests (only for hospitals)
-class BloodRequestListCreateView(generics.ListCreateAPIView):
+class BloodRequestListCreateView(ProjectedListMixin, generics.ListCreateAPIView):
+    query_budget = {'GET': 2, 'POST': 4}
+    # GETs may read from a replica (see accounts.replicas)
+    read_replica = True
     serializer_class = BloodRequestSerializer
     permission_classes = [IsAuthenticated]  # Only authenticated users can view and create blood requests
-    authentication_classes = [JWTAuthentication] 
+    authentication_classes = [PrincipalJWTAuthentication]
 
     def get_queryset(self):
         user = self.request.user        
-        if isinstance(user, Hospital):  # Check if the user is a Hospital instance
-            return BloodRequest.objects.filter(hospital=user)
+        if user.is_hospital:
+            return self.project_queryset(BloodRequest.objects.filter(hospital_id=user.pk))
         raise PermissionDenied("You do not have access to this resource.")
 
     def perform_create(self, serializer):
         user = self.request.user
-        if isinstance(user, Hospital) and user.approval_status == 'approved':
-            blood_request = serializer.save(hospital=user)
-
-            # Send notifications to eligible donors
-            self.send_donor_notifications(blood_request)
+        if user.is_approved_hospital:
+            self.create_blood_request(serializer, user.pk)
         else:
             raise PermissionDenied("Only approved hospitals can create blood requests.")
 
-    def send_donor_notifications(self, blood_request):
-        print("Preparing to send notifications...")  # Add log to confirm function execution
-        # Get donors with the matching blood type
-        eligible_donors = Donor.objects.filter(blood_type=blood_request.blood_type, is_active=True)
-        print(f"Found {eligible_donors.count()} eligible donors")  # Add log to track how many donors are found
-    
-        # Access hospital details from the related Hospital object
-        hospital = blood_request.hospital  # Get the hospital associated with the request
-
-        # Prepare notification details
-        message_title = "Urgent Blood Donation Request!"
-        message_body = (
-            f"{hospital.hospital_name} needs {blood_request.quantity} units of {blood_request.blood_type} blood. "
-            f"Contact: {hospital.contact_info}. Location: {hospital.address if hospital.address else 'N/A'}."
-        )
-
-        # Send notifications via Firebase Admin SDK
-        for donor in eligible_donors:
-            if donor.device_token:  # Assuming donors have device tokens stored in the database
-              print(f"Donor {donor.email} has a valid device token: {donor.device_token}")
-            else:
-              print(f"Donor {donor.email} does not have a valid device token.")  # Log if no device token is found
-              try:  # Wrap the notification sending in a try-except block to handle any errors that may occur
-                print(f"Sending notification to {donor.email} with token {donor.device_token}")  # Log before sending
-                message = messaging.Message(
-                    notification=messaging.Notification(
-                        title=message_title,
-                        body=message_body,
-                    ),
-                    token=donor.device_token,
-                )
-                response = messaging.send(message)
-                print(f"Notification sent to {donor.email}: {response}")
-              except Exception as e:
-                print(f"Failed to send notification to {donor.email}: {e}")
-
+    @staticmethod
+    def create_blood_request(serializer, hospital_id):
+        """
+        Save a validated blood request for the hospital. Shared with the async
+        view (see accounts.async_views), which calls it off the event loop.
+        """
+        blood_request = serializer.save(hospital_id=hospital_id)
 
-    
-       
+        # Notify eligible donors in the background so the 201 returns immediately
+        dispatch_donor_notifications(blood_request)
+        # Connected donors and dashboards get it over the WebSocket straight away
+        transaction.on_commit(lambda: broadcast_blood_request(blood_request))
+        return blood_request
 
 
 # View for retrieving, updating, and deleting blood requests
 class BloodRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BloodRequestSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [PrincipalJWTAuthentication]
 
     def get_queryset(self):
         # Only allow hospitals to manage their own requests
         user = self.request.user
-        if isinstance(user, Hospital):
-            return BloodRequest.objects.filter(hospital=user)
+        if user.is_hospital:
+            return BloodRequest.objects.filter(hospital_id=user.pk)
         raise PermissionDenied("You do not have access to this resource.")
 
     def perform_update(self, serializer):
@@ -256,7 +215,7 @@ class BloodRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance = self.get_object()
 
         # Only approved hospitals can update their requests
-        if isinstance(user, Hospital) and user.approval_status == 'approved':
+        if user.is_approved_hospital:
             # Check if the status is changing to fulfilled
             if serializer.validated_data.get('status') == 'fulfilled' and instance.status != 'fulfilled':
                 serializer.save(fulfilled_at=timezone.now())  # Set fulfilled_at when request is fulfilled
@@ -282,91 +241,145 @@ class BloodRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 
-# View for listing available blood Types and Units
-class BloodUnitSummaryView(generics.ListAPIView):
-    """
-    View for listing available blood units, summarized by blood type, including low stock alerts.
-    """
-    permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        hospital = self.request.user
-
-        # Summarize available units by blood type
-        return BloodUnit.objects.filter(hospital=hospital, status='available')\
-            .values('blood_type')\
-            .annotate(total_quantity=Coalesce(Sum('quantity'), 0))
-
-    def list(self, request, *args, **kwargs):
-        """
-        Custom response for each blood type with low stock alerts.
-        """
-        queryset = self.get_queryset()
-        low_stock_threshold = 5
-        response_data = []
+# View for fulfilling a blood request from the hospital's own stock
+class BloodRequestFulfilView(APIView):
+    permission_classes = [IsAuthenticated, IsHospital]
 
-        for blood_type_data in queryset:
-            blood_type = blood_type_data['blood_type']
-            total_quantity = blood_type_data['total_quantity']
-            
-            # Determine if low stock alert should be triggered
-            low_stock_alert = total_quantity < low_stock_threshold
+    def post(self, request, pk):
+        if not request.user.is_approved_hospital:
+            raise PermissionDenied("Only approved hospitals can fulfil blood requests.")
+        if not BloodRequest.objects.filter(pk=pk, hospital_id=request.user.pk).exists():
+            raise NotFound("Blood request not found.")
 
-            response_data.append({
-                'blood_type': blood_type,
-                'total_quantity': total_quantity,
-                'low_stock_alert': low_stock_alert
-            })
+        try:
+            units = allocate_blood_request(pk)
+        except InsufficientStock as exc:
+            return Response(
+                {"error": str(exc), "needed": exc.needed, "available": exc.available},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except AllocationError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        blood_request = BloodRequest.objects.select_related('hospital').get(pk=pk)
+        return Response({
+            'request': BloodRequestSerializer(blood_request).data,
+            'allocated_units': [
+                {
+                    'id': unit.id,
+                    'blood_type': unit.blood_type,
+                    'quantity': unit.quantity,
+                    'expiration_date': unit.expiration_date,
+                }
+                for unit in units
+            ],
+        }, status=status.HTTP_200_OK)
+
+
+# View for the hospital's demand forecasts, with how accurate each was in backtesting
+class DemandForecastListView(generics.ListAPIView):
+    query_budget = 2
+    read_replica = True
+    serializer_class = DemandForecastSerializer
+    permission_classes = [IsAuthenticated, IsHospital]
 
-        return Response(response_data)
+    def get_queryset(self):
+        return DemandForecast.objects.filter(hospital_id=self.request.user.pk).order_by('blood_type')
 
 
 # 2. Individual Blood Type View (with expiration dates)
-class BloodUnitByTypeView(generics.ListAPIView):
+class BloodUnitByTypeView(ProjectedListMixin, generics.ListAPIView):
     """
     View for listing all blood units of a specific blood type, with expiration details.
     """
-    serializer_class = BloodUnitSerializer
-    permission_classes = [IsAuthenticated]
+    serializer_class = BloodUnitExpirySerializer
+    permission_classes = [IsAuthenticated, IsHospital]
+    query_budget = 2
+    read_replica = True
+    projection_required_fields = ('id', 'created_at', 'expiration_date')
 
     def get_queryset(self):
         blood_type = self.kwargs['blood_type']
-        hospital = self.request.user
-        return BloodUnit.objects.filter(hospital=hospital, blood_type=blood_type, status='available')
+        hospital = self.request.user.pk
+        return self.project_queryset(
+            BloodUnit.objects.filter(hospital_id=hospital, blood_type=blood_type, status='available')
+        )
 
     def list(self, request, *args, **kwargs):
-        """
-        Add expiration detail logic for units of the requested blood type.
-        """
-        queryset = self.get_queryset()
-        response_data = []
+        return cached_inventory_response(
+            request, request.user.pk, self.kwargs['blood_type'],
+            lambda: super(BloodUnitByTypeView, self).list(request, *args, **kwargs),
+        )
+
+    def get_serializer_context(self):
+        # Compute "today" once per response rather than once per unit
+        context = super().get_serializer_context()
+        context['today'] = timezone.now().date()
+        return context
+
+
+# View for the hospital's near-expiry stock, bucketed by how soon it expires
+class BloodUnitExpiryRiskView(APIView):
+    query_budget = 2
+    read_replica = True
+    permission_classes = [IsAuthenticated, IsHospital]
+
+    def get(self, request):
+        # Served from the cache the check_expiry_risk job fills; ?refresh=1 recomputes
+        refresh = request.query_params.get('refresh') in ('1', 'true')
+        return Response(hospital_expiry_report(request.user.pk, refresh=refresh), status=status.HTTP_200_OK)
+
 
-        for blood_unit in queryset:
-            days_to_expire = (blood_unit.expiration_date - timezone.now().date()).days
-            response_data.append({
-                'id': blood_unit.id,
-                'blood_type': blood_unit.blood_type,
-                'quantity': blood_unit.quantity,
-                'expiration_date': blood_unit.expiration_date,
-                'days_to_expire': days_to_expire
-            })
+# View for adding a whole shipment of blood units in one request
+class BloodUnitBulkCreateView(APIView):
+    """
+    Accepts a JSON array of units, or CSV (text/csv) / NDJSON
+    (application/x-ndjson) bodies, which are read as a stream. Invalid rows
+    are reported and skipped without failing the rest.
+    """
+    permission_classes = [IsAuthenticated, IsHospital]
+    streamed_formats = {
+        'text/csv': read_csv,
+        'application/x-ndjson': read_ndjson,
+        'application/ndjson': read_ndjson,
+        'application/jsonl': read_ndjson,
+    }
 
-        return Response(response_data)
+    def post(self, request):
+        reader = self.streamed_formats.get(request.content_type.split(';')[0].strip())
+        if reader is not None:
+            records = reader(iter_lines(request.stream)) if request.stream is not None else []
+        else:
+            records = request.data
+            if isinstance(records, dict):
+                records = records.get('units')
+            if not isinstance(records, list):
+                return Response({"error": "Expected a JSON array of blood units."}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = ingest_records(records, hospital_id=request.user.pk)
+        response_status = status.HTTP_201_CREATED if result.created else status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=response_status)
 
 
 # 3. Blood Unit CRUD View
-class BloodUnitCRUDView(generics.RetrieveUpdateDestroyAPIView, generics.ListCreateAPIView):
+class BloodUnitCRUDView(ProjectedListMixin, generics.RetrieveUpdateDestroyAPIView, generics.ListCreateAPIView):
     """
     View for creating, retrieving, updating, and deleting blood units.
     """
     queryset = BloodUnit.objects.all()
     serializer_class = BloodUnitSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsHospital]
     lookup_field = 'pk'
 
     def get_queryset(self):
-        hospital = self.request.user
-        return BloodUnit.objects.filter(hospital=hospital)
+        hospital = self.request.user.pk
+        return self.project_queryset(BloodUnit.objects.filter(hospital_id=hospital))
+
+    def get(self, request, *args, **kwargs):
+        # The same view serves both the collection and single-unit URLs
+        if self.lookup_field in kwargs:
+            return self.retrieve(request, *args, **kwargs)
+        return self.list(request, *args, **kwargs)
     
     def create(self, request, *args, **kwargs):
         """
@@ -374,7 +387,7 @@ class BloodUnitCRUDView(generics.RetrieveUpdateDestroyAPIView, generics.ListCrea
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(hospital=self.request.user)
+        serializer.save(hospital_id=self.request.user.pk)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def update(self, request, *args, **kwargs):
@@ -401,3 +414,169 @@ class BloodUnitCRUDView(generics.RetrieveUpdateDestroyAPIView, generics.ListCrea
 
 
 
+
+
+# View for listing a hospital's incoming and outgoing stock transfers
+class TransferListView(generics.ListAPIView):
+    query_budget = 2
+    read_replica = True
+    serializer_class = TransferSerializer
+    permission_classes = [IsAuthenticated, IsHospital]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        hospital_id = self.request.user.pk
+        direction = self.request.query_params.get('direction')
+        if direction == 'incoming':
+            queryset = Transfer.objects.filter(to_hospital_id=hospital_id)
+        elif direction == 'outgoing':
+            queryset = Transfer.objects.filter(from_hospital_id=hospital_id)
+        else:
+            queryset = Transfer.objects.filter(
+                Q(to_hospital_id=hospital_id) | Q(from_hospital_id=hospital_id)
+            )
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset.select_related('from_hospital', 'to_hospital')
+
+
+# View for the receiving hospital to confirm a transfer has arrived
+class TransferCompleteView(APIView):
+    permission_classes = [IsAuthenticated, IsHospital]
+
+    def post(self, request, pk):
+        if not Transfer.objects.filter(pk=pk, to_hospital_id=request.user.pk).exists():
+            raise NotFound("Transfer not found.")
+
+        try:
+            transfer, _consumed, received = complete_transfer(pk)
+        except InsufficientStock as exc:
+            return Response(
+                {"error": str(exc), "needed": exc.needed, "available": exc.available},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except AllocationError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        transfer = Transfer.objects.select_related('from_hospital', 'to_hospital').get(pk=transfer.pk)
+        return Response({
+            'transfer': TransferSerializer(transfer).data,
+            'received_units': BloodUnitSerializer(received, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+# View for a hospital to request delivery of units for one of its blood requests
+class DeliveryJobCreateView(generics.CreateAPIView):
+    serializer_class = DeliveryJobSerializer
+    permission_classes = [IsAuthenticated, IsHospital]
+
+    def perform_create(self, serializer):
+        blood_request = serializer.validated_data['blood_request']
+        if blood_request.hospital_id != self.request.user.pk:
+            raise NotFound("Blood request not found.")
+        serializer.save(dropoff_hospital_id=self.request.user.pk)
+        # Route it shortly, in the background, rather than waiting for the periodic dispatch run
+        schedule_dispatch()
+
+
+# View for delivery staff to go on/off shift and report their position
+class DeliveryStaffStatusView(APIView):
+    permission_classes = [IsAuthenticated, IsDeliveryStaff]
+
+    def patch(self, request):
+        staff = request.user.get_object(use_cache=False)
+        if staff is None:
+            raise NotFound("Delivery staff not found.")
+        serializer = DeliveryStaffStatusSerializer(staff, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        request.user.invalidate()
+        if staff.is_available:
+            schedule_dispatch()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# View for delivery staff to see their route, stops in order
+class DeliveryRouteView(APIView):
+    permission_classes = [IsAuthenticated, IsDeliveryStaff]
+
+    def get(self, request):
+        jobs = DeliveryJob.objects.filter(
+            delivery_staff_id=request.user.pk, status__in=DeliveryJob.ACTIVE_STATUSES,
+        ).select_related('pickup_hospital', 'dropoff_hospital')
+        stops = []
+        for job in jobs:
+            if job.status == 'assigned':
+                stops.append((job.pickup_sequence, 'pickup', job, job.pickup_hospital))
+            stops.append((job.dropoff_sequence, 'dropoff', job, job.dropoff_hospital))
+        stops.sort(key=lambda stop: (stop[0] is None, stop[0]))
+        return Response([
+            {
+                'job': job.pk,
+                'action': action,
+                'quantity': job.quantity,
+                'hospital': hospital.pk,
+                'hospital_name': hospital.hospital_name,
+                'address': hospital.address,
+                'latitude': hospital.latitude,
+                'longitude': hospital.longitude,
+            }
+            for _sequence, action, job, hospital in stops
+        ], status=status.HTTP_200_OK)
+
+
+# View for delivery staff to record a pickup or drop-off
+class DeliveryJobActionView(APIView):
+    permission_classes = [IsAuthenticated, IsDeliveryStaff]
+    actions = {'pickup': pick_up_job, 'dropoff': drop_off_job}
+
+    def post(self, request, pk, action):
+        if action not in self.actions:
+            raise NotFound("Unknown action.")
+        try:
+            job = self.actions[action](pk, request.user.pk)
+        except DeliveryJob.DoesNotExist:
+            raise NotFound("Delivery job not found.")
+        except (DeliveryError, AllocationError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        job = DeliveryJob.objects.select_related('pickup_hospital', 'dropoff_hospital').get(pk=job.pk)
+        return Response(DeliveryJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+# View for streaming a hospital's data (or donor aggregates) as CSV or Parquet
+class ExportView(APIView):
+    """
+    GET /api/exports/<dataset>.<csv|parquet>?since=YYYY-MM-DD&until=YYYY-MM-DD
+    for blood-requests, blood-units or donors. Rows are streamed straight from
+    a database cursor, so large exports don't build up in memory.
+    """
+    permission_classes = [IsAuthenticated, IsHospital]
+
+    def parse_date(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: "Use the YYYY-MM-DD format."})
+
+    def get(self, request, dataset, file_format):
+        if dataset not in DATASETS or file_format not in CONTENT_TYPES:
+            raise NotFound("Unknown export.")
+        try:
+            chunks = export_stream(
+                dataset, file_format,
+                since=self.parse_date('since'),
+                until=self.parse_date('until'),
+                hospital_id=request.user.pk,
+            )
+        except ExportError as exc:
+            raise ValidationError({"error": str(exc)})
+        if isinstance(request._request, ASGIRequest):
+            # ASGI buffers sync iterators whole; an async one is sent chunk by chunk
+            chunks = aiter_stream(chunks)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+        return response
@@ -1,14 +1,6 @@
-from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
 from django.urls import path
 from accounts.consumers import BloodRequestConsumer
 
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter([
-            path("ws/blood-request/", BloodRequestConsumer.as_asgi()),
-        ])
-    ),
-})
+websocket_urlpatterns = [
+    path("ws/blood-request/", BloodRequestConsumer.as_asgi()),
+]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # Third-party apps
+    'channels',
     'rest_framework',  # Django REST framework
     'rest_framework_simplejwt',  # Simple JWT authentication
     
@@ -59,9 +61,12 @@ SIMPLE_JWT = {
     'SIGNING_KEY': SECRET_KEY,  # Your Django secret key
 }
 
+# Seconds a principal's full row may be served from cache (see accounts.authentication)
+PRINCIPAL_CACHE_TTL = 30
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.PrincipalJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -71,6 +76,7 @@ REST_FRAMEWORK = {
 AUTH_USER_MODEL = 'accounts.Hospital'
 
 AUTHENTICATION_BACKENDS = [
+    'accounts.backends.PrincipalBackend',  # API logins: one table, one hash check
     'accounts.backends.HospitalBackend',  # Custom backend for Hospital
     'accounts.backends.DonorBackend',     # Custom backend for Donor
     'accounts.backends.DeliveryStaffBackend',  # Custom backend for DeliveryStaff
@@ -78,6 +84,10 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so latency and query counts cover the whole request (see accounts.metrics)
+    'accounts.metrics.InstrumentationMiddleware',
+    # Lets the replica router see which view a query is for (see accounts.replicas)
+    'accounts.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,21 +120,100 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'blood_donation_backend.wsgi.application'
+ASGI_APPLICATION = 'blood_donation_backend.asgi.application'
+
+# Channel layer for real-time blood request broadcasts.
+# In-memory works for a single process and tests; set REDIS_URL in production.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        },
+    }
+
+# Caches. Local memory works for a single process and tests; set REDIS_URL in
+# production so every worker shares cached dashboards and their invalidation.
+# Commands that feed the web servers from their own process (check_expiry_risk)
+# refuse to run without it, and so does replica routing.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'inventory': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory',
+    },
+}
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+        'inventory': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'inventory',
+        },
+    }
+# Dashboard inventory responses (see accounts.inventory_cache)
+INVENTORY_CACHE_ALIAS = 'inventory'
+INVENTORY_CACHE_TTL = 300
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections persist for DB_CONN_MAX_AGE seconds and are health-checked before
+# reuse. DB_POOL=1 uses a psycopg 3 connection pool instead (needs
+# psycopg[pool]); prefer it under ASGI, where persistent connections are kept
+# per thread.
+DB_POOL = os.environ.get('DB_POOL') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'blood_donation_db',
-        'USER': 'postgres',
-        'PASSWORD': 'Masters@2023',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'blood_donation_db'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'Masters@2023'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Django refuses persistent connections alongside a pool
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+if DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+        },
+    }
+
+# A streaming read replica: views with read_replica = True read from it on
+# GET while its lag is under REPLICA_MAX_LAG seconds (see accounts.replicas).
+# Clients that just wrote are pinned to the primary through the default
+# cache, so replica reads stay off unless REDIS_URL shares it between workers.
+REPLICA_DATABASES = []
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES = ['replica']
+DATABASE_ROUTERS = ['accounts.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+REPLICA_LAG_CHECK_INTERVAL = 5  # seconds between lag measurements, per process
 
 
 # Password validation
@@ -147,12 +236,23 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # For Hashing Passwords
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'accounts.hashers.ConfigurableBCryptSHA256PasswordHasher',
     'django.contrib.auth.hashers.BCryptPasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
 ]
 
+# bcrypt work factor; existing hashes are upgraded on the user's next login when it changes
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', '12'))
+
+# Login password checks run on a process pool of this size so they don't hold
+# request workers; 0 (the default) verifies inline on the request thread.
+# Every server process starts its own pool, so size it per deployment:
+# roughly the cores left over once all server processes on a host are
+# counted, divided by the number of those processes.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '0'))
+PASSWORD_HASH_QUEUE_DEPTH = 4  # pending checks allowed per worker before callers wait
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -184,19 +284,92 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-import firebase_admin
-from firebase_admin import credentials
-import os
-
-# Path to your Firebase service account key file
-FIREBASE_SERVICE_ACCOUNT_KEY = os.path.join(BASE_DIR, "C:/Users/mohan/firebase/blooddonation-cad48-firebase-adminsdk-yorgh-f012ab5b37.json")
-
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    #print("Initializing Firebase Admin SDK...")
-    cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY)
-    firebase_admin.initialize_app(cred)
-    #print("Firebase Admin SDK initialized successfully.")
-
-
+# Donor push notifications: a provider registered in accounts.notifications
+# ('firebase', or 'local' to record messages instead of sending them) or a
+# dotted path to a backend class. Providers are set up on the first send.
+PUSH_NOTIFICATION_BACKEND = os.environ.get('PUSH_NOTIFICATION_BACKEND', 'firebase')
+# Path to the Firebase service account JSON; unset uses Google application default credentials
+FIREBASE_SERVICE_ACCOUNT_KEY = os.environ.get('FIREBASE_SERVICE_ACCOUNT_KEY')
+DONOR_NOTIFICATION_BATCH_SIZE = 500  # FCM multicast limit
+DONOR_NOTIFICATION_WORKERS = 4
+# Send from the committing request itself instead of the background dispatcher
+# (slower responses, but nothing runs on other threads; handy in tests)
+DONOR_NOTIFICATIONS_SYNC = False
+# Only notify donors within this distance of the hospital (None = nationwide).
+# Donors who haven't shared a location are still notified while this is True.
+DONOR_NOTIFICATION_RADIUS_KM = 50
+DONOR_NOTIFICATION_INCLUDE_UNLOCATED = True
+
+# Donor eligibility (see accounts.eligibility)
+DONOR_MIN_AGE = 18
+DONOR_MAX_AGE = 65
+DONATION_DEFERRAL_DAYS = 56  # minimum gap between whole-blood donations
+
+# Cross-hospital rebalancing (see accounts.transfers)
+TRANSFER_NEAR_EXPIRY_DAYS = 7  # stock expiring within this window may be moved
+TRANSFER_MIN_STOCK = 5  # units of each type a hospital should keep on hand
+TRANSFER_MAX_DISTANCE_KM = 300
+TRANSFER_SUBSTITUTION_PENALTY_KM = 50  # extra cost for sending a compatible but different type
+TRANSFER_CANDIDATES_PER_SOURCE = 16  # nearest shortages each surplus is offered to
+
+# Delivery dispatch (see accounts.delivery)
+# Units each vehicle can carry, keyed by the lower-cased vehicle_type staff register with
+DELIVERY_VEHICLE_CAPACITY = {
+    'bike': 4,
+    'motorcycle': 4,
+    'scooter': 4,
+    'car': 12,
+    'van': 40,
+    'ambulance': 20,
+}
+DELIVERY_DEFAULT_CAPACITY = 8
+DELIVERY_CANDIDATE_DRIVERS = 8  # nearest drivers tried for each new job
+DELIVERY_DISPATCH_DELAY = 1  # seconds a background dispatch waits so a burst of changes shares one run
+
+# Blood unit ingestion (see accounts.ingestion)
+BLOOD_UNIT_SHELF_LIFE_DAYS = 42  # expiry given to units recorded without one
+BLOOD_UNIT_INGEST_CHUNK_SIZE = 1000  # rows validated and inserted per transaction
+BLOOD_UNIT_INGEST_MAX_ERRORS = 1000  # row errors listed in a response
+
+# Analytics exports (see accounts.exports)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the cursor and written per chunk
+
+# Demand forecasting (see accounts.forecasting); refreshed nightly by forecast_demand
+LOW_STOCK_THRESHOLD = 5  # for blood types without a forecast yet
+FORECAST_HISTORY_DAYS = 90
+FORECAST_BACKTEST_DAYS = 14  # most recent days held out to score accuracy
+FORECAST_SMOOTHING_GRID = (0.05, 0.1, 0.2, 0.3, 0.5)  # smoothing factors tried per series
+FORECAST_COVER_DAYS = 3  # restocking lead time plus the review interval
+FORECAST_SERVICE_LEVEL_Z = 1.65  # safety stock in forecast-error deviations (~95% service)
+FORECAST_MIN_THRESHOLD = 1
+
+# Request metrics (see accounts.metrics), scraped from /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for /metrics; unset = local requests only
+# Views declare a query_budget; entries here (view name -> queries) override them.
+# Over-budget requests are logged, and fail outright when QUERY_BUDGET_STRICT is
+# on. The test runner turns it on for `manage.py test`.
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+TEST_RUNNER = 'accounts.test_runner.QueryBudgetTestRunner'
+
+# Structured JSON logs; debug and info records are sampled at LOG_SAMPLE_RATE
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'accounts.log.JSONFormatter'},
+    },
+    'filters': {
+        'sample': {'()': 'accounts.log.SamplingFilter', 'rate': os.environ.get('LOG_SAMPLE_RATE', '1.0')},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json', 'filters': ['sample']},
+    },
+    'loggers': {
+        'accounts': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
 
+# Near-expiry alerts (see accounts.expiry): bucket -> expires within this many days
+EXPIRY_RISK_BUCKET_DAYS = {'critical': 1, 'high': 3, 'medium': 7}
+EXPIRY_RISK_CACHE_TTL = 900  # seconds a hospital's report is served from cache
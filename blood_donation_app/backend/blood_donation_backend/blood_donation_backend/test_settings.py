@@ -0,0 +1,11 @@
+"""
+Settings for ``manage.py test``: the project settings plus a 'replica'
+database alias mirroring the primary, so replica routing can be tested
+without a replica server.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# With DB_REPLICA_HOST set the real replica alias already mirrors the primary
+DATABASES.setdefault('replica', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blood_donation_backend.settings')
+    # `manage.py test` adds a mirror of the primary to test replica routing against
+    settings_module = 'test_settings' if sys.argv[1:2] == ['test'] else 'settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', f'blood_donation_backend.{settings_module}')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -31,21 +31,26 @@ const BloodUnit = () => {
       });
   };
 
-  const handleBloodTypeClick = (bloodType) => {
+  const handleBloodTypeClick = async (bloodType) => {
     setSelectedBloodType(bloodType);
     setNewBloodUnit({ blood_type: bloodType, quantity: '', expiration_date: '' });
-    axios
-      .get(`http://192.168.1.124:8000/api/blood-units/type/${bloodType}/`, {
-        headers: {
-          Authorization: `Bearer ${accessToken}`,
-        },
-      })
-      .then((response) => {
-        setBloodTypeDetails(response.data);
-      })
-      .catch((error) => {
-        console.error('Error fetching blood type details:', error);
-      });
+    try {
+      // The list is paginated; follow `next` until every page is loaded
+      let url = `http://192.168.1.124:8000/api/blood-units/type/${bloodType}/`;
+      const units = [];
+      while (url) {
+        const response = await axios.get(url, {
+          headers: {
+            Authorization: `Bearer ${accessToken}`,
+          },
+        });
+        units.push(...response.data.results);
+        url = response.data.next;
+      }
+      setBloodTypeDetails(units);
+    } catch (error) {
+      console.error('Error fetching blood type details:', error);
+    }
   };
 
   const handleInputChange = (e) => {
@@ -17,13 +17,20 @@ const ManageRequests = () => {
     const fetchRequests = async () => {
       try {
         const accessToken = localStorage.getItem('accessToken');
-        const response = await axios.get('http://192.168.1.124:8000/api/blood-requests/', {
-          headers: {
-            Authorization: `Bearer ${accessToken}`,
-          },
-        });
-        setRequests(response.data);
-        setFilteredRequests(response.data);
+        // The list is paginated; follow `next` until every page is loaded
+        let url = 'http://192.168.1.124:8000/api/blood-requests/';
+        const allRequests = [];
+        while (url) {
+          const response = await axios.get(url, {
+            headers: {
+              Authorization: `Bearer ${accessToken}`,
+            },
+          });
+          allRequests.push(...response.data.results);
+          url = response.data.next;
+        }
+        setRequests(allRequests);
+        setFilteredRequests(allRequests);
       } catch (error) {
         console.error('Error fetching blood requests:', error);
       }